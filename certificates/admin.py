@@ -1,13 +1,61 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .models import Certificate
+from .export import iter_certificate_zip
+from .regeneration import filter_certificates
 from risk_lms.admin import risk_admin_site
 
+
+def certificate_zip_response(certificates, workers=2):
+    """Stream a ZIP of certificate PDFs as a download"""
+    response = StreamingHttpResponse(iter_certificate_zip(certificates, workers=workers), content_type='application/zip')
+    filename = f"certificates_{timezone.now().strftime('%Y%m%d_%H%M')}.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @admin.register(Certificate)
 class CertificateAdmin(admin.ModelAdmin):
-    list_display = ['certificate_number', 'user', 'overall_score', 'issue_date', 'is_valid']
-    list_filter = ['is_valid', 'issue_date']
+    list_display = ['certificate_number', 'user', 'overall_score', 'issue_date', 'is_valid', 'render_status', 'email_status']
+    list_filter = ['is_valid', 'render_status', 'email_status', 'issue_date', 'course', 'interactive_course', 'user__department']
     search_fields = ['certificate_number', 'user__email', 'user__first_name', 'user__last_name']
-    readonly_fields = ['certificate_number', 'qr_code', 'verification_url']
+    readonly_fields = ['certificate_number', 'qr_code', 'verification_url', 'render_status', 'render_error', 'rendered_at',
+                       'email_attempts', 'email_next_attempt_at', 'email_sent_at', 'email_error']
+    actions = ['export_pdfs']
+    
+    def get_urls(self):
+        urls = super().get_urls()
+        export_urls = [
+            path('export/', self.admin_site.admin_view(self.export_view), name='certificates_certificate_export'),
+        ]
+        return export_urls + urls
+    
+    @admin.action(description='Download PDFs of selected certificates (ZIP)')
+    def export_pdfs(self, request, queryset):
+        return certificate_zip_response(queryset)
+    
+    def export_view(self, request):
+        """
+        ZIP of all certificate PDFs matching the query string filters:
+        course, interactive_course, department, since and until (YYYY-MM-DD).
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            certificates = filter_certificates(
+                course_id=int(request.GET['course']) if request.GET.get('course') else None,
+                interactive_course_id=int(request.GET['interactive_course']) if request.GET.get('interactive_course') else None,
+                since=parse_date(request.GET.get('since', '')),
+                until=parse_date(request.GET.get('until', '')),
+                department=request.GET.get('department') or None,
+            )
+        except ValueError:
+            return HttpResponseBadRequest('Invalid filter value')
+        return certificate_zip_response(certificates)
 
 # Register with custom admin site
 risk_admin_site.register(Certificate, CertificateAdmin)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 class CertificatesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'certificates'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Process-wide ReportLab setting (there is no per-canvas option): PDFs are
+        # stored and served as binary files, so skip ASCII85 (+25% size) on their
+        # streams. Certificates are the only PDFs this project generates.
+        from reportlab import rl_config
+        rl_config.useA85 = 0
@@ -0,0 +1,158 @@
+"""
+Email delivery of issued certificates.
+
+Rendered certificates with email_status 'pending' are mailed to their
+recipients with the PDF attached. A run sends a batch over one connection
+from Django's email API (one SMTP login per batch instead of per email),
+records the outcome of each message on its certificate and retries failures
+with exponential backoff until CERTIFICATE_EMAIL_MAX_ATTEMPTS is reached.
+Runs come from the periodic Celery task or the send_certificate_emails
+command. A run claims each certificate with a conditional UPDATE to
+'sending' before mailing it, so concurrent runs never mail the same one; a
+claim left behind by a crashed run expires after CLAIM_TIMEOUT.
+Works with any EMAIL_BACKEND (file or locmem in development and tests).
+"""
+import logging
+import smtplib
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import Certificate
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TIMEOUT = 60 * 30
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60
+
+
+def due_certificates():
+    """Rendered certificates waiting to be emailed whose retry time (or expired claim) has come"""
+    return Certificate.objects.filter(
+        email_status__in=['pending', 'sending'], render_status='ready',
+    ).exclude(pdf_file='').filter(
+        Q(email_next_attempt_at__isnull=True) | Q(email_next_attempt_at__lte=timezone.now())
+    )
+
+
+def claim_certificates(certificate_ids):
+    """Mark due certificates as being sent by this run; returns the ids it claimed"""
+    claimed = []
+    for certificate_id in certificate_ids:
+        # Only one run's UPDATE can still match the due condition
+        if due_certificates().filter(pk=certificate_id).update(
+            email_status='sending',
+            email_next_attempt_at=timezone.now() + timedelta(seconds=CLAIM_TIMEOUT),
+        ):
+            claimed.append(certificate_id)
+    return claimed
+
+
+def build_message(certificate, connection=None):
+    """Certificate email for the recipient with the PDF attached"""
+    user = certificate.user
+    name = user.get_full_name() or user.username
+    course_title = certificate.get_course_title()
+    body = (
+        f"Dear {name},\n\n"
+        f"Congratulations on completing {course_title} with a score of {certificate.overall_score:.1f}%.\n\n"
+        f"Your certificate ({certificate.certificate_number}) is attached. It can be verified at:\n"
+        f"{certificate.verification_url}\n\n"
+        "Risk Department\n"
+        "Co-operative Bank Tanzania PLC\n"
+    )
+    message = EmailMessage(
+        subject=f'Your certificate: {course_title}',
+        body=body,
+        to=[user.email],
+        connection=connection,
+    )
+    with certificate.pdf_file.open('rb') as pdf:
+        message.attach(f'Certificate_{certificate.certificate_number}.pdf', pdf.read(), 'application/pdf')
+    return message
+
+
+def _record_failure(certificate, error, now):
+    max_attempts = getattr(settings, 'CERTIFICATE_EMAIL_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    retry_delay = getattr(settings, 'CERTIFICATE_EMAIL_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+
+    certificate.email_attempts += 1
+    certificate.email_error = str(error)[:2000] or error.__class__.__name__
+    if certificate.email_attempts >= max_attempts:
+        certificate.email_status = 'failed'
+        certificate.email_next_attempt_at = None
+    else:
+        certificate.email_status = 'pending'
+        # 1, 2, 4, 8... times the base delay
+        certificate.email_next_attempt_at = now + timedelta(seconds=retry_delay * 2 ** (certificate.email_attempts - 1))
+
+
+def send_certificate_emails(batch_size=None):
+    """
+    Email one batch of due certificates over a single connection.
+
+    Returns (sent, failed, skipped) counts of the certificates this run claimed
+(skipped: recipients without an email address); all zero when there was
+nothing left to claim.
+    """
+    batch_size = batch_size or getattr(settings, 'CERTIFICATE_EMAIL_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    candidates = list(due_certificates().order_by('id').values_list('id', flat=True)[:batch_size])
+    claimed = claim_certificates(candidates)
+    certificates = list(
+        Certificate.objects.filter(id__in=claimed).select_related('user', 'course', 'interactive_course').order_by('id')
+    )
+    if not certificates:
+        return 0, 0, 0
+
+    sent = failed = skipped = 0
+    handled = set()
+    connection = get_connection()
+    try:
+        connection.open()
+        for certificate in certificates:
+            now = timezone.now()
+            handled.add(certificate.id)
+            if not certificate.user.email:
+                certificate.email_status = 'skipped'
+                certificate.email_error = 'Recipient has no email address'
+                certificate.email_next_attempt_at = None
+                skipped += 1
+                continue
+            try:
+                build_message(certificate, connection).send()
+            except smtplib.SMTPServerDisconnected as e:
+                # Dropped mid-batch: reconnect for the rest and retry this one later
+                _record_failure(certificate, e, now)
+                failed += 1
+                connection.close()
+                connection.open()
+            except Exception as e:
+                logger.warning('Certificate email failed: certificate=%s: %s', certificate.id, e)
+                _record_failure(certificate, e, now)
+                failed += 1
+            else:
+                certificate.email_status = 'sent'
+                certificate.email_sent_at = now
+                certificate.email_error = ''
+                certificate.email_attempts += 1
+                certificate.email_next_attempt_at = None
+                sent += 1
+    except Exception as e:
+        # The server cannot be reached: back off every certificate not handled yet
+        logger.warning('Certificate email connection failed: %s', e)
+        now = timezone.now()
+        for certificate in certificates:
+            if certificate.id not in handled:
+                _record_failure(certificate, e, now)
+                failed += 1
+    finally:
+        connection.close()
+
+    Certificate.objects.bulk_update(certificates, [
+        'email_status', 'email_attempts', 'email_next_attempt_at', 'email_sent_at', 'email_error',
+    ])
+    return sent, failed, skipped
@@ -0,0 +1,135 @@
+"""
+Batch certificate eligibility for every user and course.
+
+Certificates are otherwise only issued when a learner submits a quiz or asks
+for one, so anyone who finished the remaining requirement later (e.g. the
+last video after passing the quiz) never gets one. This evaluates the same
+rules as quizzes.views.check_and_generate_certificate and
+check_and_generate_interactive_certificate for all (user, course) pairs with a
+fixed number of grouped queries, so its cost does not grow per user, then
+bulk-creates the missing certificates and queues their rendering. A unique
+constraint per (user, course) keeps it from duplicating a certificate the
+submit path issues at the same time; such a batch is retried row by row.
+
+Course: every video of the course completed and a passed quiz attempt
+(score = best passed attempt). Interactive course: a passed quiz attempt and
+an InteractiveCourseProgress row (the submit path issues nothing without one).
+"""
+import uuid
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from quizzes.models import QuizAttempt
+from videos.models import InteractiveCourseProgress, Video, VideoProgress
+from .models import Certificate
+from .rendering import queue_certificate_renders
+
+BATCH_SIZE = 500
+
+
+def _best_passed_scores(field):
+    """{(user_id, <field>_id): best score} of passed, completed attempts by active users"""
+    attempts = QuizAttempt.objects.filter(
+        passed=True, completed_at__isnull=False, user__is_active=True, **{f'{field}__isnull': False}
+    ).values('user_id', f'{field}_id').annotate(best=Max('score'))
+    return {(row['user_id'], row[f'{field}_id']): row['best'] for row in attempts}
+
+
+def _existing_pairs(field):
+    return set(Certificate.objects.filter(**{f'{field}__isnull': False}).values_list('user_id', f'{field}_id'))
+
+
+def eligible_course_pairs():
+    """{(user_id, course_id): score} for course certificates that are due but not issued"""
+    scores = _best_passed_scores('course')
+    if not scores:
+        return {}
+
+    total_videos = dict(Video.objects.values('course_id').annotate(n=Count('id')).values_list('course_id', 'n'))
+    completed_videos = {
+        (row['user_id'], row['video__course_id']): row['n']
+        for row in VideoProgress.objects.filter(is_completed=True).values(
+            'user_id', 'video__course_id'
+        ).annotate(n=Count('video_id', distinct=True))
+    }
+    existing = _existing_pairs('course')
+
+    return {
+        (user_id, course_id): score
+        for (user_id, course_id), score in scores.items()
+        if (user_id, course_id) not in existing
+        and completed_videos.get((user_id, course_id), 0) >= total_videos.get(course_id, 0)
+    }
+
+
+def eligible_interactive_pairs():
+    """{(user_id, interactive_course_id): score} for interactive course certificates not issued yet"""
+    scores = _best_passed_scores('interactive_course')
+    if not scores:
+        return {}
+
+    started = set(InteractiveCourseProgress.objects.values_list('user_id', 'interactive_course_id'))
+    existing = _existing_pairs('interactive_course')
+    return {pair: score for pair, score in scores.items() if pair in started and pair not in existing}
+
+
+def _new_certificate(prefix, **fields):
+    certificate_number = f'{prefix}-{uuid.uuid4().hex[:8].upper()}'
+    base_url = getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')
+    return Certificate(
+        certificate_number=certificate_number,
+        verification_url=f'{base_url}/certificates/verify/{certificate_number}/',
+        **fields
+    )
+
+
+def issue_missing_certificates(dry_run=False):
+    """
+    Create every certificate that is due and queue the renders.
+
+    Returns (course certificates, interactive course certificates) issued, or
+    that would be issued with `dry_run`.
+    """
+    course_pairs = eligible_course_pairs()
+    interactive_pairs = eligible_interactive_pairs()
+    if dry_run:
+        return len(course_pairs), len(interactive_pairs)
+
+    certificates = [
+        _new_certificate('COOP-TZ', user_id=user_id, course_id=course_id, overall_score=score)
+        for (user_id, course_id), score in course_pairs.items()
+    ] + [
+        _new_certificate('COOP-IC', user_id=user_id, interactive_course_id=interactive_id, overall_score=score)
+        for (user_id, interactive_id), score in interactive_pairs.items()
+    ]
+
+    created = []
+    for start in range(0, len(certificates), BATCH_SIZE):
+        batch = certificates[start:start + BATCH_SIZE]
+        created.extend(_create_batch(batch))
+        # Not every backend returns primary keys from a bulk insert
+        queue_certificate_renders(Certificate.objects.filter(
+            certificate_number__in=[certificate.certificate_number for certificate in batch]
+        ).values_list('id', flat=True))
+
+    return (sum(1 for certificate in created if certificate.course_id),
+            sum(1 for certificate in created if certificate.interactive_course_id))
+
+
+def _create_batch(batch):
+    """Insert a batch of certificates, skipping any issued concurrently; returns those inserted"""
+    try:
+        with transaction.atomic():
+            Certificate.objects.bulk_create(batch)
+        return batch
+    except IntegrityError:
+        # The submit path issued some of them first; insert the rest one by one
+        created = []
+        for certificate in batch:
+            try:
+                with transaction.atomic():
+                    certificate.save(force_insert=True)
+                created.append(certificate)
+            except IntegrityError:
+                continue
+        return created
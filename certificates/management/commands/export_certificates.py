@@ -0,0 +1,57 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from certificates.export import iter_certificate_zip
+from certificates.regeneration import filter_certificates
+
+
+class Command(BaseCommand):
+    help = 'Write a ZIP of certificate PDFs for a course, department or date range (renders missing PDFs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="ZIP file to write, or '-' for standard output")
+        parser.add_argument('--course', type=int, help='Only certificates for this course ID')
+        parser.add_argument('--interactive-course', type=int, help='Only certificates for this interactive course ID')
+        parser.add_argument('--department', help="Only certificates of users in this department")
+        parser.add_argument('--since', help='Only certificates issued on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Only certificates issued on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes for rendering missing PDFs (default: number of CPUs)')
+
+    def handle(self, *args, **options):
+        since = until = None
+        try:
+            if options['since']:
+                since = parse_date(options['since'])
+            if options['until']:
+                until = parse_date(options['until'])
+        except ValueError:
+            since = until = None
+        if (options['since'] and not since) or (options['until'] and not until):
+            raise CommandError('Dates must be given as YYYY-MM-DD')
+
+        certificates = filter_certificates(
+            course_id=options['course'],
+            interactive_course_id=options['interactive_course'],
+            since=since,
+            until=until,
+            department=options['department'],
+        )
+        count = certificates.count()
+        if not count:
+            raise CommandError('No certificates match the given filters')
+
+        to_stdout = options['output'] == '-'
+        output = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        try:
+            size = 0
+            for chunk in iter_certificate_zip(certificates, workers=options['workers']):
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if not to_stdout:
+                output.close()
+
+        # Keep standard output clean for the archive
+        log = self.stderr if to_stdout else self.stdout
+        log.write(self.style.SUCCESS(f'Exported {count} certificate(s), {size / 1024 / 1024:.1f} MB'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from certificates.eligibility import issue_missing_certificates
+
+
+class Command(BaseCommand):
+    help = 'Issue certificates to every user who meets the requirements but has none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many certificates are due')
+
+    def handle(self, *args, **options):
+        courses, interactive = issue_missing_certificates(dry_run=options['dry_run'])
+        verb = 'Would issue' if options['dry_run'] else 'Issued'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {courses} course and {interactive} interactive course certificate(s)'
+        ))
@@ -0,0 +1,90 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from certificates.regeneration import (
+    filter_certificates, regenerate_certificates, load_checkpoint, save_checkpoint,
+)
+
+
+class Command(BaseCommand):
+    help = 'Regenerate certificate QR codes and PDFs in parallel (e.g. after a branding change)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='Only certificates for this course ID')
+        parser.add_argument('--interactive-course', type=int, help='Only certificates for this interactive course ID')
+        parser.add_argument('--since', help='Only certificates issued on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Only certificates issued on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--only-missing', action='store_true',
+                            help='Only certificates without a QR code or PDF, or not rendered successfully')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: number of CPUs)')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Certificates read and written per batch (default: 200)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted run from its checkpoint')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, '.regenerate_certificates.json'),
+                            help='Checkpoint file used to resume interrupted runs')
+
+    def handle(self, *args, **options):
+        since = until = None
+        try:
+            if options['since']:
+                since = parse_date(options['since'])
+            if options['until']:
+                until = parse_date(options['until'])
+        except ValueError:
+            since = until = None
+        if (options['since'] and not since) or (options['until'] and not until):
+            raise CommandError('Dates must be given as YYYY-MM-DD')
+
+        filters = {
+            'course': options['course'],
+            'interactive_course': options['interactive_course'],
+            'since': options['since'],
+            'until': options['until'],
+            'only_missing': options['only_missing'],
+        }
+        checkpoint = options['checkpoint']
+
+        start_after = 0
+        if options['resume']:
+            try:
+                start_after = load_checkpoint(checkpoint, filters)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if start_after:
+                self.stdout.write(f'Resuming after certificate #{start_after}')
+
+        certificates = filter_certificates(
+            course_id=options['course'],
+            interactive_course_id=options['interactive_course'],
+            since=since,
+            until=until,
+            only_missing=options['only_missing'],
+        )
+        remaining = certificates.filter(id__gt=start_after).count()
+        self.stdout.write(f'Found {remaining} certificate(s) to regenerate')
+
+        def on_chunk(last_id, done, failed):
+            save_checkpoint(checkpoint, filters, last_id)
+            self.stdout.write(f'  {done + failed}/{remaining} processed ({failed} failed), last #{last_id}')
+
+        regenerated, failures = regenerate_certificates(
+            certificates,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            start_after=start_after,
+            on_chunk=on_chunk,
+        )
+
+        for certificate_id, error in failures:
+            self.stderr.write(f'Certificate #{certificate_id}: {error}')
+
+        # A finished run leaves nothing to resume
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Regenerated {regenerated} certificate(s), {len(failures)} failed'
+        ))
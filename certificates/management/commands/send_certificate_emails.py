@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from certificates.delivery import due_certificates, send_certificate_emails
+
+
+class Command(BaseCommand):
+    help = 'Email rendered certificates to their recipients in batches over one connection each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Certificates per connection (default: CERTIFICATE_EMAIL_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = total_skipped = 0
+        while due_certificates().exists():
+            sent, failed, skipped = send_certificate_emails(batch_size=options['batch_size'])
+            if not sent and not failed and not skipped:
+                break  # Nothing claimed: what is left is being sent by another run
+            total_sent += sent
+            total_failed += failed
+            total_skipped += skipped
+            self.stdout.write(f'  {total_sent} sent, {total_failed} failed, {total_skipped} skipped (no email address)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} certificate email(s), {total_failed} failed (will be retried with backoff)'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    """Certificates issued before background rendering already have their files"""
+    Certificate = apps.get_model('certificates', 'Certificate')
+    Certificate.objects.exclude(pdf_file='').update(render_status='ready')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0002_add_interactive_course'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='render_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='render_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('rendering', 'Rendering'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='rendered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
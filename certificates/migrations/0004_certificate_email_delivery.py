@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+def skip_existing(apps, schema_editor):
+    """Certificates issued before email delivery are not mailed retroactively"""
+    Certificate = apps.get_model('certificates', 'Certificate')
+    Certificate.objects.update(email_status='skipped')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0003_certificate_render_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='email_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='email_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='email_next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='email_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='email_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(skip_existing, migrations.RunPython.noop),
+    ]
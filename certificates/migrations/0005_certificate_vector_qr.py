@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0004_certificate_email_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='qr_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the QR payload', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='certificate',
+            name='qr_code',
+            field=models.FileField(blank=True, upload_to='certificates/qr_codes/'),
+        ),
+    ]
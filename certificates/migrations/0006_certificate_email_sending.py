@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0005_certificate_vector_qr'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='certificate',
+            name='email_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+def invalidate_duplicates(apps, schema_editor):
+    """Keep the first valid certificate per learner and course; later duplicates are marked invalid"""
+    Certificate = apps.get_model('certificates', 'Certificate')
+    for field in ('course_id', 'interactive_course_id'):
+        seen = set()
+        duplicates = []
+        for pk, user_id, target_id in Certificate.objects.filter(
+            is_valid=True, **{f'{field}__isnull': False}
+        ).order_by('issue_date', 'id').values_list('id', 'user_id', field):
+            if (user_id, target_id) in seen:
+                duplicates.append(pk)
+            seen.add((user_id, target_id))
+        Certificate.objects.filter(id__in=duplicates).update(is_valid=False)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0006_certificate_email_sending'),
+    ]
+
+    operations = [
+        migrations.RunPython(invalidate_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='certificate',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', False), ('is_valid', True)), fields=('user', 'course'), name='unique_valid_course_certificate'),
+        ),
+        migrations.AddConstraint(
+            model_name='certificate',
+            constraint=models.UniqueConstraint(condition=models.Q(('interactive_course__isnull', False), ('is_valid', True)), fields=('user', 'interactive_course'), name='unique_valid_interactive_certificate'),
+        ),
+    ]
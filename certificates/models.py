@@ -3,33 +3,73 @@ from django.conf import settings
 from courses.models import Course
 from videos.models import InteractiveCourse
 from django.utils import timezone
-import qrcode
-from io import BytesIO
-from django.core.files import File
-import os
+from django.core.files.base import ContentFile
 
 class Certificate(models.Model):
     """Certificate model for course completion"""
+    RENDER_STATUSES = [
+        ('pending', 'Pending'),
+        ('rendering', 'Rendering'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    EMAIL_STATUSES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='certificates')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='certificates', null=True, blank=True)
     interactive_course = models.ForeignKey(InteractiveCourse, on_delete=models.CASCADE, related_name='certificates', null=True, blank=True)
     certificate_number = models.CharField(max_length=100, unique=True)
     issue_date = models.DateTimeField(default=timezone.now)
     overall_score = models.DecimalField(max_digits=5, decimal_places=2)
-    qr_code = models.ImageField(upload_to='certificates/qr_codes/', blank=True)
+    qr_code = models.FileField(upload_to='certificates/qr_codes/', blank=True)  # SVG, see qr.py
+    qr_hash = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the QR payload')
     pdf_file = models.FileField(upload_to='certificates/pdfs/', blank=True)
     verification_url = models.URLField(max_length=500)
     is_valid = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # QR code and PDF are rendered in the background after the row is created
+    render_status = models.CharField(max_length=20, choices=RENDER_STATUSES, default='pending')
+    render_error = models.TextField(blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
+    
+    # Emailed to the recipient with the PDF attached once rendered (see delivery.py)
+    email_status = models.CharField(max_length=20, choices=EMAIL_STATUSES, default='pending')
+    email_attempts = models.PositiveSmallIntegerField(default=0)
+    email_next_attempt_at = models.DateTimeField(null=True, blank=True)
+    email_sent_at = models.DateTimeField(null=True, blank=True)
+    email_error = models.TextField(blank=True)
+    
     class Meta:
         db_table = 'certificates'
         ordering = ['-issue_date']
+        constraints = [
+            # One valid certificate per learner and course, however many paths issue them concurrently
+            models.UniqueConstraint(
+                fields=['user', 'course'], condition=models.Q(course__isnull=False, is_valid=True),
+                name='unique_valid_course_certificate',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'interactive_course'], condition=models.Q(interactive_course__isnull=False, is_valid=True),
+                name='unique_valid_interactive_certificate',
+            ),
+        ]
     
     def __str__(self):
         course_title = self.course.title if self.course else (self.interactive_course.title if self.interactive_course else 'Unknown')
         return f"{self.user.get_full_name()} - {course_title} - {self.certificate_number}"
     
+    @property
+    def is_ready(self):
+        """True once the QR code and PDF have been rendered"""
+        return self.render_status == 'ready' and bool(self.pdf_file)
+    
     def get_course_title(self):
         """Get the title of the course or interactive course"""
         if self.course:
@@ -39,46 +79,20 @@ class Certificate(models.Model):
         return 'Risk Management Program'
     
     def generate_qr_code(self):
-        """Generate QR code for certificate verification with comprehensive user details"""
-        import json
-        from django.utils import timezone
-        
-        course_title = self.get_course_title()
-        
-        # Create comprehensive, immediately readable QR data - no web lookup needed
-        qr_text = f"""🏆 CERTIFICATE OF COMPLETION 🏆
-
-📜 Certificate #: {self.certificate_number}
-👤 Full Name: {self.user.get_full_name()}
-📧 Email: {self.user.email}
-🆔 Username: {self.user.username}
-📚 Course: {course_title}
-📊 Final Score: {self.overall_score:.1f}%
-📅 Completed: {self.issue_date.strftime('%B %d, %Y')}
-🏦 Issuing Bank: Co-operative Bank of Tanzania PLC
-🏢 Department: Risk Management & Compliance
-🌐 Website: www.coopbank.co.tz
-✅ Status: VALID & AUTHENTIC
-
-This certificate confirms successful completion of the Risk Management training program with a score of {self.overall_score:.1f}%. 
-
-Verification: {self.verification_url}
-Generated: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')} EAT"""
+        """
+        Generate the verification QR code as SVG (verification URL plus signed token).
         
-        qr = qrcode.QRCode(
-            version=4,  # Larger version for more detailed data
-            error_correction=qrcode.constants.ERROR_CORRECT_M,  # Medium error correction for larger data
-            box_size=12,  # Good balance of size and scannability
-            border=2,  # Minimal border
-        )
-        qr.add_data(qr_text)
-        qr.make(fit=True)
+        Skipped when the payload is unchanged since the last generation; returns
+        True if a new QR code was written.
+        """
+        from .qr import qr_payload, payload_hash, get_qr_matrix, qr_svg
         
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
+        qr_data = qr_payload(self)
+        digest = payload_hash(qr_data)
+        if digest == self.qr_hash and self.qr_code and self.qr_code.storage.exists(self.qr_code.name):
+            return False
         
-        filename = f'{self.certificate_number}_qr.png'
-        self.qr_code.save(filename, File(buffer), save=False)
-        buffer.close()
+        svg = qr_svg(get_qr_matrix(qr_data, digest))
+        self.qr_code.save(f'{self.certificate_number}_qr.svg', ContentFile(svg.encode()), save=False)
+        self.qr_hash = digest
+        return True
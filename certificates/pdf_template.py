@@ -0,0 +1,315 @@
+"""
+Static page template for certificate PDFs.
+
+Everything that is identical on every certificate - background, watermark,
+gradient banners, borders, logo, headings, column labels, signature block
+and footer - is drawn by draw_certificate_template(). get_certificate_template()
+turns that layer into a PDF form XObject once per process (the logo is decoded,
+flattened and downscaled a single time, the banners are native PDF gradients),
+so generate_certificate_pdf() only draws the variable text and QR on an
+otherwise empty page and merge_onto_template() paints the cached form under it.
+"""
+import os
+import threading
+from io import BytesIO
+from django.conf import settings
+from reportlab.lib.colors import HexColor, white
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+
+# Co-operative Bank Tanzania PLC Colors
+COOP_BLUE = HexColor('#0052CC')        # Co-op Bank blue
+COOP_DARK_BLUE = HexColor('#002B5C')   # Navy blue
+COOP_GREEN = HexColor('#00A651')       # Co-op Bank green
+DARK_GRAY = HexColor('#333333')
+
+MARGIN = 0.4*inch
+INNER_MARGIN = 0.6*inch
+BANNER_HEIGHT = 1.0*inch
+BOTTOM_SECTION_Y = 1.8*inch
+WATERMARK_SIZE = 4.5*inch
+WATERMARK_ALPHA = 0.06
+LOGO_SIZE = 1.1*inch
+
+# Course title block, measured down from the recipient's name. The title gets
+# up to two lines; the "Offered by" line sits below the two-line slot.
+COURSE_TITLE_OFFSET = 1.45*inch
+COURSE_TITLE_LINE_HEIGHT = 0.3*inch
+OFFERED_BY_OFFSET = COURSE_TITLE_OFFSET + COURSE_TITLE_LINE_HEIGHT + 0.55*inch
+
+TEMPLATE_FORM_NAME = '/CertificateTemplate'
+
+# Printed resolution of the embedded images
+LOGO_DPI = 300
+WATERMARK_DPI = 150
+
+_images = {}
+_images_lock = threading.Lock()
+_template_forms = {}
+_template_forms_lock = threading.Lock()
+
+
+def _logo_path():
+    return os.path.join(settings.BASE_DIR, 'static', 'images', 'CoopLogo.png')
+
+
+def _logo_key():
+    path = _logo_path()
+    try:
+        return (path, os.path.getmtime(path))
+    except OSError:
+        return None
+
+
+def _prepare_image(source, size_inches, dpi, alpha=1.0, jpeg=False):
+    """Flatten an RGBA image onto white at the given opacity and scale it to its printed size"""
+    from PIL import Image
+
+    pixels = max(1, int(size_inches * dpi))
+    image = source.convert('RGBA')
+    image.thumbnail((pixels, pixels), Image.LANCZOS)
+    if alpha < 1:
+        faded = image.getchannel('A').point(lambda a: int(a * alpha))
+        image.putalpha(faded)
+
+    flattened = Image.new('RGB', image.size, (255, 255, 255))
+    flattened.paste(image, mask=image.getchannel('A'))
+    if not jpeg:
+        return ImageReader(flattened)
+
+    # A JPEG is embedded as-is, without re-compressing it for every PDF
+    buffer = BytesIO()
+    flattened.save(buffer, format='JPEG', quality=90)
+    buffer.seek(0)
+    return ImageReader(buffer)
+
+
+def get_template_images():
+    """
+    Return {'logo': ImageReader, 'watermark': ImageReader} for the bank logo.
+
+    Built once per process and rebuilt only if the logo file changes. Empty
+    when the logo is missing.
+    """
+    key = _logo_key()
+    if key is None:
+        return {}
+
+    images = _images.get(key)
+    if images is None:
+        with _images_lock:
+            images = _images.get(key)
+            if images is None:
+                from PIL import Image
+
+                with Image.open(key[0]) as source:
+                    source.load()
+                    images = {
+                        'logo': _prepare_image(source, LOGO_SIZE / inch, LOGO_DPI),
+                        'watermark': _prepare_image(
+                            source, WATERMARK_SIZE / inch, WATERMARK_DPI, alpha=WATERMARK_ALPHA, jpeg=True
+                        ),
+                    }
+                _images.clear()
+                _images[key] = images
+    return images
+
+
+def _banner(p, y, width, height, colors):
+    """Fill a full-width band with a vertical gradient (colors listed top to bottom)"""
+    p.saveState()
+    path = p.beginPath()
+    path.rect(0, y, width, height)
+    p.clipPath(path, stroke=0, fill=0)
+    p.linearGradient(0, y + height, 0, y, colors, extend=False)
+    p.restoreState()
+
+
+def draw_certificate_template(p, width, height):
+    """
+    Draw the static certificate layer on canvas `p`.
+
+    Returns the y position where the recipient's name goes.
+    """
+    images = get_template_images()
+
+    # === WHITE BACKGROUND ===
+    p.setFillColor(white)
+    p.rect(0, 0, width, height, fill=True, stroke=False)
+
+    # === WATERMARK LOGO IN CENTER BACKGROUND (opacity baked into the image) ===
+    if images:
+        p.drawImage(images['watermark'], (width - WATERMARK_SIZE) / 2, (height - WATERMARK_SIZE) / 2,
+                    width=WATERMARK_SIZE, height=WATERMARK_SIZE)
+
+    # === TOP BANNER (Navy -> Blue -> Green) AND BOTTOM BANNER (Green -> Blue -> Navy) ===
+    _banner(p, height - BANNER_HEIGHT, width, BANNER_HEIGHT, [COOP_DARK_BLUE, COOP_BLUE, COOP_GREEN])
+    _banner(p, 0, width, BANNER_HEIGHT, [COOP_GREEN, COOP_BLUE, COOP_DARK_BLUE])
+
+    # === BORDERS ===
+    # Outer border - Navy Blue
+    p.setStrokeColor(COOP_DARK_BLUE)
+    p.setLineWidth(4)
+    p.rect(MARGIN, MARGIN + 0.65*inch, width - 2*MARGIN, height - 2*MARGIN - 0.65*inch)
+
+    # Inner border - Green
+    p.setStrokeColor(COOP_GREEN)
+    p.setLineWidth(2)
+    p.rect(MARGIN + 10, MARGIN + 0.65*inch + 10, width - 2*MARGIN - 20, height - 2*MARGIN - 0.65*inch - 20)
+
+    content_top = height - BANNER_HEIGHT - 0.4*inch
+
+    # === LOGO SECTION (Top) ===
+    if images:
+        p.drawImage(images['logo'], (width - LOGO_SIZE) / 2, content_top - LOGO_SIZE + 0.2*inch,
+                    width=LOGO_SIZE, height=LOGO_SIZE)
+        content_top -= LOGO_SIZE + 0.15*inch
+    else:
+        content_top -= 0.3*inch
+
+    # === BANK NAME ===
+    p.setFillColor(COOP_DARK_BLUE)
+    p.setFont("Helvetica-Bold", 22)
+    p.drawCentredString(width / 2, content_top, "CO-OPERATIVE BANK TANZANIA PLC")
+    content_top -= 0.7*inch
+
+    # === CERTIFICATE TITLE ===
+    line_width = 3*inch
+    p.setStrokeColor(COOP_BLUE)
+    p.setLineWidth(2)
+    p.line((width - line_width)/2, content_top + 0.15*inch, (width + line_width)/2, content_top + 0.15*inch)
+
+    p.setFillColor(COOP_DARK_BLUE)
+    p.setFont("Helvetica-Bold", 42)
+    p.drawCentredString(width / 2, content_top - 0.5*inch, "CERTIFICATE")
+    content_top -= 0.85*inch
+
+    p.setFillColor(COOP_GREEN)
+    p.setFont("Helvetica-Bold", 22)
+    p.drawCentredString(width / 2, content_top - 0.1*inch, "OF COMPLETION")
+    content_top -= 0.55*inch
+
+    p.setStrokeColor(COOP_GREEN)
+    p.setLineWidth(2)
+    p.line((width - line_width)/2, content_top, (width + line_width)/2, content_top)
+    content_top -= 0.65*inch
+
+    # === RECIPIENT SECTION ===
+    p.setFillColor(DARK_GRAY)
+    p.setFont("Helvetica", 14)
+    p.drawCentredString(width / 2, content_top, "This is to certify that")
+    name_y = content_top - 0.6*inch
+
+    # "has successfully completed" sits at a fixed distance below the name
+    p.drawCentredString(width / 2, name_y - 0.9*inch, "has successfully completed the training course")
+
+    # === OFFERED BY ===
+    p.setFillColor(COOP_GREEN)
+    p.setFont("Helvetica-Bold", 12)
+    p.drawCentredString(width / 2, name_y - OFFERED_BY_OFFSET, "Offered by Co-operative Bank Tanzania PLC")
+
+    # === BOTTOM SECTION LABELS ===
+    col_width = (width - 2*INNER_MARGIN) / 3
+    left_x = INNER_MARGIN + col_width/2
+    p.setFillColor(COOP_DARK_BLUE)
+    p.setFont("Helvetica", 9)
+    p.drawCentredString(left_x, BOTTOM_SECTION_Y + 0.55*inch, "DATE OF ISSUE")
+    p.drawCentredString(left_x, BOTTOM_SECTION_Y + 0.05*inch, "CERTIFICATE NO.")
+
+    # --- Right Column: HEAD OF RISK SIGNATURE ---
+    right_x = width - INNER_MARGIN - col_width/2
+    p.setStrokeColor(COOP_DARK_BLUE)
+    p.setLineWidth(1.5)
+    sig_line_width = 1.6*inch
+    p.line(right_x - sig_line_width/2, BOTTOM_SECTION_Y + 0.35*inch, right_x + sig_line_width/2, BOTTOM_SECTION_Y + 0.35*inch)
+
+    p.setFillColor(COOP_DARK_BLUE)
+    p.setFont("Helvetica-Bold", 10)
+    p.drawCentredString(right_x, BOTTOM_SECTION_Y + 0.12*inch, "HEAD OF RISK")
+
+    p.setFillColor(DARK_GRAY)
+    p.setFont("Helvetica", 9)
+    p.drawCentredString(right_x, BOTTOM_SECTION_Y - 0.08*inch, "Risk Department")
+
+    p.setFillColor(COOP_GREEN)
+    p.setFont("Helvetica-Bold", 8)
+    p.drawCentredString(right_x, BOTTOM_SECTION_Y - 0.26*inch, "Co-operative Bank Tanzania PLC")
+
+    # === FOOTER ===
+    footer_y = 0.6*inch
+    p.setFillColor(white)
+    p.setFont("Helvetica", 8)
+    p.drawCentredString(width / 2, footer_y + 0.15*inch, "This certificate is electronically generated and can be verified by scanning the QR code")
+    p.setFont("Helvetica-Bold", 9)
+    p.drawCentredString(width / 2, footer_y - 0.05*inch, "Copyright © 2025 Co-operative Bank Tanzania PLC")
+
+    return name_y
+
+
+def get_certificate_template():
+    """
+    Return (form, name_y): the static layer as a parsed PDF form XObject, and
+    the y position of the recipient's name.
+
+    Built once per process and again only if the logo file changes. The form
+    is only ever cloned from, never modified.
+    """
+    key = _logo_key()
+    template = _template_forms.get(key)
+    if template is None:
+        with _template_forms_lock:
+            template = _template_forms.get(key)
+            if template is None:
+                from pypdf import PdfReader, PdfWriter
+                from pypdf.generic import DecodedStreamObject, NameObject
+
+                buffer = BytesIO()
+                p = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+                name_y = draw_certificate_template(p, *A4)
+                p.showPage()
+                p.save()
+
+                # ReportLab's own forms drop shading resources, so the rendered
+                # page is turned into a form XObject instead
+                page = PdfReader(BytesIO(buffer.getvalue())).pages[0]
+                form = DecodedStreamObject()
+                form.set_data(page['/Contents'].get_object().get_data())
+                form.update({
+                    NameObject('/Type'): NameObject('/XObject'),
+                    NameObject('/Subtype'): NameObject('/Form'),
+                    NameObject('/BBox'): page.mediabox,
+                    NameObject('/Resources'): page['/Resources'],
+                })
+                form = form.flate_encode()
+                # Cloning once loads every object of the page, so later clones never touch the reader's stream
+                form.clone(PdfWriter())
+                template = (form, name_y)
+                _template_forms.clear()
+                _template_forms[key] = template
+    return template
+
+
+def merge_onto_template(layer_pdf, template_form):
+    """Paint the template form underneath the one-page PDF `layer_pdf` and return the merged PDF"""
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    page = writer.add_page(PdfReader(BytesIO(layer_pdf)).pages[0])
+
+    form_name = NameObject(TEMPLATE_FORM_NAME)
+    resources = page['/Resources'].get_object()
+    if '/XObject' not in resources:
+        resources[NameObject('/XObject')] = DictionaryObject()
+    resources['/XObject'].get_object()[form_name] = writer._add_object(template_form.clone(writer))
+
+    # The layer's own content is copied as-is; only the form call is prepended
+    content = DecodedStreamObject()
+    content.set_data(b'q %s Do Q\n' % form_name.encode() + page['/Contents'].get_object().get_data())
+    page.replace_contents(content.flate_encode())
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,92 @@
+"""
+Vector QR codes for certificates.
+
+The QR matrix is computed once per payload (verification URL plus signed
+token, see tokens.py) and cached under the payload's SHA-256, which is also
+stored on the certificate as qr_hash. From the matrix the web page gets a
+compact SVG (one path of horizontal runs) and the PDF draws the same runs as
+ReportLab rectangles, so no bitmap is encoded, decoded or embedded.
+Regenerating a certificate whose payload is unchanged skips QR work entirely.
+Each process also keeps the most recent matrices in memory, so repeat requests
+for the same certificate skip the shared cache round-trip too.
+"""
+import functools
+import hashlib
+import qrcode
+from django.core.cache import cache
+
+QR_MATRIX_KEY = 'certificates:qr_matrix:{}'
+QR_BORDER = 2
+
+DEFAULT_MATRIX_CACHE_TIMEOUT = 60 * 60 * 24
+QR_MATRIX_MEMO_SIZE = 256
+
+
+def qr_payload(certificate):
+    """Text encoded in a certificate's QR code: the verification URL with its signed token"""
+    from .tokens import make_token
+
+    separator = '&' if '?' in certificate.verification_url else '?'
+    return f"{certificate.verification_url}{separator}t={make_token(certificate)}"
+
+
+def payload_hash(data):
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def get_qr_matrix(data, digest=None):
+    """QR modules (rows of '0'/'1', quiet zone included) for the payload, cached by its hash"""
+    return _memoised_matrix(digest or payload_hash(data), data)
+
+
+@functools.lru_cache(maxsize=QR_MATRIX_MEMO_SIZE)
+def _memoised_matrix(digest, data):
+    """In-process memo in front of the shared cache; the digest identifies the payload"""
+    key = QR_MATRIX_KEY.format(digest)
+    matrix = cache.get(key)
+    if matrix is None:
+        qr = qrcode.QRCode(
+            version=None,  # Smallest version that fits the data
+            error_correction=qrcode.constants.ERROR_CORRECT_M,
+            border=QR_BORDER,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+        matrix = [''.join('1' if module else '0' for module in row) for row in qr.get_matrix()]
+        cache.set(key, matrix, DEFAULT_MATRIX_CACHE_TIMEOUT)
+    return tuple(matrix)  # Shared between callers, so immutable
+
+
+def _runs(matrix):
+    """Horizontal runs of dark modules as (x, y, length), y counted from the top"""
+    for y, row in enumerate(matrix):
+        x = 0
+        size = len(row)
+        while x < size:
+            if row[x] == '1':
+                start = x
+                while x < size and row[x] == '1':
+                    x += 1
+                yield start, y, x - start
+            else:
+                x += 1
+
+
+def qr_svg(matrix):
+    """Standalone SVG document for a QR matrix, one unit per module"""
+    size = len(matrix)
+    path = ''.join(f'M{x} {y}h{length}v1h-{length}z' for x, y, length in _runs(matrix))
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{path}" fill="#000"/></svg>'
+    )
+
+
+def draw_qr(p, matrix, x, y, size):
+    """Draw a QR matrix as vector rectangles on canvas `p` with its lower-left corner at (x, y)"""
+    modules = len(matrix)
+    module = size / modules
+    path = p.beginPath()
+    for run_x, run_y, length in _runs(matrix):
+        path.rect(x + run_x * module, y + (modules - run_y - 1) * module, length * module, module)
+    p.drawPath(path, stroke=0, fill=1)
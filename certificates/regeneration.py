@@ -0,0 +1,206 @@
+"""
+Bulk regeneration of certificate QR codes and PDFs.
+
+Certificates are read in primary-key chunks with their user and course in
+one query, rendered in a process pool and their new file paths written back
+with one bulk_update per chunk. Workers never touch the database: each one
+receives a plain dict and renders from unsaved model instances, so the pool
+scales with CPU cores. Progress is checkpointed after every chunk so an
+interrupted run can be resumed (see the regenerate_certificates command).
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from .models import Certificate
+from .verification import invalidate_verification
+
+
+def certificate_payload(certificate):
+    """Plain data needed to render a certificate outside the database"""
+    user = certificate.user
+    return {
+        'id': certificate.id,
+        'certificate_number': certificate.certificate_number,
+        'issue_date': certificate.issue_date,
+        'overall_score': certificate.overall_score,
+        'verification_url': certificate.verification_url,
+        'course_title': certificate.course.title if certificate.course else None,
+        'interactive_title': certificate.interactive_course.title if certificate.interactive_course else None,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'qr_name': certificate.qr_code.name,
+        'qr_hash': certificate.qr_hash,
+        'old_files': [name for name in (certificate.qr_code.name, certificate.pdf_file.name) if name],
+    }
+
+
+def _init_worker():
+    # Needed where workers are spawned rather than forked (e.g. Windows)
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def render_payload(payload):
+    """
+    Render QR code and PDF for one certificate payload (runs in a worker).
+
+    The QR code is kept when its payload is unchanged. Returns
+    (id, qr_name, qr_hash, pdf_name, error).
+    """
+    from accounts.models import User
+    from courses.models import Course
+    from videos.models import InteractiveCourse
+    from .views import generate_certificate_pdf
+
+    try:
+        certificate = Certificate(
+            id=payload['id'],
+            certificate_number=payload['certificate_number'],
+            issue_date=payload['issue_date'],
+            overall_score=payload['overall_score'],
+            verification_url=payload['verification_url'],
+            qr_code=payload['qr_name'],
+            qr_hash=payload['qr_hash'],
+            user=User(
+                username=payload['username'], first_name=payload['first_name'],
+                last_name=payload['last_name'], email=payload['email'],
+            ),
+        )
+        if payload['course_title'] is not None:
+            certificate.course = Course(title=payload['course_title'])
+        elif payload['interactive_title'] is not None:
+            certificate.interactive_course = InteractiveCourse(title=payload['interactive_title'])
+
+        certificate.generate_qr_code()
+        generate_certificate_pdf(certificate)
+        return payload['id'], certificate.qr_code.name, certificate.qr_hash, certificate.pdf_file.name, None
+    except Exception as e:
+        return payload['id'], None, None, None, str(e) or e.__class__.__name__
+
+
+def filter_certificates(course_id=None, interactive_course_id=None, since=None, until=None, only_missing=False,
+                        department=None):
+    """Certificates selected by the regeneration/export filters"""
+    certificates = Certificate.objects.all()
+    if course_id:
+        certificates = certificates.filter(course_id=course_id)
+    if interactive_course_id:
+        certificates = certificates.filter(interactive_course_id=interactive_course_id)
+    if since:
+        certificates = certificates.filter(issue_date__date__gte=since)
+    if until:
+        certificates = certificates.filter(issue_date__date__lte=until)
+    if department:
+        certificates = certificates.filter(user__department__iexact=department)
+    if only_missing:
+        certificates = certificates.filter(Q(pdf_file='') | Q(qr_code='') | ~Q(render_status='ready'))
+    return certificates
+
+
+def load_checkpoint(path, filters):
+    """Last finished certificate id for a resumable run with the same filters"""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('filters') != filters:
+        raise ValueError('The checkpoint was written by a run with different filters')
+    return checkpoint.get('last_id', 0)
+
+
+def save_checkpoint(path, filters, last_id):
+    if not path:
+        return
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'filters': filters, 'last_id': last_id}, f)
+    os.replace(tmp_path, path)
+
+
+def save_render_results(by_id, results, old_files):
+    """
+    Write render_payload() results back with one bulk_update.
+
+    `by_id` maps ids to the certificates that were rendered and `old_files`
+    ids to their previous file names, which are deleted once replaced.
+    Returns (rendered certificates, [(certificate_id, error)]).
+    """
+    updated = []
+    rendered = []
+    failures = []
+    now = timezone.now()
+    for certificate_id, qr_name, qr_hash, pdf_name, error in results:
+        certificate = by_id[certificate_id]
+        if error:
+            failures.append((certificate_id, error))
+            certificate.render_error = error[:2000]
+            # Keep serving the previous PDF if there is one
+            if not certificate.pdf_file:
+                certificate.render_status = 'failed'
+        else:
+            certificate.qr_code.name = qr_name
+            certificate.qr_hash = qr_hash
+            certificate.pdf_file.name = pdf_name
+            certificate.render_status = 'ready'
+            certificate.render_error = ''
+            certificate.rendered_at = now
+            rendered.append(certificate)
+        updated.append(certificate)
+
+    Certificate.objects.bulk_update(
+        updated, ['qr_code', 'qr_hash', 'pdf_file', 'render_status', 'render_error', 'rendered_at']
+    )
+    # bulk_update sends no post_save signals
+    invalidate_verification([certificate.certificate_number for certificate in updated])
+
+    # Remove files replaced by this run
+    for certificate in rendered:
+        current = {certificate.qr_code.name, certificate.pdf_file.name}
+        for name in old_files.get(certificate.id, ()):
+            if name not in current:
+                default_storage.delete(name)
+    return rendered, failures
+
+
+def regenerate_certificates(certificates, workers=None, chunk_size=200, start_after=0, on_chunk=None):
+    """
+    Regenerate the given certificates in parallel.
+
+    `on_chunk(last_id, done, failed)` is called after each chunk has been
+    written to the database. Returns (regenerated, failures) where failures
+    is a list of (certificate_id, error).
+    """
+    certificates = certificates.select_related('user', 'course', 'interactive_course').order_by('id')
+    regenerated = 0
+    failures = []
+    last_id = start_after
+
+    # Children must not inherit open database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        while True:
+            chunk = list(certificates.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            payloads = [certificate_payload(certificate) for certificate in chunk]
+            old_files = {payload['id']: payload['old_files'] for payload in payloads}
+            by_id = {certificate.id: certificate for certificate in chunk}
+
+            results = pool.map(render_payload, payloads)
+            rendered, chunk_failures = save_render_results(by_id, results, old_files)
+            regenerated += len(rendered)
+            failures.extend(chunk_failures)
+
+            if on_chunk:
+                on_chunk(last_id, regenerated, len(failures))
+
+    return regenerated, failures
@@ -0,0 +1,89 @@
+"""
+Background rendering of certificate QR codes and PDFs.
+
+Issuing a certificate only creates its row (render_status 'pending'); the QR
+code and PDF are rendered by a Celery worker once the surrounding transaction
+commits, so quiz submission never waits for ReportLab. When Celery is
+disabled (CERTIFICATE_RENDER_ASYNC = False) or the broker cannot be reached,
+rendering falls back to running inline.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Certificate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STALE_AFTER = 10 * 60
+
+
+def render_certificate(certificate_id):
+    """
+    Render the QR code and PDF of a certificate and mark it ready.
+
+    Returns True on success. Failures are recorded on the certificate
+    (render_status 'failed' and render_error) and re-raised for the caller.
+    """
+    certificate = Certificate.objects.select_related(
+        'user', 'course', 'interactive_course'
+    ).get(pk=certificate_id)
+
+    Certificate.objects.filter(pk=certificate_id).update(render_status='rendering', render_error='')
+    try:
+        # Import here to avoid circular imports
+        from .views import generate_certificate_pdf
+
+        certificate.generate_qr_code()
+        generate_certificate_pdf(certificate)
+    except Exception as e:
+        logger.exception('Certificate rendering failed: certificate=%s', certificate_id)
+        Certificate.objects.filter(pk=certificate_id).update(render_status='failed', render_error=str(e)[:2000])
+        raise
+
+    certificate.render_status = 'ready'
+    certificate.render_error = ''
+    certificate.rendered_at = timezone.now()
+    certificate.save(update_fields=['qr_code', 'qr_hash', 'pdf_file', 'render_status', 'render_error', 'rendered_at'])
+    return True
+
+
+def _dispatch(certificate_id):
+    if getattr(settings, 'CERTIFICATE_RENDER_ASYNC', True):
+        try:
+            from .tasks import render_certificate_task
+            # Give up on an unreachable broker quickly and render inline instead
+            render_certificate_task.apply_async(
+                (certificate_id,),
+                retry_policy={'max_retries': 2, 'interval_start': 0, 'interval_step': 0.5},
+            )
+            return
+        except Exception:
+            logger.warning('Could not queue certificate rendering, rendering inline: certificate=%s', certificate_id)
+    try:
+        render_certificate(certificate_id)
+    except Exception:
+        pass  # Recorded on the certificate; the download view retries
+
+
+def queue_certificate_render(certificate):
+    """Schedule rendering of a new certificate once the current transaction commits"""
+    certificate_id = certificate.pk
+    transaction.on_commit(lambda: _dispatch(certificate_id))
+
+
+def queue_certificate_renders(certificate_ids):
+    """Schedule rendering of many new certificates once the current transaction commits"""
+    certificate_ids = list(certificate_ids)
+    transaction.on_commit(lambda: [_dispatch(certificate_id) for certificate_id in certificate_ids])
+
+
+def is_render_stale(certificate):
+    """True when a certificate has waited too long for a worker and should be rendered on demand"""
+    if certificate.render_status == 'failed':
+        return True
+    if certificate.render_status == 'ready':
+        return not certificate.pdf_file
+    stale_after = getattr(settings, 'CERTIFICATE_RENDER_STALE_AFTER', DEFAULT_STALE_AFTER)
+    return certificate.created_at < timezone.now() - timedelta(seconds=stale_after)
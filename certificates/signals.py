@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Certificate
+from .verification import invalidate_verification
+
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def certificate_changed(sender, instance, **kwargs):
+    """Revocation, regeneration or removal must show up on the public verification page"""
+    invalidate_verification([instance.certificate_number])
@@ -0,0 +1,31 @@
+from celery import shared_task
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=60)
+def render_certificate_task(self, certificate_id):
+    """Render a certificate's QR code and PDF in the background"""
+    from .models import Certificate
+    from .rendering import render_certificate
+
+    try:
+        render_certificate(certificate_id)
+    except Certificate.DoesNotExist:
+        return  # Deleted before the worker picked it up
+    except Exception as e:
+        raise self.retry(exc=e)
+
+
+@shared_task(ignore_result=True)
+def issue_eligible_certificates_task():
+    """Periodic job issuing certificates to everyone who has met the requirements"""
+    from .eligibility import issue_missing_certificates
+
+    issue_missing_certificates()
+
+
+@shared_task(ignore_result=True)
+def send_certificate_emails_task():
+    """Periodic job emailing rendered certificates to their recipients"""
+    from .delivery import send_certificate_emails
+
+    send_certificate_emails()
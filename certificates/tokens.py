@@ -0,0 +1,51 @@
+"""
+Compact signed verification tokens for certificate QR codes.
+
+A token carries the certificate number, recipient name, course title, score
+and issue date, signed with an HMAC (django.core.signing, keyed by
+SECRET_KEY). Verifying a token is CPU only: the signature proves the details
+were issued by this LMS, and only revocation needs a lookup, which goes
+through the cached verification data (see verification.py). The QR code holds
+the verification URL with the token instead of a free-text summary, so it
+needs a far smaller QR version.
+"""
+from django.core import signing
+
+TOKEN_SALT = 'certificates.verification-token'
+
+
+def _signer():
+    return signing.Signer(salt=TOKEN_SALT)
+
+
+def make_token(certificate):
+    """Signed token for a certificate (does not need a saved instance)"""
+    user = certificate.user
+    payload = [
+        certificate.certificate_number,
+        user.get_full_name() or user.username,
+        certificate.get_course_title(),
+        f'{certificate.overall_score:.1f}',
+        certificate.issue_date.strftime('%Y%m%d'),
+    ]
+    return _signer().sign_object(payload, compress=True)
+
+
+def read_token(token):
+    """
+    Return the details signed into a token, or None if it was tampered with.
+
+    The result is {'certificate_number', 'recipient_name', 'course_title',
+    'overall_score', 'issue_date'} with the date as YYYY-MM-DD.
+    """
+    try:
+        number, name, course_title, score, issued = _signer().unsign_object(token)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return {
+        'certificate_number': number,
+        'recipient_name': name,
+        'course_title': course_title,
+        'overall_score': score,
+        'issue_date': f'{issued[:4]}-{issued[4:6]}-{issued[6:8]}',
+    }
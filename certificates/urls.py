@@ -7,6 +7,9 @@ urlpatterns = [
     path('', views.my_certificates_view, name='my_certificates'),
     path('<int:certificate_id>/', views.certificate_detail_view, name='detail'),
     path('<int:certificate_id>/download/', views.download_certificate_view, name='download'),
+    path('<int:certificate_id>/qr/', views.download_qr_code_view, name='qr_code'),
+    path('<int:certificate_id>/status/', views.certificate_status_view, name='status'),
     path('verify/<str:certificate_number>/', views.verify_certificate_view, name='verify'),
+    path('api/verify/', views.verify_token_api, name='verify_token'),
     path('generate/', views.generate_certificate_view, name='generate'),
 ]
@@ -0,0 +1,74 @@
+"""
+Cached public certificate verification.
+
+The verification page is public and linked from every QR code, so auditors
+scanning a stack of certificates or bots probing numbers would otherwise hit
+the database on each request. The page's data is cached per certificate
+number as a plain dict (no lazy user/course lookups). Unknown numbers get a
+short-lived negative entry so a new certificate becomes verifiable quickly.
+Entries are dropped whenever a certificate is saved or deleted (see
+signals.py) and after bulk regeneration.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from .models import Certificate
+
+VERIFY_KEY = 'certificates:verify:{}'
+
+DEFAULT_VERIFY_CACHE_TIMEOUT = 60 * 60 * 6
+DEFAULT_VERIFY_NEGATIVE_TIMEOUT = 60
+
+# Cached for unknown certificate numbers
+NOT_FOUND = {'found': False}
+
+
+def _key(certificate_number):
+    # Numbers come from the URL, so hash them into a safe, bounded key
+    return VERIFY_KEY.format(hashlib.md5(certificate_number.encode()).hexdigest())
+
+
+def build_verification(certificate_number):
+    """Load the verification data for a certificate number in one query"""
+    certificate = Certificate.objects.select_related('user', 'course', 'interactive_course').filter(
+        certificate_number=certificate_number
+    ).first()
+    if certificate is None:
+        return NOT_FOUND
+
+    user = certificate.user
+    if certificate.course:
+        description = certificate.course.description
+    elif certificate.interactive_course:
+        description = certificate.interactive_course.description
+    else:
+        description = ''
+    return {
+        'found': True,
+        'certificate_number': certificate.certificate_number,
+        'is_valid': certificate.is_valid,
+        'recipient_name': user.get_full_name() or user.username,
+        'course_title': certificate.get_course_title(),
+        'course_description': description,
+        'overall_score': certificate.overall_score,
+        'issue_date': certificate.issue_date,
+    }
+
+
+def get_verification(certificate_number):
+    """Return the verification dict for a certificate number, from the cache when possible"""
+    key = _key(certificate_number)
+    verification = cache.get(key)
+    if verification is None:
+        verification = build_verification(certificate_number)
+        if verification['found']:
+            timeout = getattr(settings, 'CERTIFICATE_VERIFY_CACHE_TIMEOUT', DEFAULT_VERIFY_CACHE_TIMEOUT)
+        else:
+            timeout = getattr(settings, 'CERTIFICATE_VERIFY_NEGATIVE_TIMEOUT', DEFAULT_VERIFY_NEGATIVE_TIMEOUT)
+        cache.set(key, verification, timeout)
+    return verification
+
+
+def invalidate_verification(certificate_numbers):
+    """Drop cached verification entries after certificates change"""
+    cache.delete_many([_key(number) for number in certificate_numbers if number])
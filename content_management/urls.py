@@ -10,6 +10,7 @@ urlpatterns = [
     path('course/<int:course_id>/edit/', views.edit_course_settings, name='edit_course'),
     path('course/<int:course_id>/video/', views.video_upload, name='video_upload'),
     path('course/<int:course_id>/questions/', views.question_bank, name='question_bank'),
+    path('course/<int:course_id>/questions/import/', views.import_course_questions, name='import_course_questions'),
     path('video/record/save/', views.save_recorded_video, name='save_recorded_video'),
     path('video/<int:video_id>/subtitles/upload/', views.upload_subtitles_view, name='upload_subtitles'),
     path('video/<int:video_id>/delete/', views.delete_video, name='delete_video'),
@@ -26,6 +27,7 @@ urlpatterns = [
     # Interactive Course Questions
     path('interactive/<int:interactive_id>/questions/', views.interactive_question_bank, name='interactive_question_bank'),
     path('interactive/<int:interactive_id>/questions/add/', views.add_interactive_question, name='add_interactive_question'),
+    path('interactive/<int:interactive_id>/questions/import/', views.import_interactive_questions, name='import_interactive_questions'),
     path('interactive/<int:interactive_id>/questions/<int:question_id>/edit/', views.edit_interactive_question, name='edit_interactive_question'),
     path('interactive/<int:interactive_id>/questions/<int:question_id>/delete/', views.delete_interactive_question, name='delete_interactive_question'),
     
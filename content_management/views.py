@@ -10,7 +10,15 @@ from django.db.models import Avg, Count, Q
 from django.conf import settings
 from courses.models import Course, Enrollment
 from videos.models import Video, VideoSubtitle, VideoProgress, InteractiveCourse, InteractiveCourseProgress
+from videos.streaming import signed_stream_url
+from videos.probe import apply_probe, probe_video
+from videos.transcoding import delete_hls_files, queue_video_transcode
 from quizzes.models import Question, QuestionOption, QuizAttempt, QuizAnswer
+from quizzes.answer_keys import get_answer_keys, correct_option_texts, invalidate_answer_keys
+from quizzes.sampling import invalidate_question_pools
+from quizzes.item_analysis import apply_bank_filters
+from quizzes.importers import import_questions, QuestionImportError
+from quizzes.options import options_from_post, reconcile_options
 from accounts.models import User
 import json
 import os
@@ -28,73 +36,6 @@ from django.utils.dateparse import parse_datetime
 
 logger = logging.getLogger(__name__)
 
-# Try to import moviepy, fallback to basic duration if not available
-try:
-    from moviepy.editor import VideoFileClip
-    MOVIEPY_AVAILABLE = True
-except ImportError:
-    MOVIEPY_AVAILABLE = False
-    print("MoviePy not available, using basic duration estimation")
-
-def calculate_video_duration(video_file):
-    """Calculate video duration with better error handling"""
-    try:
-        # Reset file pointer to beginning
-        video_file.seek(0)
-        file_size = video_file.size
-        
-        if MOVIEPY_AVAILABLE:
-            try:
-                # Use moviepy for accurate duration calculation
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_file:
-                    # Write the video content to temp file
-                    video_file.seek(0)
-                    for chunk in video_file.chunks():
-                        temp_file.write(chunk)
-                    temp_file_path = temp_file.name
-                
-                # Calculate duration using moviepy
-                video_clip = VideoFileClip(temp_file_path)
-                duration = video_clip.duration
-                video_clip.close()
-                
-                # Clean up temp file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                
-                # Validate duration - MoviePy should give accurate results
-                if duration and duration > 0:
-                    print(f"MoviePy calculated duration: {duration} seconds")
-                    return int(duration)
-                else:
-                    print(f"MoviePy returned invalid duration: {duration}, using fallback")
-                    
-            except Exception as moviepy_error:
-                print(f"MoviePy error: {moviepy_error}")
-        
-        # Improved fallback estimation for browser-recorded WebM files
-        if file_size > 0:
-            # Browser recordings are typically much more compressed
-            # WebM from browser MediaRecorder: roughly 100-200 KB per second
-            # For a 3:14 video (194 seconds), expect ~19-38 MB file
-            
-            # More conservative estimation for WebM browser recordings
-            bytes_per_second = 150 * 1024  # ~150KB per second average
-            estimated_duration = file_size / bytes_per_second
-            
-            # Clamp to reasonable bounds (10 seconds to 1 hour)
-            estimated_duration = max(10, min(3600, estimated_duration))
-            
-            print(f"Fallback estimation: {file_size} bytes / {bytes_per_second} = {estimated_duration} seconds")
-            return int(estimated_duration)
-        
-        print("No file size available, using default duration")
-        return 30  # Default fallback
-            
-    except Exception as e:
-        print(f"Error calculating video duration: {e}")
-        return 30  # Safe default
-
 @login_required
 def content_dashboard(request):
     """Content management dashboard for Head of Risk and Risk & Compliance Specialist"""
@@ -236,22 +177,17 @@ def video_upload(request, course_id):
         )
         
         if 'video_file' in request.FILES:
-            video_file = request.FILES['video_file']
-            video.video_file = video_file
-            
-            # Try to verify duration from uploaded file if needed
-            try:
-                calculated_duration = calculate_video_duration(video_file)
-                if calculated_duration and abs(calculated_duration - duration_seconds) > 5:
-                    # If calculated duration differs significantly from provided duration
-                    messages.warning(request, 
-                        f'Note: Calculated duration ({calculated_duration}s) differs from provided duration ({duration_seconds}s). '
-                        'Using provided duration.')
-            except Exception as e:
-                # Duration calculation failed, but continue with provided duration
-                pass
-                
+            video.video_file = request.FILES['video_file']
             video.save()
+            
+            # Read the real duration from the stored file's headers
+            info = probe_video(video.video_file)
+            if info and info['duration'] and abs(info['duration'] - duration_seconds) > 5:
+                messages.warning(request, 
+                    f'Note: The file is {round(info["duration"])}s long, not {duration_seconds}s as entered. '
+                    'Using the duration of the file.')
+            video.save(update_fields=apply_probe(video, info))
+            queue_video_transcode(video)
         
         # Handle automatic translation (will be processed in background)
         target_languages = request.POST.getlist('languages')
@@ -270,7 +206,9 @@ def video_upload(request, course_id):
             'Translation in progress...')
         return redirect('content:course_detail', course_id=course.id)
     
-    videos = Video.objects.filter(course=course).order_by('order_index')
+    videos = list(Video.objects.filter(course=course).order_by('order_index'))
+    for video in videos:
+        video.stream_url = signed_stream_url(video, request.user) if video.video_file else ''
     context = {
         'course': course,
         'videos': videos,
@@ -345,21 +283,24 @@ def save_recorded_video(request):
         
         course = get_object_or_404(Course, id=course_id, created_by=request.user)
         
-        # Calculate video duration
-        duration = calculate_video_duration(video_blob)
-        
-        # Reset file pointer after duration calculation
-        video_blob.seek(0)
-        
         video = Video.objects.create(
             course=course,
             title=title,
             video_file=video_blob,
-            duration=duration,
             file_size=video_blob.size,
             order_index=Video.objects.filter(course=course).count()
         )
         
+        # Duration of the stored recording from its headers
+        info = probe_video(video.video_file)
+        if not info:
+            video.video_file.delete(save=False)
+            video.delete()
+            return JsonResponse({'error': 'The recording could not be read. Please record it again.'}, status=400)
+        video.save(update_fields=apply_probe(video, info))
+        duration = video.duration
+        queue_video_transcode(video)
+        
         return JsonResponse({
             'success': True,
             'video_id': video.id,
@@ -1129,21 +1070,72 @@ def question_bank(request, course_id):
                 order_index=idx
             )
         
+        invalidate_answer_keys([question.id])
+        invalidate_question_pools(course_ids=[course.id])
+        
         messages.success(request, 'Question added successfully!')
         return redirect('content:question_bank', course_id=course.id)
     
-    questions = Question.objects.filter(course=course).order_by('topic', '-created_at')
+    questions = Question.objects.filter(course=course).order_by('topic', '-created_at').prefetch_related('options')
+    # Sort/filter by item statistics (difficulty, discrimination, exposure) within each topic
+    questions = apply_bank_filters(questions, request.GET, group_by_topic=True)
     context = {
         'course': course,
         'questions': questions,
+        'topics': Question.objects.filter(course=course).exclude(topic='').values_list('topic', flat=True).distinct().order_by('topic'),
+        'difficulty_levels': Question.DIFFICULTY_LEVELS,
+        'sort': request.GET.get('sort', ''),
+        'flag': request.GET.get('flag', ''),
+        'topic_filter': request.GET.get('topic', ''),
+        'difficulty_filter': request.GET.get('difficulty', ''),
     }
     return render(request, 'content/question_bank.html', context)
 
+def _import_question_file(request, course=None, interactive_course=None):
+    """Run a bulk question import from an uploaded file and report the outcome as messages"""
+    upload = request.FILES.get('question_file')
+    if not upload:
+        messages.error(request, 'Please choose an .xlsx or .csv file to import.')
+        return
+    
+    try:
+        result = import_questions(upload, upload.name, course=course, interactive_course=interactive_course)
+    except QuestionImportError as e:
+        messages.error(request, str(e))
+        return
+    except Exception as e:
+        logger.exception('Question import failed: file=%s', upload.name)
+        messages.error(request, f'Error importing questions: {str(e)}')
+        return
+    
+    if result['errors']:
+        messages.error(
+            request,
+            f"No questions were imported: {len(result['errors'])} row(s) have errors. Fix them and upload again."
+        )
+        for row_number, error in result['errors'][:20]:
+            messages.warning(request, f'Row {row_number}: {error}')
+        if len(result['errors']) > 20:
+            messages.warning(request, f"... and {len(result['errors']) - 20} more row(s) with errors.")
+    else:
+        messages.success(request, f"{result['created']} question(s) imported successfully!")
+
+
+@login_required
+@require_POST
+def import_course_questions(request, course_id):
+    """Bulk import questions into a course question bank from XLSX/CSV"""
+    course = get_object_or_404(Course, id=course_id, created_by=request.user)
+    _import_question_file(request, course=course)
+    return redirect('content:question_bank', course_id=course.id)
+
 @login_required
 def course_detail(request, course_id):
     """View course details with videos and questions"""
     course = get_object_or_404(Course, id=course_id, created_by=request.user)
-    videos = Video.objects.filter(course=course).order_by('order_index')
+    videos = list(Video.objects.filter(course=course).order_by('order_index'))
+    for video in videos:
+        video.stream_url = signed_stream_url(video, request.user) if video.video_file else ''
     questions = Question.objects.filter(course=course).order_by('topic')
     interactive_courses = InteractiveCourse.objects.filter(course=course).order_by('order_index')
     
@@ -1184,6 +1176,7 @@ def delete_video(request, video_id):
                     video.video_file.delete(save=False)
                 except:
                     pass  # File might already be deleted
+            delete_hls_files(video.id)
             
             # Delete subtitle files
             for subtitle in video.subtitles.all():
@@ -1226,6 +1219,8 @@ def delete_question(request, question_id):
             question_text = question.question_text[:50] + "..." if len(question.question_text) > 50 else question.question_text
             course_id = question.course.id
             question.delete()
+            invalidate_answer_keys([question_id])
+            invalidate_question_pools(course_ids=[course_id])
             
             messages.success(request, f'Question "{question_text}" deleted successfully!')
             
@@ -1731,15 +1726,20 @@ def download_user_performance_report(request):
     # Get detailed answer data
     user_answers = QuizAnswer.objects.select_related(
         'attempt__user', 'attempt__course', 'question'
-    ).order_by('-attempt__completed_at')
+    ).prefetch_related('selected_options').order_by('-attempt__completed_at')
+    
+    # Correct answers come from the answer-key cache instead of one query per row
+    answer_keys = get_answer_keys(
+        user_answers.exclude(question__isnull=True).values_list('question_id', flat=True).distinct()
+    )
     
     for row, answer in enumerate(user_answers, 2):
         attempt = answer.attempt
         question = answer.question
         
         # Find correct answer
-        correct_option = question.options.filter(is_correct=True).first()
-        correct_text = correct_option.option_text if correct_option else "N/A"
+        correct_texts = correct_option_texts(answer_keys[question.id]) if question.id in answer_keys else []
+        correct_text = ", ".join(correct_texts) if correct_texts else "N/A"
         
         # Get user's selected answers (could be multiple for multiple answer questions)
         selected_options = answer.selected_options.all()
@@ -1816,6 +1816,20 @@ def interactive_question_bank(request, interactive_id):
     return render(request, 'content/interactive_question_bank.html', context)
 
 
+@login_required
+@require_POST
+def import_interactive_questions(request, interactive_id):
+    """Bulk import questions into an interactive course question bank from XLSX/CSV"""
+    interactive_course = get_object_or_404(InteractiveCourse, id=interactive_id)
+    
+    if not request.user.is_risk_admin() and interactive_course.course.created_by != request.user:
+        messages.error(request, "You don't have permission to manage questions for this course.")
+        return redirect('courses:dashboard')
+    
+    _import_question_file(request, interactive_course=interactive_course)
+    return redirect('content:interactive_question_bank', interactive_id=interactive_course.id)
+
+
 @login_required
 def add_interactive_question(request, interactive_id):
     """Add a new question to an interactive course"""
@@ -1865,6 +1879,9 @@ def add_interactive_question(request, interactive_id):
                 )
                 order_index += 1
         
+        invalidate_answer_keys([question.id])
+        invalidate_question_pools(interactive_course_ids=[interactive_id])
+        
         messages.success(request, f'Question added successfully! Total questions: {Question.objects.filter(interactive_course=interactive_course).count()}')
         return redirect('content:interactive_question_bank', interactive_id=interactive_id)
     
@@ -1895,26 +1912,14 @@ def edit_interactive_question(request, interactive_id, question_id):
         question.difficulty = request.POST.get('difficulty', 'medium')
         question.points = int(request.POST.get('points', 1))
         question.explanation = request.POST.get('explanation', '').strip()
-        question.save()
         
-        # Update options - delete old ones and create new
-        question.options.all().delete()
-        
-        # Parse individual option_X and correct_X fields
-        option_count = int(request.POST.get('option_count', 4))
-        order_index = 0
+        with transaction.atomic():
+            question.save()
+            # Update only the options that changed so answer history keeps valid option ids
+            reconcile_options(question, options_from_post(request.POST))
         
-        for i in range(1, option_count + 10):  # Check up to option_count + buffer
-            option_text = request.POST.get(f'option_{i}', '').strip()
-            if option_text:
-                is_correct = request.POST.get(f'correct_{i}') == 'on'
-                QuestionOption.objects.create(
-                    question=question,
-                    option_text=option_text,
-                    is_correct=is_correct,
-                    order_index=order_index
-                )
-                order_index += 1
+        invalidate_answer_keys([question.id])
+        invalidate_question_pools(interactive_course_ids=[interactive_id])
         
         messages.success(request, 'Question updated successfully!')
         return redirect('content:interactive_question_bank', interactive_id=interactive_id)
@@ -1942,6 +1947,8 @@ def delete_interactive_question(request, interactive_id, question_id):
     
     if request.method == 'POST':
         question.delete()
+        invalidate_answer_keys([question_id])
+        invalidate_question_pools(interactive_course_ids=[interactive_id])
         messages.success(request, 'Question deleted successfully!')
     
     return redirect('content:interactive_question_bank', interactive_id=interactive_id)
@@ -1967,7 +1974,10 @@ def delete_interactive_course(request, interactive_id):
         InteractiveCourseProgress.objects.filter(interactive_course=interactive_course).delete()
         
         # Delete questions associated with this interactive course
-        Question.objects.filter(interactive_course=interactive_course).delete()
+        questions = Question.objects.filter(interactive_course=interactive_course)
+        question_ids = list(questions.values_list('id', flat=True))
+        questions.delete()
+        invalidate_answer_keys(question_ids)
         
         # Delete extracted files if they exist
         if interactive_course.extracted_path:
@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.db.models import Avg
 from .models import Course, Enrollment
 from videos.models import Video, VideoProgress, InteractiveCourse, InteractiveCourseProgress
+from videos.streaming import hls_js_url, signed_hls_url, signed_stream_url
 from quizzes.models import Question, QuizAttempt
 from certificates.models import Certificate
 
@@ -138,9 +139,14 @@ def course_detail_view(request, course_id):
     total_videos = videos.count()
     completed_videos = 0
     
+    # Access is checked here once; the signed URLs authorise the player's range requests
+    can_watch = is_enrolled or request.user.is_risk_admin()
+    
     for video in videos:
         video_data = {
             'video': video,
+            'stream_url': signed_stream_url(video, request.user) if can_watch and video.video_file else '',
+            'hls_url': signed_hls_url(video, request.user) if can_watch and video.hls_ready else '',
             'progress': {
                 'is_completed': False,
                 'completion_percentage': 0,
@@ -232,6 +238,7 @@ def course_detail_view(request, course_id):
         'best_quiz_score': best_quiz_score,
         'interactive_courses': interactive_courses,
         'interactive_courses_with_progress': interactive_courses_with_progress,
+        'hls_js_url': hls_js_url(),
     }
     return render(request, 'courses/course_detail.html', context)
 
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Question, QuestionOption, QuizAttempt, QuizAnswer
+from .models import Question, QuestionOption, QuizAttempt, QuizAnswer, AttemptQuestion, QuestionStatistics
+from .answer_keys import invalidate_answer_keys
+from .sampling import invalidate_question_pools
 from risk_lms.admin import risk_admin_site
 
 class QuestionOptionInline(admin.TabularInline):
@@ -42,12 +44,42 @@ class QuestionAdmin(admin.ModelAdmin):
     def options_count(self, obj):
         return obj.options.count()
     options_count.short_description = 'Options'
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        question = form.instance
+        invalidate_answer_keys([question.id])
+        # Include the previous course so a moved question leaves its old pool
+        invalidate_question_pools(
+            [question.course_id, form.initial.get('course')],
+            [question.interactive_course_id, form.initial.get('interactive_course')]
+        )
+    
+    def delete_model(self, request, obj):
+        question_id, course_id, interactive_course_id = obj.id, obj.course_id, obj.interactive_course_id
+        super().delete_model(request, obj)
+        invalidate_answer_keys([question_id])
+        invalidate_question_pools([course_id], [interactive_course_id])
+    
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset.values_list('id', 'course_id', 'interactive_course_id'))
+        super().delete_queryset(request, queryset)
+        invalidate_answer_keys([row[0] for row in rows])
+        invalidate_question_pools({row[1] for row in rows}, {row[2] for row in rows})
+
+class AttemptQuestionInline(admin.TabularInline):
+    model = AttemptQuestion
+    extra = 0
+    fields = ['position', 'question']
+    readonly_fields = ['position', 'question']
+    can_delete = False
 
 @admin.register(QuizAttempt)
 class QuizAttemptAdmin(admin.ModelAdmin):
     list_display = ['user', 'get_course_or_interactive', 'score', 'passed', 'started_at', 'completed_at']
     list_filter = ['passed', 'course', 'interactive_course', 'started_at']
     search_fields = ['user__email', 'course__title', 'interactive_course__title']
+    inlines = [AttemptQuestionInline]
     
     def get_course_or_interactive(self, obj):
         if obj.interactive_course:
@@ -62,7 +94,15 @@ class QuizAnswerAdmin(admin.ModelAdmin):
     list_display = ['attempt', 'question', 'is_correct', 'answered_at']
     list_filter = ['is_correct', 'answered_at']
 
+@admin.register(QuestionStatistics)
+class QuestionStatisticsAdmin(admin.ModelAdmin):
+    list_display = ['question', 'times_served', 'times_correct', 'difficulty_index', 'discrimination_index', 'updated_at']
+    list_filter = ['question__course', 'question__interactive_course', 'question__difficulty']
+    search_fields = ['question__question_text', 'question__topic']
+    readonly_fields = [f.name for f in QuestionStatistics._meta.fields]
+
 # Register with custom admin site
 risk_admin_site.register(Question, QuestionAdmin)
 risk_admin_site.register(QuizAttempt, QuizAttemptAdmin)
 risk_admin_site.register(QuizAnswer, QuizAnswerAdmin)
+risk_admin_site.register(QuestionStatistics, QuestionStatisticsAdmin)
@@ -0,0 +1,95 @@
+"""
+Versioned answer-key cache for quiz questions.
+
+Each question has a content version held in the cache. Its answer key (the
+option ids, the correct option ids and the option texts) is cached under
+(question id, version), so bumping the version on every edit makes stale keys
+unreachable without having to find and delete them. Grading, results and
+reports read correctness from here instead of querying QuestionOption.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .models import QuestionOption
+
+VERSION_KEY = 'quizzes:answer_key_version:{}'
+ANSWER_KEY = 'quizzes:answer_key:{}:{}'
+
+
+def _timeout():
+    return getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _new_version():
+    # Time based so a version key evicted from the cache never comes back
+    # with a number that an older cached answer key was stored under
+    return time.time_ns()
+
+
+def get_versions(question_ids):
+    """Return {question_id: content_version} for the given questions"""
+    question_ids = list(question_ids)
+    keys = {VERSION_KEY.format(qid): qid for qid in question_ids}
+    found = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        found.update(cache.get_many(missing))
+
+    return {keys[key]: version for key, version in found.items()}
+
+
+def get_answer_keys(question_ids):
+    """
+    Return answer keys for the given questions, loading cache misses in one query.
+
+    Each entry is {'version': int, 'options': set(option_ids),
+    'correct': set(option_ids), 'texts': {option_id: option_text}}.
+    Entries for questions without options have empty sets.
+    """
+    versions = get_versions(question_ids)
+    keys = {ANSWER_KEY.format(qid, version): qid for qid, version in versions.items()}
+    cached = cache.get_many(keys)
+    answer_keys = {keys[key]: entry for key, entry in cached.items()}
+
+    missing = [qid for qid in versions if qid not in answer_keys]
+    if missing:
+        loaded = {
+            qid: {'version': versions[qid], 'options': set(), 'correct': set(), 'texts': {}}
+            for qid in missing
+        }
+        rows = QuestionOption.objects.filter(
+            question_id__in=missing
+        ).order_by('order_index', 'id').values_list('id', 'question_id', 'is_correct', 'option_text')
+
+        for option_id, question_id, is_correct, option_text in rows:
+            entry = loaded[question_id]
+            entry['options'].add(option_id)
+            entry['texts'][option_id] = option_text
+            if is_correct:
+                entry['correct'].add(option_id)
+
+        cache.set_many(
+            {ANSWER_KEY.format(qid, entry['version']): entry for qid, entry in loaded.items()},
+            _timeout()
+        )
+        answer_keys.update(loaded)
+
+    return answer_keys
+
+
+def correct_option_texts(entry):
+    """Texts of the correct options of an answer-key entry, in display order"""
+    return [text for option_id, text in entry['texts'].items() if option_id in entry['correct']]
+
+
+def invalidate_answer_keys(question_ids):
+    """Bump the content version of each question so its cached key is dropped"""
+    for qid in question_ids:
+        key = VERSION_KEY.format(qid)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
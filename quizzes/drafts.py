@@ -0,0 +1,158 @@
+"""
+Server-side draft autosave for in-progress quiz attempts.
+
+Every autosave from the quiz page replaces the draft held in the cache, which
+is cheap enough to accept on each answer change. The draft is written through
+to QuizAttempt.draft_answers at most once every QUIZ_DRAFT_FLUSH_INTERVAL
+seconds per attempt (a cache.add() lock coalesces the saves in between). A
+save that lands inside the interval marks the draft pending; pending drafts
+are written by the next page load of the attempt and by the periodic
+flush_pending_drafts() task, so the last edits survive a lost cache.
+Without a shared cache (no CACHE_URL) the Celery worker cannot see the drafts,
+so every save is written through instead.
+
+The page is rendered with the stored save sequence and counts up from it; a
+save older than the stored one is rejected as stale and the page resyncs.
+A submitted quiz form is graded as posted; the draft only stands in when the
+form did not arrive with the request.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import QuizAttempt
+
+DRAFT_KEY = 'quizzes:draft:{}'
+FLUSH_LOCK_KEY = 'quizzes:draft_flush:{}'
+PENDING_KEY = 'quizzes:draft_pending:{}'
+
+DEFAULT_FLUSH_INTERVAL = 30
+DRAFT_TIMEOUT = 60 * 60 * 4
+
+# save_draft() results
+DRAFT_STALE = 'stale'
+DRAFT_SAVED = 'saved'
+DRAFT_FLUSHED = 'flushed'
+
+
+def _flush_interval():
+    return getattr(settings, 'QUIZ_DRAFT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def _draft_timeout():
+    return max(_flush_interval() * 10, DRAFT_TIMEOUT)
+
+
+def _shared_cache():
+    """Drafts can only be coalesced when every process (and the worker) sees the same cache"""
+    return bool(getattr(settings, 'CACHE_URL', ''))
+
+
+def clean_draft(data, question_ids):
+    """Keep only answers to the attempt's questions: {str(question_id): [option_ids]}"""
+    allowed = {str(qid) for qid in question_ids}
+    answers = {}
+    for question_id, option_ids in (data or {}).items():
+        question_id = str(question_id)
+        if question_id not in allowed:
+            continue
+        if not isinstance(option_ids, list):
+            option_ids = [option_ids]
+        try:
+            answers[question_id] = sorted({int(option_id) for option_id in option_ids})
+        except (TypeError, ValueError):
+            continue
+    return answers
+
+
+def get_draft(quiz_attempt):
+    """Return the latest draft of an attempt as {'answers', 'sequence'}, flushing a pending one"""
+    draft = cache.get(DRAFT_KEY.format(quiz_attempt.pk))
+    if draft is None:
+        return {'answers': quiz_attempt.draft_answers or {}, 'sequence': 0}
+    flush_pending_draft(quiz_attempt.pk)
+    return draft
+
+
+def load_draft(quiz_attempt):
+    """Return the latest draft answers of an attempt from the cache or the database"""
+    return get_draft(quiz_attempt)['answers']
+
+
+def save_draft(quiz_attempt, answers, sequence=None):
+    """
+    Store draft answers for an attempt and flush them to the database if due.
+
+    `sequence` is the page's save counter; a save not newer than the stored
+    one is rejected so requests arriving out of order on a flaky link cannot
+    roll the draft back. Returns DRAFT_STALE, DRAFT_SAVED or DRAFT_FLUSHED.
+    """
+    key = DRAFT_KEY.format(quiz_attempt.pk)
+    current = cache.get(key)
+    if current and sequence is not None and sequence <= (current.get('sequence') or 0):
+        return DRAFT_STALE
+
+    cache.set(key, {'answers': answers, 'sequence': sequence or 0}, _draft_timeout())
+
+    # Only one save per interval reaches the database; the rest stay pending
+    if _shared_cache() and not cache.add(FLUSH_LOCK_KEY.format(quiz_attempt.pk), True, _flush_interval()):
+        cache.set(PENDING_KEY.format(quiz_attempt.pk), True, _draft_timeout())
+        return DRAFT_SAVED
+    cache.delete(PENDING_KEY.format(quiz_attempt.pk))
+    flush_draft(quiz_attempt, answers)
+    return DRAFT_FLUSHED
+
+
+def draft_sequence(quiz_attempt):
+    """The sequence of the stored draft, which a freshly rendered page counts up from"""
+    draft = cache.get(DRAFT_KEY.format(quiz_attempt.pk))
+    return (draft or {}).get('sequence') or 0
+
+
+def flush_draft(quiz_attempt, answers):
+    """Write draft answers to the attempt row unless it has already been submitted"""
+    return QuizAttempt.objects.filter(pk=quiz_attempt.pk, completed_at__isnull=True).update(
+        draft_answers=answers,
+        draft_saved_at=timezone.now(),
+    ) > 0
+
+
+def flush_pending_draft(attempt_id):
+    """Write the cached draft of an attempt to the database if a save is pending"""
+    # Clear the flag before reading, so a save racing this flush marks itself pending again
+    if not cache.delete(PENDING_KEY.format(attempt_id)):
+        return False
+    draft = cache.get(DRAFT_KEY.format(attempt_id))
+    return draft is not None and flush_draft(QuizAttempt(pk=attempt_id), draft['answers'])
+
+
+def flush_pending_drafts():
+    """Write the pending drafts of all open attempts to the database; returns the count"""
+    since = timezone.now() - timedelta(seconds=_draft_timeout())
+    attempt_ids = list(QuizAttempt.objects.filter(
+        completed_at__isnull=True, started_at__gte=since,
+    ).values_list('pk', flat=True))
+    pending = cache.get_many([PENDING_KEY.format(pk) for pk in attempt_ids])
+    return sum(
+        flush_pending_draft(attempt_id) for attempt_id in attempt_ids
+        if PENDING_KEY.format(attempt_id) in pending
+    )
+
+
+def clear_draft(quiz_attempt):
+    """Drop the cached draft once the attempt has been graded"""
+    cache.delete_many([
+        DRAFT_KEY.format(quiz_attempt.pk),
+        FLUSH_LOCK_KEY.format(quiz_attempt.pk),
+        PENDING_KEY.format(quiz_attempt.pk),
+    ])
+
+
+def selections_from_draft(answers, question_ids):
+    """Convert draft answers to the {question_id: set(option_ids)} form used by grading"""
+    selections = {}
+    for question_id in question_ids:
+        option_ids = answers.get(str(question_id))
+        if option_ids:
+            selections[question_id] = set(option_ids)
+    return selections
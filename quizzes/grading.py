@@ -0,0 +1,129 @@
+"""
+Set-based grading for quiz attempts.
+
+A submission is graded with a fixed number of queries regardless of how many
+questions the attempt holds: the answer keys of the attempt's questions come
+from the answer-key cache (at most one query on a miss), grading happens in
+memory, and the QuizAnswer rows plus their selected_options through-rows are
+written with two bulk inserts inside a single transaction.
+"""
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .models import QuizAttempt, QuizAnswer
+from .answer_keys import get_answer_keys
+from .item_analysis import record_graded_attempt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PASSING_SCORE = 80
+
+
+def selections_from_post(post_data, question_ids):
+    """Extract {question_id: set(option_ids)} from submitted quiz form data"""
+    selections = {}
+    for question_id in question_ids:
+        selected = set()
+        for value in post_data.getlist(f'question_{question_id}'):
+            try:
+                selected.add(int(value))
+            except (TypeError, ValueError):
+                selected.add(None)  # Unparseable value can never match the key
+        if selected:
+            selections[question_id] = selected
+    return selections
+
+
+def is_answer_correct(selected, correct):
+    """An answer is correct only when exactly the correct options were chosen"""
+    return bool(correct) and selected == correct
+
+
+def _record_statistics(attempt_id, served_ids, correct_ids, score):
+    """Item statistics are best effort: the attempt is already graded and committed"""
+    try:
+        record_graded_attempt(served_ids, correct_ids, score)
+    except Exception:
+        # rebuild_question_stats recovers anything lost here
+        logger.exception('Could not record item statistics: attempt=%s', attempt_id)
+
+
+def grade_attempt(quiz_attempt, selections, question_ids=None, answer_key=None):
+    """
+    Grade an attempt and persist its answers.
+
+    `selections` maps question ids to the set of option ids the user chose.
+    Returns the number of correct answers, or None if the attempt had
+    already been completed (e.g. a double submit).
+    """
+    if question_ids is None:
+        question_ids = quiz_attempt.get_question_ids()
+    if answer_key is None:
+        answer_key = get_answer_keys(question_ids)
+
+    answers = []
+    selected_by_question = {}
+    correct_ids = []
+
+    for question_id in question_ids:
+        entry = answer_key.get(question_id)
+        selected = selections.get(question_id)
+        if not entry or not entry['options'] or not selected:
+            continue
+
+        is_correct = is_answer_correct(selected, entry['correct'])
+        if is_correct:
+            correct_ids.append(question_id)
+
+        answers.append(QuizAnswer(attempt=quiz_attempt, question_id=question_id, is_correct=is_correct))
+        # Only options that belong to the question can be linked
+        selected_by_question[question_id] = selected & entry['options']
+
+    with transaction.atomic():
+        # Lock the attempt so concurrent submits cannot grade it twice
+        locked = QuizAttempt.objects.select_for_update().get(pk=quiz_attempt.pk)
+        if locked.completed_at:
+            return None
+
+        created = QuizAnswer.objects.bulk_create(answers)
+
+        # Some backends do not return primary keys from bulk inserts
+        if created and created[0].pk is None:
+            answer_ids = dict(
+                QuizAnswer.objects.filter(attempt=quiz_attempt).values_list('question_id', 'id')
+            )
+        else:
+            answer_ids = {answer.question_id: answer.pk for answer in created}
+
+        Through = QuizAnswer.selected_options.through
+        Through.objects.bulk_create([
+            Through(quizanswer_id=answer_ids[question_id], questionoption_id=option_id)
+            for question_id, option_ids in selected_by_question.items()
+            for option_id in option_ids
+        ])
+
+        correct_answers = len(correct_ids)
+        total = quiz_attempt.total_questions
+        score = (correct_answers / total) * 100 if total > 0 else 0
+
+        # Determine passing (80% for both course and interactive course)
+        passing_score = DEFAULT_PASSING_SCORE
+        if quiz_attempt.course:
+            passing_score = quiz_attempt.course.passing_score
+
+        quiz_attempt.score = score
+        quiz_attempt.correct_answers = correct_answers
+        quiz_attempt.passed = score >= passing_score
+        quiz_attempt.completed_at = timezone.now()
+        quiz_attempt.save(update_fields=['score', 'correct_answers', 'passed', 'completed_at'])
+
+        # Unanswered questions still count as served (and wrong) for item analysis
+        served_ids = [qid for qid in question_ids if answer_key.get(qid, {}).get('options')]
+        # Use the score as stored (2 decimals) so a rebuild gives identical results.
+        # Recorded after commit so concurrent submits do not hold the shared
+        # statistics rows locked for the rest of the grading transaction.
+        transaction.on_commit(
+            lambda: _record_statistics(quiz_attempt.pk, served_ids, correct_ids, round(score, 2))
+        )
+
+    return correct_answers
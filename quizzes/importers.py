@@ -0,0 +1,231 @@
+"""
+Streaming bulk import of questions from XLSX or CSV files.
+
+The file is read row by row twice: the first pass validates every row and
+collects per-row errors, the second pass (only when the whole file is valid)
+inserts questions and options with bulk_create in batches inside a single
+transaction. Neither pass holds more than one batch of rows in memory.
+
+Expected header row (case-insensitive, extra columns are ignored):
+    question_text, question_type, topic, difficulty, points, explanation,
+    option_1 ... option_N, correct
+`correct` lists the correct options by letter or number, e.g. "A", "B,D" or "2;3".
+"""
+import csv
+import io
+import re
+from collections import defaultdict
+from django.db import connection, transaction
+from .models import Question, QuestionOption
+from .sampling import invalidate_question_pools
+
+BATCH_SIZE = 200
+MAX_OPTIONS = 10
+
+QUESTION_TYPES = {value for value, label in Question.QUESTION_TYPES}
+DIFFICULTY_LEVELS = {value for value, label in Question.DIFFICULTY_LEVELS}
+TRUE_FALSE_OPTIONS = ['True', 'False']
+# Question fields set from an import row (see parse_record)
+QUESTION_FIELDS = ('question_text', 'question_type', 'topic', 'difficulty', 'points', 'explanation')
+
+
+class QuestionImportError(Exception):
+    """Raised when an import file cannot be read at all (bad format, no header)"""
+
+
+def _iter_csv(file_obj):
+    text = io.TextIOWrapper(file_obj, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(file_obj):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_records(file_obj, filename):
+    """Yield (row_number, {column: value}) for every non-empty data row"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        rows = _iter_csv(file_obj)
+    elif extension in ('xlsx', 'xlsm'):
+        rows = _iter_xlsx(file_obj)
+    else:
+        raise QuestionImportError('Unsupported file type. Upload an .xlsx or .csv file.')
+
+    header = None
+    for row_number, row in enumerate(rows, 1):
+        values = ['' if value is None else str(value).strip() for value in row]
+        if header is None:
+            header = [value.lower().replace(' ', '_') for value in values]
+            if 'question_text' not in header:
+                raise QuestionImportError('The first row must be a header containing a "question_text" column.')
+            continue
+        if not any(values):
+            continue
+        yield row_number, dict(zip(header, values))
+
+    if header is None:
+        raise QuestionImportError('The file is empty.')
+
+
+def _parse_correct(value, option_count):
+    """Turn "A,C" or "1;3" into zero-based option indexes"""
+    indexes = set()
+    for token in re.split(r'[,;/\s]+', value.strip()):
+        if not token:
+            continue
+        if token.isdigit():
+            index = int(token) - 1
+        elif len(token) == 1 and token.isalpha():
+            index = ord(token.upper()) - ord('A')
+        elif token.lower() in ('true', 'false') and option_count == 2:
+            index = 0 if token.lower() == 'true' else 1
+        else:
+            raise ValueError(f'Cannot read correct answer "{token}"')
+        if not 0 <= index < option_count:
+            raise ValueError(f'Correct answer "{token}" does not match any option')
+        indexes.add(index)
+    return indexes
+
+
+def parse_record(record):
+    """
+    Validate one row and return (question_fields, options).
+
+    options is a list of (option_text, is_correct). Raises ValueError with a
+    readable message when the row is invalid.
+    """
+    question_text = record.get('question_text', '')
+    if not question_text:
+        raise ValueError('Question text is required')
+
+    question_type = (record.get('question_type') or 'multiple_choice').lower().replace(' ', '_')
+    if question_type not in QUESTION_TYPES:
+        raise ValueError(f'Unknown question type "{question_type}"')
+
+    difficulty = (record.get('difficulty') or 'medium').lower()
+    if difficulty not in DIFFICULTY_LEVELS:
+        raise ValueError(f'Unknown difficulty "{difficulty}"')
+
+    points = record.get('points') or '1'
+    try:
+        points = int(float(points))
+    except (ValueError, OverflowError):
+        raise ValueError(f'Points must be a number, got "{points}"')
+    if points <= 0:
+        raise ValueError(f'Points must be a positive number, got "{record.get("points")}"')
+
+    option_texts = [record.get(f'option_{i}', '') for i in range(1, MAX_OPTIONS + 1)]
+    option_texts = [text for text in option_texts if text]
+    if not option_texts and question_type == 'true_false':
+        option_texts = list(TRUE_FALSE_OPTIONS)
+    if len(option_texts) < 2:
+        raise ValueError('At least two options are required')
+
+    correct = _parse_correct(record.get('correct', ''), len(option_texts))
+    if not correct:
+        raise ValueError('At least one correct option is required')
+    if len(correct) > 1 and question_type != 'multiple_answer':
+        raise ValueError('Only multiple_answer questions can have more than one correct option')
+
+    fields = {
+        'question_text': question_text,
+        'question_type': question_type,
+        'topic': record.get('topic', ''),
+        'difficulty': difficulty,
+        'points': points,
+        'explanation': record.get('explanation', ''),
+    }
+    options = [(text, index in correct) for index, text in enumerate(option_texts)]
+    return fields, options
+
+
+def validate_file(file_obj, filename):
+    """First pass: return (valid_row_count, [(row_number, error), ...])"""
+    errors = []
+    valid = 0
+    for row_number, record in iter_records(file_obj, filename):
+        try:
+            parse_record(record)
+            valid += 1
+        except ValueError as e:
+            errors.append((row_number, str(e)))
+    return valid, errors
+
+
+def _question_key(question):
+    return tuple(getattr(question, name) for name in QUESTION_FIELDS)
+
+
+def _fetch_inserted_ids(questions, course, interactive_course, after_id):
+    """Set primary keys after a bulk insert on backends that do not return them"""
+    inserted = defaultdict(list)
+    for question in Question.objects.filter(
+        pk__gt=after_id, course=course, interactive_course=interactive_course,
+    ).order_by('pk').only('pk', *QUESTION_FIELDS):
+        inserted[_question_key(question)].append(question.pk)
+    # Rows with identical fields are interchangeable, so matching them in id order is enough
+    for question in questions:
+        question.pk = inserted[_question_key(question)].pop(0)
+
+
+def _insert_batch(batch, course, interactive_course):
+    questions = [
+        Question(course=course, interactive_course=interactive_course, **fields)
+        for fields, options in batch
+    ]
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        Question.objects.bulk_create(questions)
+    else:
+        # Not every backend returns primary keys from a bulk insert
+        after_id = Question.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Question.objects.bulk_create(questions)
+        _fetch_inserted_ids(questions, course, interactive_course, after_id)
+
+    QuestionOption.objects.bulk_create([
+        QuestionOption(question=question, option_text=text, is_correct=is_correct, order_index=index)
+        for question, (fields, options) in zip(questions, batch)
+        for index, (text, is_correct) in enumerate(options)
+    ], batch_size=BATCH_SIZE * MAX_OPTIONS)
+
+
+def import_questions(file_obj, filename, course=None, interactive_course=None, dry_run=False):
+    """
+    Validate and import a question file into a course or interactive course.
+
+    Returns {'created': int, 'errors': [(row_number, message), ...]}. Nothing
+    is inserted unless every row is valid.
+    """
+    valid, errors = validate_file(file_obj, filename)
+    if errors or dry_run:
+        return {'created': 0, 'validated': valid, 'errors': errors}
+
+    file_obj.seek(0)
+    created = 0
+    batch = []
+    with transaction.atomic():
+        for row_number, record in iter_records(file_obj, filename):
+            batch.append(parse_record(record))
+            if len(batch) >= BATCH_SIZE:
+                _insert_batch(batch, course, interactive_course)
+                created += len(batch)
+                batch = []
+        if batch:
+            _insert_batch(batch, course, interactive_course)
+            created += len(batch)
+
+    invalidate_question_pools(
+        [course.id] if course else [],
+        [interactive_course.id] if interactive_course else []
+    )
+    return {'created': created, 'validated': valid, 'errors': []}
@@ -0,0 +1,177 @@
+"""
+Incremental item analysis for the question bank.
+
+Each graded attempt adds to the QuestionStatistics counters of the questions
+it served with a constant number of UPDATE statements, so per-question
+difficulty, discrimination and exposure are always available without
+scanning QuizAnswer history. rebuild_statistics() recomputes everything from
+attempt history in chunks (see the rebuild_question_stats command).
+
+A question counts as served when it has answer options (questions without
+options are left out of the score statistics): grading checks the options it
+had at grading time, the rebuild can only check the options it has now, so
+a question whose options were all removed since drops out of a rebuild.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import AttemptQuestion, QuestionStatistics, QuizAnswer, QuizAttempt
+
+SORT_FIELDS = {
+    'difficulty': 'statistics__difficulty_index',
+    'discrimination': 'statistics__discrimination_index',
+    'exposure': 'statistics__times_served',
+}
+
+
+def _ensure_rows(question_ids):
+    existing = set(
+        QuestionStatistics.objects.filter(question_id__in=question_ids).values_list('question_id', flat=True)
+    )
+    missing = [qid for qid in question_ids if qid not in existing]
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            QuestionStatistics.objects.bulk_create([QuestionStatistics(question_id=qid) for qid in missing])
+    except IntegrityError:
+        # Another submit created some of them first; create the rest one by one
+        for qid in missing:
+            QuestionStatistics.objects.get_or_create(question_id=qid)
+
+
+def refresh_indices(question_ids):
+    """Recompute the derived difficulty/discrimination columns from the counters"""
+    stats = list(QuestionStatistics.objects.filter(question_id__in=question_ids))
+    for stat in stats:
+        stat.refresh_indices()
+    QuestionStatistics.objects.bulk_update(stats, ['difficulty_index', 'discrimination_index'])
+
+
+def record_graded_attempt(question_ids, correct_question_ids, score):
+    """Add one graded attempt to the statistics of the questions it served"""
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    score = float(score or 0)
+    now = timezone.now()
+
+    _ensure_rows(question_ids)
+    # A short transaction of its own: the indices are derived from the counters it just locked
+    with transaction.atomic():
+        QuestionStatistics.objects.filter(question_id__in=question_ids).update(
+            times_served=F('times_served') + 1,
+            score_sum=F('score_sum') + score,
+            score_sq_sum=F('score_sq_sum') + score * score,
+            updated_at=now,
+        )
+        if correct_question_ids:
+            QuestionStatistics.objects.filter(question_id__in=correct_question_ids).update(
+                times_correct=F('times_correct') + 1,
+                correct_score_sum=F('correct_score_sum') + score,
+            )
+        refresh_indices(question_ids)
+
+
+def rebuild_statistics(chunk_size=1000, stdout=None):
+    """
+    Recompute every QuestionStatistics row from completed attempts.
+
+    Attempts are read in primary-key chunks; only per-question totals are kept
+    in memory, so the cost is bounded by the size of the bank, not the history.
+    Returns the number of attempts processed.
+
+    The rows are replaced at the end, so an attempt graded while the rebuild
+    runs is lost if its chunk was already read (or counted twice if it was
+    recorded after the replace but read by the scan); run it when no quizzes
+    are being submitted.
+    """
+    totals = {}
+    processed = 0
+    last_id = 0
+    attempts = QuizAttempt.objects.filter(completed_at__isnull=False).order_by('id')
+
+    while True:
+        chunk = list(attempts.filter(id__gt=last_id).values_list('id', 'score')[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        scores = {attempt_id: float(score or 0) for attempt_id, score in chunk}
+
+        correct = set(
+            QuizAnswer.objects.filter(attempt_id__in=scores, is_correct=True, question__isnull=False)
+            .values_list('attempt_id', 'question_id')
+        )
+        # Served as in grading, but judged by the options the questions have today
+        served = AttemptQuestion.objects.filter(
+            attempt_id__in=scores, question__options__isnull=False
+        ).values_list('attempt_id', 'question_id').distinct()
+
+        for attempt_id, question_id in served:
+            score = scores[attempt_id]
+            entry = totals.setdefault(question_id, [0, 0, 0.0, 0.0, 0.0])
+            entry[0] += 1
+            entry[2] += score
+            entry[3] += score * score
+            if (attempt_id, question_id) in correct:
+                entry[1] += 1
+                entry[4] += score
+
+        processed += len(chunk)
+        if stdout:
+            stdout.write(f'Processed {processed} attempts')
+
+    rows = []
+    for question_id, (served, correct, score_sum, score_sq_sum, correct_score_sum) in totals.items():
+        stat = QuestionStatistics(
+            question_id=question_id,
+            times_served=served,
+            times_correct=correct,
+            score_sum=score_sum,
+            score_sq_sum=score_sq_sum,
+            correct_score_sum=correct_score_sum,
+        )
+        stat.refresh_indices()
+        rows.append(stat)
+
+    with transaction.atomic():
+        QuestionStatistics.objects.all().delete()
+        QuestionStatistics.objects.bulk_create(rows, batch_size=chunk_size)
+
+    return processed
+
+
+def apply_bank_filters(questions, params, group_by_topic=False):
+    """
+    Sort and filter a Question queryset by item statistics from request GET params.
+
+    sort: difficulty | discrimination | exposure, prefixed with '-' for descending.
+    With group_by_topic the sort applies within each topic (for {% regroup %}).
+    topic / difficulty: exact match on the question's own fields.
+    flag: 'low_discrimination' (below 0.2), 'too_easy' (p > 0.9), 'too_hard' (p < 0.3).
+    """
+    questions = questions.select_related('statistics')
+
+    topic = params.get('topic')
+    if topic:
+        questions = questions.filter(topic=topic)
+    difficulty = params.get('difficulty')
+    if difficulty:
+        questions = questions.filter(difficulty=difficulty)
+
+    flag = params.get('flag')
+    if flag == 'low_discrimination':
+        questions = questions.filter(statistics__discrimination_index__lt=0.2)
+    elif flag == 'too_easy':
+        questions = questions.filter(statistics__difficulty_index__gt=0.9)
+    elif flag == 'too_hard':
+        questions = questions.filter(statistics__difficulty_index__lt=0.3)
+
+    sort = params.get('sort', '')
+    field = SORT_FIELDS.get(sort.lstrip('-'))
+    if field:
+        expression = F(field).desc(nulls_last=True) if sort.startswith('-') else F(field).asc(nulls_last=True)
+        ordering = ['topic', expression, 'id'] if group_by_topic else [expression, 'id']
+        questions = questions.order_by(*ordering)
+
+    return questions
@@ -0,0 +1,51 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from videos.models import InteractiveCourse
+from quizzes.importers import import_questions, QuestionImportError
+
+
+class Command(BaseCommand):
+    help = 'Bulk import questions into a course or interactive course from an XLSX or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .xlsx or .csv file')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--course', type=int, help='Course ID to import into')
+        target.add_argument('--interactive-course', type=int, help='Interactive course ID to import into')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the file and report errors without importing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        course = interactive_course = None
+        try:
+            if options['course']:
+                course = Course.objects.get(pk=options['course'])
+            else:
+                interactive_course = InteractiveCourse.objects.get(pk=options['interactive_course'])
+        except (Course.DoesNotExist, InteractiveCourse.DoesNotExist):
+            raise CommandError('Target course does not exist')
+
+        with open(path, 'rb') as f:
+            try:
+                result = import_questions(
+                    f, os.path.basename(path),
+                    course=course, interactive_course=interactive_course,
+                    dry_run=options['dry_run'],
+                )
+            except QuestionImportError as e:
+                raise CommandError(str(e))
+
+        for row_number, error in result['errors']:
+            self.stderr.write(f'Row {row_number}: {error}')
+        if result['errors']:
+            raise CommandError(f"{len(result['errors'])} row(s) have errors; nothing was imported")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{result['validated']} row(s) are valid"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} questions"))
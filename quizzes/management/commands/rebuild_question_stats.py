@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from quizzes.item_analysis import rebuild_statistics
+
+
+class Command(BaseCommand):
+    help = ('Rebuild question item-analysis statistics from completed quiz attempts '
+            '(run while no quizzes are being submitted)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of attempts read per query (default: 1000)')
+
+    def handle(self, *args, **options):
+        processed = rebuild_statistics(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt question statistics from {processed} attempts'))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_completion_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('videos', '0006_interactivecourseprogress_slide_timestamps_and_skip_attempts'),
+        ('quizzes', '0004_add_question_ids_to_attempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecentQuestionHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('served_ids', models.BinaryField(default=b'', help_text='Recently served question ids, oldest first')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recent_question_history', to='courses.course')),
+                ('interactive_course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recent_question_history', to='videos.interactivecourse')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recent_question_history', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'recent_question_history',
+                'unique_together': {('user', 'course', 'interactive_course')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0005_recentquestionhistory'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quizattempt',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list, help_text='List of question IDs for this attempt (legacy, see AttemptQuestion)'),
+        ),
+        migrations.CreateModel(
+            name='AttemptQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_questions', to='quizzes.quizattempt')),
+                ('question', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempt_links', to='quizzes.question')),
+            ],
+            options={
+                'db_table': 'quiz_attempt_questions',
+                'ordering': ['attempt', 'position'],
+                'unique_together': {('attempt', 'position')},
+            },
+        ),
+    ]
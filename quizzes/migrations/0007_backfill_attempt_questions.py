@@ -0,0 +1,43 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_attempt_questions(apps, schema_editor):
+    """Copy QuizAttempt.question_ids JSON lists into AttemptQuestion rows"""
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    AttemptQuestion = apps.get_model('quizzes', 'AttemptQuestion')
+    Question = apps.get_model('quizzes', 'Question')
+
+    existing_questions = set(Question.objects.values_list('id', flat=True))
+    rows = []
+
+    for attempt_id, question_ids in QuizAttempt.objects.order_by('id').values_list('id', 'question_ids').iterator(chunk_size=BATCH_SIZE):
+        for position, question_id in enumerate(question_ids or []):
+            rows.append(AttemptQuestion(
+                attempt_id=attempt_id,
+                # Deleted questions keep their slot, like QuizAnswer.question
+                question_id=question_id if question_id in existing_questions else None,
+                position=position,
+            ))
+        if len(rows) >= BATCH_SIZE:
+            AttemptQuestion.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            rows = []
+
+    if rows:
+        AttemptQuestion.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def clear_attempt_questions(apps, schema_editor):
+    apps.get_model('quizzes', 'AttemptQuestion').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0006_attemptquestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_attempt_questions, clear_attempt_questions),
+    ]
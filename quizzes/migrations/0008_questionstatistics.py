@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0007_backfill_attempt_questions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('times_served', models.IntegerField(default=0, help_text='Graded attempts that included this question')),
+                ('times_correct', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0, help_text='Sum of attempt scores over all graded attempts')),
+                ('score_sq_sum', models.FloatField(default=0, help_text='Sum of squared attempt scores')),
+                ('correct_score_sum', models.FloatField(default=0, help_text='Sum of attempt scores where this question was answered correctly')),
+                ('difficulty_index', models.FloatField(blank=True, help_text='Proportion of attempts answering correctly (p-value)', null=True)),
+                ('discrimination_index', models.FloatField(blank=True, help_text='Point-biserial correlation with the attempt score', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='quizzes.question')),
+            ],
+            options={
+                'verbose_name_plural': 'Question statistics',
+                'db_table': 'question_statistics',
+                'indexes': [models.Index(fields=['difficulty_index'], name='question_st_difficu_5bbaf6_idx'), models.Index(fields=['discrimination_index'], name='question_st_discrim_9ac19a_idx'), models.Index(fields=['times_served'], name='question_st_times_s_d2d8b5_idx')],
+            },
+        ),
+    ]
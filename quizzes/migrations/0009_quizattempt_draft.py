@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_questionstatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='draft_answers',
+            field=models.JSONField(blank=True, default=dict, help_text='Last autosaved draft selections'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='draft_saved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:19
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """Keep the most recently updated history per learner and course"""
+    RecentQuestionHistory = apps.get_model('quizzes', 'RecentQuestionHistory')
+    for field in ('course_id', 'interactive_course_id'):
+        seen = set()
+        duplicates = []
+        for pk, user_id, target_id in RecentQuestionHistory.objects.filter(
+            **{f'{field}__isnull': False}
+        ).order_by('-updated_at', '-id').values_list('id', 'user_id', field):
+            if (user_id, target_id) in seen:
+                duplicates.append(pk)
+            seen.add((user_id, target_id))
+        RecentQuestionHistory.objects.filter(id__in=duplicates).delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0009_quizattempt_draft'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='recentquestionhistory',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='recentquestionhistory',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('user', 'course'), name='unique_course_question_history'),
+        ),
+        migrations.AddConstraint(
+            model_name='recentquestionhistory',
+            constraint=models.UniqueConstraint(condition=models.Q(('interactive_course__isnull', False)), fields=('user', 'interactive_course'), name='unique_interactive_question_history'),
+        ),
+    ]
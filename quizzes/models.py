@@ -2,7 +2,10 @@ from django.db import models
 from django.conf import settings
 from courses.models import Course
 from videos.models import InteractiveCourse
+from array import array
+import math
 import random
+import sys
 
 class Question(models.Model):
     """Question bank for quizzes - can belong to Course or InteractiveCourse"""
@@ -68,8 +71,12 @@ class QuizAttempt(models.Model):
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
-    # Store question IDs so quiz persists across sessions
-    question_ids = models.JSONField(default=list, blank=True, help_text='List of question IDs for this attempt')
+    # Legacy copy of the served question ids; AttemptQuestion is authoritative
+    question_ids = models.JSONField(default=list, blank=True, help_text='List of question IDs for this attempt (legacy, see AttemptQuestion)')
+    
+    # Autosaved selections of an in-progress attempt: {question_id: [option_ids]}
+    draft_answers = models.JSONField(default=dict, blank=True, help_text='Last autosaved draft selections')
+    draft_saved_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'quiz_attempts'
@@ -81,6 +88,35 @@ class QuizAttempt(models.Model):
         elif self.course:
             return f"{self.user.get_full_name()} - {self.course.title} - {self.score}%"
         return f"{self.user.get_full_name()} - {self.score}%"
+    
+    def set_questions(self, question_ids):
+        """Record the questions served in this attempt, in display order"""
+        AttemptQuestion.objects.bulk_create([
+            AttemptQuestion(attempt=self, question_id=question_id, position=position)
+            for position, question_id in enumerate(question_ids)
+        ])
+    
+    def get_question_ids(self):
+        """Question ids of this attempt in display order"""
+        question_ids = list(
+            self.attempt_questions.exclude(question__isnull=True).values_list('question_id', flat=True)
+        )
+        # Attempts created before the attempt-question table existed
+        return question_ids or list(self.question_ids or [])
+
+class AttemptQuestion(models.Model):
+    """A question served in a quiz attempt, with its position in the quiz"""
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='attempt_questions')
+    question = models.ForeignKey(Question, on_delete=models.SET_NULL, null=True, related_name='attempt_links')
+    position = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'quiz_attempt_questions'
+        ordering = ['attempt', 'position']
+        unique_together = ['attempt', 'position']
+    
+    def __str__(self):
+        return f"Attempt {self.attempt_id} - Q{self.question_id} (#{self.position + 1})"
 
 class QuizAnswer(models.Model):
     """User's answers to quiz questions"""
@@ -95,3 +131,98 @@ class QuizAnswer(models.Model):
     
     def __str__(self):
         return f"{self.attempt.user.get_full_name()} - Q{self.question.id}"
+
+class RecentQuestionHistory(models.Model):
+    """Question ids recently served to a user for one course or interactive course"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recent_question_history')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recent_question_history', null=True, blank=True)
+    interactive_course = models.ForeignKey(InteractiveCourse, on_delete=models.CASCADE, related_name='recent_question_history', null=True, blank=True)
+    
+    # Packed little-endian int64 array, oldest first - 8 bytes per served question
+    served_ids = models.BinaryField(default=b'', help_text='Recently served question ids, oldest first')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'recent_question_history'
+        constraints = [
+            # One of the two foreign keys is always NULL, so each needs its own filtered key
+            models.UniqueConstraint(
+                fields=['user', 'course'], condition=models.Q(course__isnull=False),
+                name='unique_course_question_history',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'interactive_course'], condition=models.Q(interactive_course__isnull=False),
+                name='unique_interactive_question_history',
+            ),
+        ]
+    
+    def __str__(self):
+        target = self.interactive_course or self.course
+        return f"{self.user.get_full_name()} - {target.title if target else 'Unknown'}"
+    
+    def get_served_ids(self):
+        """Return the served question ids as an array, oldest first"""
+        ids = array('q')
+        ids.frombytes(bytes(self.served_ids))
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        return ids
+    
+    def set_served_ids(self, ids):
+        """Store served question ids, oldest first"""
+        ids = array('q', ids)
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        self.served_ids = ids.tobytes()
+
+class QuestionStatistics(models.Model):
+    """Item-analysis counters for a question, updated on every graded attempt"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='statistics')
+    
+    # Raw counters (incremented in SQL so concurrent submits never lose updates)
+    times_served = models.IntegerField(default=0, help_text='Graded attempts that included this question')
+    times_correct = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0, help_text='Sum of attempt scores over all graded attempts')
+    score_sq_sum = models.FloatField(default=0, help_text='Sum of squared attempt scores')
+    correct_score_sum = models.FloatField(default=0, help_text='Sum of attempt scores where this question was answered correctly')
+    
+    # Derived indices, refreshed from the counters so the bank can be sorted in SQL
+    difficulty_index = models.FloatField(null=True, blank=True, help_text='Proportion of attempts answering correctly (p-value)')
+    discrimination_index = models.FloatField(null=True, blank=True, help_text='Point-biserial correlation with the attempt score')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'question_statistics'
+        verbose_name_plural = 'Question statistics'
+        indexes = [
+            models.Index(fields=['difficulty_index']),
+            models.Index(fields=['discrimination_index']),
+            models.Index(fields=['times_served']),
+        ]
+    
+    def __str__(self):
+        return f"Q{self.question_id} - served {self.times_served}, correct {self.times_correct}"
+    
+    def calculate_difficulty(self):
+        """Proportion of graded attempts that answered correctly"""
+        if self.times_served <= 0:
+            return None
+        return self.times_correct / self.times_served
+    
+    def calculate_discrimination(self):
+        """Point-biserial correlation between answering correctly and the attempt score"""
+        n, correct = self.times_served, self.times_correct
+        if n <= 0 or correct <= 0 or correct >= n:
+            return None
+        mean = self.score_sum / n
+        variance = self.score_sq_sum / n - mean * mean
+        if variance <= 1e-9:
+            return None
+        mean_correct = self.correct_score_sum / correct
+        mean_wrong = (self.score_sum - self.correct_score_sum) / (n - correct)
+        p = correct / n
+        return (mean_correct - mean_wrong) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+    
+    def refresh_indices(self):
+        self.difficulty_index = self.calculate_difficulty()
+        self.discrimination_index = self.calculate_discrimination()
@@ -0,0 +1,101 @@
+"""
+Option reconciliation for question edits.
+
+Instead of deleting and recreating every option on save, submitted options
+are matched to the question's existing rows (by id when the form sends one,
+then by identical text, then by position for forms without ids) so unchanged
+options keep their ids and historical QuizAnswer.selected_options stay valid.
+Only changed rows are updated, only new ones inserted and only removed ones
+deleted.
+"""
+from django.db import transaction
+from .models import QuestionOption
+
+
+def options_from_post(post_data, max_options=None):
+    """
+    Read submitted options from option_N / correct_N / option_id_N form fields.
+
+    Returns a list of {'id': int or None, 'text': str, 'is_correct': bool} in
+    form order; blank options are skipped.
+    """
+    if max_options is None:
+        max_options = int(post_data.get('option_count', 4)) + 10
+
+    submitted = []
+    for i in range(1, max_options + 1):
+        text = (post_data.get(f'option_{i}') or '').strip()
+        if not text:
+            continue
+        try:
+            option_id = int(post_data.get(f'option_id_{i}') or 0) or None
+        except ValueError:
+            option_id = None
+        submitted.append({
+            'id': option_id,
+            'text': text,
+            'is_correct': post_data.get(f'correct_{i}') == 'on',
+        })
+    return submitted
+
+
+def reconcile_options(question, submitted):
+    """
+    Bring a question's options in line with `submitted` (see options_from_post).
+
+    Runs in one transaction with at most one bulk_update, one bulk_create and
+    one delete. Returns a dict with the number of options created, updated and
+    deleted.
+    """
+    with transaction.atomic():
+        existing = {option.id: option for option in question.options.select_for_update().order_by('order_index', 'id')}
+        unmatched = dict(existing)
+        matches = [None] * len(submitted)
+
+        # 1. Explicit ids from the form
+        for index, item in enumerate(submitted):
+            option = unmatched.pop(item['id'], None) if item['id'] else None
+            matches[index] = option
+
+        # 2. Identical text, for forms that do not send ids
+        by_text = {}
+        for option in unmatched.values():
+            by_text.setdefault(option.option_text, []).append(option)
+        for index, item in enumerate(submitted):
+            if matches[index] is None and by_text.get(item['text']):
+                option = by_text[item['text']].pop(0)
+                del unmatched[option.id]
+                matches[index] = option
+
+        # 3. Forms that do not send ids at all: remaining rows in order are
+        # treated as edited text. With ids, an unmatched row was removed.
+        leftovers = [] if any(item['id'] for item in submitted) else list(unmatched.values())
+        for index in range(len(submitted)):
+            if matches[index] is None and leftovers:
+                option = leftovers.pop(0)
+                del unmatched[option.id]
+                matches[index] = option
+
+        to_update, to_create = [], []
+        for order_index, (item, option) in enumerate(zip(submitted, matches)):
+            if option is None:
+                to_create.append(QuestionOption(
+                    question=question,
+                    option_text=item['text'],
+                    is_correct=item['is_correct'],
+                    order_index=order_index,
+                ))
+            elif (option.option_text, option.is_correct, option.order_index) != (item['text'], item['is_correct'], order_index):
+                option.option_text = item['text']
+                option.is_correct = item['is_correct']
+                option.order_index = order_index
+                to_update.append(option)
+
+        if to_update:
+            QuestionOption.objects.bulk_update(to_update, ['option_text', 'is_correct', 'order_index'])
+        if to_create:
+            QuestionOption.objects.bulk_create(to_create)
+        if unmatched:
+            QuestionOption.objects.filter(id__in=list(unmatched)).delete()
+
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(unmatched)}
@@ -0,0 +1,57 @@
+"""
+Cached question payloads for quiz attempts.
+
+The questions and options an attempt displays are serialized once into plain
+dicts and cached under the attempt id plus a digest of the questions'
+answer-key versions. Every question edit bumps its version (see
+answer_keys.invalidate_answer_keys), so an edited question produces a new key
+while page reloads during an exam and the results page reuse the cached copy
+without touching Question or QuestionOption. Correct answers are not part of
+the payload; they come from the answer-key cache when needed.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from .models import Question, QuestionOption
+from .answer_keys import get_versions
+
+PAYLOAD_KEY = 'quizzes:payload:{}:{}'
+
+DEFAULT_PAYLOAD_CACHE_TIMEOUT = 60 * 60 * 6
+
+
+def _versions_digest(question_ids):
+    versions = get_versions(question_ids)
+    raw = ','.join(f'{qid}:{versions.get(qid)}' for qid in question_ids)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def build_payload(question_ids):
+    """Serialize the given questions and their options in attempt order (two queries)"""
+    questions = {
+        question['id']: dict(question, options=[])
+        for question in Question.objects.filter(id__in=question_ids).values(
+            'id', 'question_text', 'question_type', 'topic', 'difficulty', 'points', 'explanation'
+        )
+    }
+    options = QuestionOption.objects.filter(question_id__in=questions).order_by(
+        'order_index', 'id'
+    ).values('id', 'question_id', 'option_text')
+    for option in options:
+        questions[option.pop('question_id')]['options'].append(option)
+
+    # Questions deleted since the attempt started are skipped
+    return [questions[qid] for qid in question_ids if qid in questions]
+
+
+def get_attempt_payload(quiz_attempt, question_ids=None):
+    """Return the list of question dicts for an attempt, from the cache when possible"""
+    if question_ids is None:
+        question_ids = quiz_attempt.get_question_ids()
+    key = PAYLOAD_KEY.format(quiz_attempt.pk, _versions_digest(question_ids))
+
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_payload(question_ids)
+        cache.set(key, payload, getattr(settings, 'QUIZ_PAYLOAD_CACHE_TIMEOUT', DEFAULT_PAYLOAD_CACHE_TIMEOUT))
+    return payload
@@ -0,0 +1,232 @@
+"""
+Question sampling for quiz attempts.
+
+The question bank of a course (or interactive course) is cached as an id pool
+partitioned by (topic, difficulty), so starting a quiz only touches question
+ids. Draws can be uniform, stratified by topic ("N per topic") or follow a
+difficulty mix such as {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}.
+
+Repeat attempts avoid recently served questions: each user's served ids are
+kept per course in RecentQuestionHistory and the most recent ones are
+excluded from the pool before drawing, as far as the pool size allows.
+"""
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Question, QuizAttempt, AttemptQuestion, RecentQuestionHistory
+
+POOL_VERSION_KEY = 'quizzes:pool_version:{}:{}'
+POOL_KEY = 'quizzes:pool:{}:{}:{}'
+
+DEFAULT_QUESTION_COUNT = 20
+DEFAULT_RECENT_QUESTION_LIMIT = 1000
+
+
+def _pool_scope(course_id=None, interactive_course_id=None):
+    if interactive_course_id:
+        return 'interactive', interactive_course_id
+    return 'course', course_id
+
+
+def _pool_version(scope, scope_id):
+    key = POOL_VERSION_KEY.format(scope, scope_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_question_pool(course_id=None, interactive_course_id=None):
+    """
+    Return the cached id pool for a course or interactive course.
+
+    The pool maps (topic, difficulty) to a list of question ids.
+    """
+    scope, scope_id = _pool_scope(course_id, interactive_course_id)
+    key = POOL_KEY.format(scope, scope_id, _pool_version(scope, scope_id))
+    pool = cache.get(key)
+    if pool is not None:
+        return pool
+
+    questions = Question.objects.all()
+    if scope == 'interactive':
+        questions = questions.filter(interactive_course_id=scope_id)
+    else:
+        questions = questions.filter(course_id=scope_id)
+
+    pool = {}
+    for question_id, topic, difficulty in questions.order_by().values_list('id', 'topic', 'difficulty'):
+        pool.setdefault((topic or '', difficulty), []).append(question_id)
+
+    cache.set(key, pool, getattr(settings, 'QUIZ_POOL_CACHE_TIMEOUT', 60 * 60))
+    return pool
+
+
+def invalidate_question_pools(course_ids=(), interactive_course_ids=()):
+    """Drop the cached pools of the given courses after their bank changed"""
+    keys = [POOL_VERSION_KEY.format('course', cid) for cid in course_ids if cid]
+    keys += [POOL_VERSION_KEY.format('interactive', icid) for icid in interactive_course_ids if icid]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def _group(pool, index):
+    """Regroup a pool by topic (index 0) or difficulty (index 1)"""
+    groups = {}
+    for stratum, ids in pool.items():
+        groups.setdefault(stratum[index], []).extend(ids)
+    return groups
+
+
+def _quotas(weights, count):
+    """Split `count` between weighted strata using largest remainders"""
+    total = sum(weights.values())
+    if total <= 0:
+        return {name: 0 for name in weights}
+    exact = {name: count * weight / total for name, weight in weights.items()}
+    quotas = {name: int(value) for name, value in exact.items()}
+    leftover = count - sum(quotas.values())
+    for name in sorted(exact, key=lambda n: exact[n] - quotas[n], reverse=True)[:leftover]:
+        quotas[name] += 1
+    return quotas
+
+
+def exclude_recent(pool, recent_ids, count):
+    """
+    Remove recently served ids from a pool, most recent first.
+
+    No more ids are excluded than the pool can spare, so at least `count` ids
+    remain: once a user has seen the whole bank, the questions seen longest
+    ago come back first. Runs in O(pool + recent).
+    """
+    pool_ids = {qid for ids in pool.values() for qid in ids}
+    spare = len(pool_ids) - count
+    if spare <= 0 or not recent_ids:
+        return pool
+
+    excluded = set()
+    for qid in reversed(recent_ids):
+        if len(excluded) >= spare:
+            break
+        if qid in pool_ids:
+            excluded.add(qid)
+
+    return {stratum: [qid for qid in ids if qid not in excluded] for stratum, ids in pool.items()}
+
+
+def draw_question_ids(pool, count=None, per_topic=None, difficulty_mix=None, recent_ids=None, rng=random):
+    """
+    Draw up to `count` question ids from a pool.
+
+    per_topic: take up to this many questions from every topic.
+    difficulty_mix: {difficulty: weight}, e.g. {'easy': 1, 'medium': 2, 'hard': 1}.
+    recent_ids: ids served to the user before, oldest first; avoided if possible.
+    Strata that run short are topped up uniformly from the remaining ids so the
+    attempt still gets `count` questions whenever the pool holds that many.
+    """
+    if count is None:
+        count = getattr(settings, 'QUIZ_QUESTION_COUNT', DEFAULT_QUESTION_COUNT)
+
+    if recent_ids:
+        pool = exclude_recent(pool, recent_ids, count)
+
+    all_ids = [qid for ids in pool.values() for qid in ids]
+    if len(all_ids) <= count:
+        selected = list(all_ids)
+        rng.shuffle(selected)
+        return selected
+
+    selected = []
+    if per_topic:
+        for ids in _group(pool, 0).values():
+            selected.extend(rng.sample(ids, min(per_topic, len(ids))))
+        if len(selected) > count:
+            selected = rng.sample(selected, count)
+    elif difficulty_mix:
+        by_difficulty = _group(pool, 1)
+        for difficulty, quota in _quotas(difficulty_mix, count).items():
+            ids = by_difficulty.get(difficulty, [])
+            selected.extend(rng.sample(ids, min(quota, len(ids))))
+
+    if len(selected) < count:
+        chosen = set(selected)
+        remaining = [qid for qid in all_ids if qid not in chosen]
+        selected.extend(rng.sample(remaining, count - len(selected)))
+
+    rng.shuffle(selected)
+    return selected
+
+
+def get_recent_history(user, course_id=None, interactive_course_id=None):
+    """
+    Return the user's RecentQuestionHistory for a course, creating it on first use.
+
+    A new history is seeded once from the user's previous attempts so existing
+    users keep their rotation; after that attempts are never re-read.
+    """
+    history, created = RecentQuestionHistory.objects.get_or_create(
+        user=user,
+        course_id=None if interactive_course_id else course_id,
+        interactive_course_id=interactive_course_id,
+    )
+    if created:
+        attempts = QuizAttempt.objects.filter(user=user)
+        if interactive_course_id:
+            attempts = attempts.filter(interactive_course_id=interactive_course_id)
+        else:
+            attempts = attempts.filter(course_id=course_id)
+
+        # Latest attempts only, replayed oldest first
+        latest = list(attempts.order_by('-started_at').values_list('id', flat=True)[:50])
+        served = list(
+            AttemptQuestion.objects.filter(attempt_id__in=latest, question__isnull=False)
+            .order_by('attempt__started_at', 'position')
+            .values_list('question_id', flat=True)
+        )
+        if served:
+            record_served_questions(history, served)
+    return history
+
+
+def record_served_questions(history, question_ids):
+    """Append newly served ids to a history, trimming the oldest entries"""
+    limit = getattr(settings, 'QUIZ_RECENT_QUESTION_LIMIT', DEFAULT_RECENT_QUESTION_LIMIT)
+    # Locked so attempts started at the same time do not drop each other's ids
+    with transaction.atomic():
+        locked = RecentQuestionHistory.objects.select_for_update().get(pk=history.pk)
+        served = locked.get_served_ids()
+        served.extend(question_ids)
+        locked.set_served_ids(served[-limit:])
+        locked.save(update_fields=['served_ids', 'updated_at'])
+    history.served_ids = locked.served_ids
+
+
+def sample_questions(course_id=None, interactive_course_id=None, count=None, user=None):
+    """
+    Draw question ids for a new attempt using the configured sampling rules.
+
+    When `user` is given, questions they were served recently are avoided and
+    the draw is recorded in their history.
+    """
+    pool = get_question_pool(course_id=course_id, interactive_course_id=interactive_course_id)
+    history = None
+    if user is not None:
+        history = get_recent_history(user, course_id=course_id, interactive_course_id=interactive_course_id)
+
+    selected = draw_question_ids(
+        pool,
+        count=count,
+        per_topic=getattr(settings, 'QUIZ_QUESTIONS_PER_TOPIC', None),
+        difficulty_mix=getattr(settings, 'QUIZ_DIFFICULTY_MIX', None),
+        recent_ids=history.get_served_ids() if history else None,
+    )
+
+    if history is not None and selected:
+        record_served_questions(history, selected)
+    return selected
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def flush_quiz_drafts_task():
+    """Write pending autosaved quiz drafts to the database"""
+    from .drafts import flush_pending_drafts
+
+    flush_pending_drafts()
@@ -7,6 +7,7 @@ urlpatterns = [
     # Course quizzes
     path('<int:course_id>/start/', views.start_quiz_view, name='start'),
     path('attempt/<int:attempt_id>/', views.take_quiz_view, name='take'),
+    path('attempt/<int:attempt_id>/autosave/', views.autosave_quiz_view, name='autosave'),
     path('attempt/<int:attempt_id>/submit/', views.submit_quiz_view, name='submit'),
     path('attempt/<int:attempt_id>/results/', views.quiz_results_view, name='results'),
     
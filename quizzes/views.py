@@ -3,12 +3,25 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Q
 from .models import Question, QuizAttempt, QuizAnswer, QuestionOption
+from .grading import grade_attempt, selections_from_post
+from .answer_keys import invalidate_answer_keys
+from .sampling import sample_questions, invalidate_question_pools
+from .item_analysis import apply_bank_filters
+from .options import options_from_post, reconcile_options
+from .payloads import get_attempt_payload
+from .drafts import (
+    get_draft, load_draft, save_draft, clear_draft, clean_draft, draft_sequence,
+    selections_from_draft, DRAFT_STALE, DRAFT_FLUSHED,
+)
 from courses.models import Course, Enrollment
 from certificates.models import Certificate
+from certificates.rendering import queue_certificate_render
 from videos.models import VideoProgress, InteractiveCourse, InteractiveCourseProgress
-import random
+import json
 import uuid
 
 @login_required
@@ -43,22 +56,20 @@ def start_quiz_view(request, course_id):
         messages.error(request, f'You must complete all interactive modules before taking the quiz. ({completed_interactive}/{total_interactive} completed)')
         return redirect('courses:course_detail', course_id=course.id)
     
-    # Get all questions for this course grouped by topic
-    questions = list(Question.objects.filter(course=course))
+    # Randomly select question ids from the cached topic/difficulty pool,
+    # avoiding questions this user was served on recent attempts
+    selected_ids = sample_questions(course_id=course.id, user=request.user)
     
-    # Randomly select questions (ensure different questions each time)
-    if len(questions) > 20:
-        selected_questions = random.sample(questions, 20)
-    else:
-        selected_questions = questions
-    
-    # Create quiz attempt with question IDs stored in database (not session)
-    quiz_attempt = QuizAttempt.objects.create(
-        user=request.user,
-        course=course,
-        total_questions=len(selected_questions),
-        question_ids=[q.id for q in selected_questions]  # Store in DB for persistence
-    )
+    # Create quiz attempt with question IDs stored in database (not session);
+    # the attempt and its question rows are written together or not at all
+    with transaction.atomic():
+        quiz_attempt = QuizAttempt.objects.create(
+            user=request.user,
+            course=course,
+            total_questions=len(selected_ids),
+            question_ids=selected_ids  # Store in DB for persistence
+        )
+        quiz_attempt.set_questions(selected_ids)
     
     return redirect('quizzes:take', attempt_id=quiz_attempt.id)
 
@@ -73,7 +84,7 @@ def take_quiz_view(request, attempt_id):
         return redirect('quizzes:results', attempt_id=quiz_attempt.id)
     
     # Get question IDs from database (persistent across sessions)
-    question_ids = quiz_attempt.question_ids or []
+    question_ids = quiz_attempt.get_question_ids()
     
     if not question_ids:
         messages.error(request, 'Quiz questions not found. Please start a new quiz.')
@@ -85,17 +96,45 @@ def take_quiz_view(request, attempt_id):
             return redirect('courses:course_detail', course_id=quiz_attempt.course.id)
         return redirect('courses:course_list')
     
-    questions = Question.objects.filter(id__in=question_ids).prefetch_related('options')
+    # Serialized questions/options are cached per attempt, so reloads skip the database
+    questions = get_attempt_payload(quiz_attempt, question_ids)
+    draft = get_draft(quiz_attempt)
     
     context = {
         'quiz_attempt': quiz_attempt,
         'questions': questions,
         'course': quiz_attempt.course,
         'interactive_course': quiz_attempt.interactive_course,
+        'draft_answers': draft['answers'],
+        'draft_sequence': draft['sequence'],
     }
     
     return render(request, 'quizzes/take_quiz.html', context)
 
+@login_required
+@require_POST
+def autosave_quiz_view(request, attempt_id):
+    """Autosave draft answers of an in-progress quiz (JSON)"""
+    quiz_attempt = get_object_or_404(QuizAttempt, id=attempt_id, user=request.user)
+    
+    if quiz_attempt.completed_at:
+        return JsonResponse({'success': False, 'error': 'This quiz has already been submitted.'}, status=409)
+    
+    try:
+        data = json.loads(request.body or '{}')
+        sequence = data.get('sequence')
+        sequence = int(sequence) if sequence is not None else None
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON payload.'}, status=400)
+    
+    answers = clean_draft(data.get('answers'), quiz_attempt.get_question_ids())
+    result = save_draft(quiz_attempt, answers, sequence=sequence)
+    if result == DRAFT_STALE:
+        # A newer save (or another tab) got there first; the page resyncs from this sequence
+        return JsonResponse({'success': False, 'stale': True, 'sequence': draft_sequence(quiz_attempt)}, status=409)
+    
+    return JsonResponse({'success': True, 'answered': len(answers), 'flushed': result == DRAFT_FLUSHED})
+
 @login_required
 def submit_quiz_view(request, attempt_id):
     """Submit quiz and calculate score"""
@@ -109,51 +148,22 @@ def submit_quiz_view(request, attempt_id):
         messages.info(request, 'This quiz has already been submitted.')
         return redirect('quizzes:results', attempt_id=quiz_attempt.id)
     
-    # Get question IDs from database (persistent across sessions)
-    question_ids = quiz_attempt.question_ids or []
-    questions = Question.objects.filter(id__in=question_ids).prefetch_related('options')
-    
-    correct_answers = 0
-    
-    for question in questions:
-        # Get user's selected options
-        selected_option_ids = request.POST.getlist(f'question_{question.id}')
-        
-        if selected_option_ids:
-            # Create quiz answer
-            quiz_answer = QuizAnswer.objects.create(
-                attempt=quiz_attempt,
-                question=question
-            )
-            
-            # Get selected options
-            selected_options = QuestionOption.objects.filter(id__in=selected_option_ids)
-            quiz_answer.selected_options.set(selected_options)
-            
-            # Check if answer is correct
-            correct_options = question.options.filter(is_correct=True)
-            selected_correct = set(selected_options.filter(is_correct=True).values_list('id', flat=True))
-            all_correct = set(correct_options.values_list('id', flat=True))
-            
-            if selected_correct == all_correct and len(selected_option_ids) == len(all_correct):
-                quiz_answer.is_correct = True
-                correct_answers += 1
-            
-            quiz_answer.save()
-    
-    # Calculate score
-    score = (correct_answers / quiz_attempt.total_questions) * 100 if quiz_attempt.total_questions > 0 else 0
-    quiz_attempt.score = score
-    quiz_attempt.correct_answers = correct_answers
+    # Grade every answer in memory and persist them with bulk inserts
+    question_ids = quiz_attempt.get_question_ids()
+    # The posted form is authoritative (a cleared answer is simply absent);
+    # the autosaved draft only stands in when the form itself did not arrive
+    if 'quiz_form' in request.POST or any(f'question_{qid}' in request.POST for qid in question_ids):
+        selections = selections_from_post(request.POST, question_ids)
+    else:
+        selections = selections_from_draft(load_draft(quiz_attempt), question_ids)
     
-    # Determine passing (80% for both course and interactive course)
-    passing_score = 80
-    if quiz_attempt.course:
-        passing_score = quiz_attempt.course.passing_score
+    graded = grade_attempt(quiz_attempt, selections, question_ids=question_ids)
+    clear_draft(quiz_attempt)
+    if graded is None:
+        messages.info(request, 'This quiz has already been submitted.')
+        return redirect('quizzes:results', attempt_id=quiz_attempt.id)
     
-    quiz_attempt.passed = score >= passing_score
-    quiz_attempt.completed_at = timezone.now()
-    quiz_attempt.save()
+    score = quiz_attempt.score
     
     # Update interactive course progress if this is an interactive course quiz
     if quiz_attempt.interactive_course and quiz_attempt.passed:
@@ -198,8 +208,28 @@ def quiz_results_view(request, attempt_id):
                 course=quiz_attempt.course
             ).first()
     
+    # Answer review built from the cached attempt payload
+    review = []
+    if quiz_attempt.completed_at:
+        results = dict(quiz_attempt.answers.values_list('question_id', 'is_correct'))
+        selected = {}
+        Through = QuizAnswer.selected_options.through
+        for question_id, option_id in Through.objects.filter(
+            quizanswer__attempt=quiz_attempt
+        ).values_list('quizanswer__question_id', 'questionoption_id'):
+            selected.setdefault(question_id, set()).add(option_id)
+        
+        for question in get_attempt_payload(quiz_attempt):
+            chosen = selected.get(question['id'], set())
+            review.append({
+                'question': question,
+                'selected_options': [option['option_text'] for option in question['options'] if option['id'] in chosen],
+                'is_correct': results.get(question['id'], False),
+            })
+    
     context = {
         'quiz_attempt': quiz_attempt,
+        'review': review,
         'user_certificate': user_certificate,
         'course': quiz_attempt.course,
         'interactive_course': quiz_attempt.interactive_course,
@@ -247,22 +277,24 @@ def check_and_generate_certificate(user, course):
     base_url = getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')
     verification_url = f'{base_url}/certificates/verify/{certificate_number}/'
     
-    certificate = Certificate.objects.create(
-        user=user,
-        course=course,
-        certificate_number=certificate_number,
-        overall_score=best_attempt.score,
-        verification_url=verification_url
-    )
-    
-    # Generate QR code and PDF
-    certificate.generate_qr_code()
-    
-    # Import here to avoid circular imports
-    from certificates.views import generate_certificate_pdf
-    generate_certificate_pdf(certificate)
+    try:
+        with transaction.atomic():
+            certificate = Certificate.objects.create(
+                user=user,
+                course=course,
+                certificate_number=certificate_number,
+                overall_score=best_attempt.score,
+                verification_url=verification_url
+            )
+    except IntegrityError:
+        # Issued concurrently (e.g. by the periodic eligibility job)
+        existing_cert = Certificate.objects.filter(user=user, course=course).first()
+        if existing_cert is None:
+            raise
+        return existing_cert
     
-    certificate.save()
+    # QR code and PDF are rendered in the background
+    queue_certificate_render(certificate)
     
     return certificate
 
@@ -287,21 +319,24 @@ def check_and_generate_interactive_certificate(user, interactive_course, score):
     base_url = getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')
     verification_url = f'{base_url}/certificates/verify/{certificate_number}/'
     
-    certificate = Certificate.objects.create(
-        user=user,
-        interactive_course=interactive_course,
-        certificate_number=certificate_number,
-        overall_score=score,
-        verification_url=verification_url
-    )
-    
-    # Generate QR code and PDF
-    certificate.generate_qr_code()
-    
-    from certificates.views import generate_certificate_pdf
-    generate_certificate_pdf(certificate)
+    try:
+        with transaction.atomic():
+            certificate = Certificate.objects.create(
+                user=user,
+                interactive_course=interactive_course,
+                certificate_number=certificate_number,
+                overall_score=score,
+                verification_url=verification_url
+            )
+    except IntegrityError:
+        # Issued concurrently (e.g. by the periodic eligibility job)
+        existing_cert = Certificate.objects.filter(user=user, interactive_course=interactive_course).first()
+        if existing_cert is None:
+            raise
+        return existing_cert
     
-    certificate.save()
+    # QR code and PDF are rendered in the background
+    queue_certificate_render(certificate)
     
     return certificate
 
@@ -343,29 +378,26 @@ def start_interactive_quiz(request, interactive_id):
                        course_id=interactive_course.course.id, 
                        interactive_id=interactive_course.id)
     
-    # Get all questions for this interactive course
-    questions = list(Question.objects.filter(interactive_course=interactive_course))
+    # Randomly select question ids from the cached topic/difficulty pool,
+    # avoiding questions this user was served on recent attempts
+    selected_ids = sample_questions(interactive_course_id=interactive_course.id, user=request.user)
     
-    if not questions:
+    if not selected_ids:
         messages.error(request, 'No questions available for this course yet.')
         return redirect('content:play_interactive', 
                        course_id=interactive_course.course.id, 
                        interactive_id=interactive_course.id)
     
-    # Randomly select questions (max 20)
-    if len(questions) > 20:
-        selected_questions = random.sample(questions, 20)
-    else:
-        selected_questions = questions
-    
-    # Create quiz attempt
-    # Create quiz attempt with question IDs stored in database (not session)
-    quiz_attempt = QuizAttempt.objects.create(
-        user=request.user,
-        interactive_course=interactive_course,
-        total_questions=len(selected_questions),
-        question_ids=[q.id for q in selected_questions]  # Store in DB for persistence
-    )
+    # Create quiz attempt with question IDs stored in database (not session);
+    # the attempt and its question rows are written together or not at all
+    with transaction.atomic():
+        quiz_attempt = QuizAttempt.objects.create(
+            user=request.user,
+            interactive_course=interactive_course,
+            total_questions=len(selected_ids),
+            question_ids=selected_ids  # Store in DB for persistence
+        )
+        quiz_attempt.set_questions(selected_ids)
     
     return redirect('quizzes:take', attempt_id=quiz_attempt.id)
 
@@ -381,6 +413,8 @@ def manage_interactive_questions(request, interactive_id):
         return redirect('courses:dashboard')
     
     questions = Question.objects.filter(interactive_course=interactive_course).prefetch_related('options')
+    # Sort/filter by item statistics (difficulty, discrimination, exposure)
+    questions = apply_bank_filters(questions, request.GET)
     
     # Group questions by topic
     questions_by_topic = {}
@@ -396,6 +430,8 @@ def manage_interactive_questions(request, interactive_id):
         'questions': questions,
         'questions_by_topic': questions_by_topic,
         'total_questions': questions.count(),
+        'sort': request.GET.get('sort', ''),
+        'flag': request.GET.get('flag', ''),
     }
     
     return render(request, 'quizzes/manage_interactive_questions.html', context)
@@ -441,6 +477,9 @@ def add_interactive_question(request, interactive_id):
                     order_index=i
                 )
         
+        invalidate_answer_keys([question.id])
+        invalidate_question_pools(interactive_course_ids=[interactive_course.id])
+        
         messages.success(request, 'Question added successfully!')
         return redirect('quizzes:manage_interactive_questions', interactive_id=interactive_id)
     
@@ -469,23 +508,15 @@ def edit_interactive_question(request, question_id):
         question.topic = request.POST.get('topic', '')
         question.difficulty = request.POST.get('difficulty', 'medium')
         question.points = int(request.POST.get('points', 1))
-        question.save()
         
-        # Delete existing options and recreate
-        question.options.all().delete()
+        with transaction.atomic():
+            question.save()
+            # Update only the options that changed so answer history keeps valid option ids
+            option_count = int(request.POST.get('option_count', 4))
+            reconcile_options(question, options_from_post(request.POST, max_options=option_count))
         
-        option_count = int(request.POST.get('option_count', 4))
-        for i in range(1, option_count + 1):
-            option_text = request.POST.get(f'option_{i}')
-            is_correct = request.POST.get(f'correct_{i}') == 'on'
-            
-            if option_text:
-                QuestionOption.objects.create(
-                    question=question,
-                    option_text=option_text,
-                    is_correct=is_correct,
-                    order_index=i
-                )
+        invalidate_answer_keys([question.id])
+        invalidate_question_pools([question.course_id], [question.interactive_course_id])
         
         messages.success(request, 'Question updated successfully!')
         
@@ -516,7 +547,11 @@ def delete_interactive_question(request, question_id):
         return redirect('courses:dashboard')
     
     interactive_id = question.interactive_course.id if question.interactive_course else None
+    question_id = question.id
+    course_id = question.course_id
     question.delete()
+    invalidate_answer_keys([question_id])
+    invalidate_question_pools([course_id], [interactive_id])
     
     messages.success(request, 'Question deleted successfully!')
     
@@ -0,0 +1,17 @@
+"""
+Celery application for background jobs (certificate rendering, video processing).
+
+Start a worker with:
+    celery -A risk_lms worker -l info
+
+and the periodic jobs in CELERY_BEAT_SCHEDULE with:
+    celery -A risk_lms beat -l info
+"""
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'risk_lms.settings')
+
+app = Celery('risk_lms')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,233 @@
+"""
+Efficient file responses for protected media (certificates, videos).
+
+serve_file() answers conditional GETs (If-None-Match / If-Modified-Since)
+with 304 from a stat() alone, and otherwise either hands the file off to the
+front-end server or streams it with FileResponse (which uses the WSGI
+server's sendfile wrapper when available) instead of reading it into memory.
+With accept_ranges=True it also answers Range requests (single ranges with
+206, several with multipart/byteranges, If-Range honoured) by streaming the
+requested bytes in fixed-size chunks, so video players can seek.
+
+SENDFILE_BACKEND setting:
+    None        - stream from Django (default, works everywhere)
+    'xsendfile' - X-Sendfile header with the absolute path (Apache mod_xsendfile, IIS/ARR modules)
+    'nginx'     - X-Accel-Redirect to SENDFILE_URL + path relative to SENDFILE_ROOT
+                  (map SENDFILE_URL to SENDFILE_ROOT as an `internal` location)
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import secrets
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+DEFAULT_CHUNK_SIZE = 512 * 1024
+
+# More ranges than this in one request is treated as abuse and answered with the whole file
+MAX_RANGES = 16
+
+_RANGE_SPEC = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def file_etag(size, mtime_ns):
+    """Validator built from file size and modification time"""
+    return f'"{mtime_ns:x}-{size:x}"'
+
+
+def _content_disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+
+def sendfile_response(path):
+    """Empty response handing `path` to the front-end server, or None if not configured"""
+    backend = getattr(settings, 'SENDFILE_BACKEND', None)
+    if backend == 'xsendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+    if backend == 'nginx':
+        root = os.path.abspath(getattr(settings, 'SENDFILE_ROOT', settings.MEDIA_ROOT))
+        relative = os.path.relpath(path, root)
+        if relative.startswith('..'):
+            return None  # Outside the internal location, stream it instead
+        url = getattr(settings, 'SENDFILE_URL', '/protected-media/').rstrip('/')
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = f"{url}/{quote(relative.replace(os.sep, '/'))}"
+        return response
+    return None
+
+
+def parse_range_header(header, size):
+    """
+    Byte ranges of a Range header as sorted, merged [(start, end)] (inclusive).
+
+    Returns None when the whole file should be sent (no header, not a bytes
+    range, malformed or too many ranges) and [] when no range is satisfiable.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    specs = header[len('bytes='):].split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = _RANGE_SPEC.match(spec)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length:
+                ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, min(int(last), size - 1) if last else size - 1))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, mtime):
+    """False when an If-Range validator no longer matches, so the whole file must be sent"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and mtime is not None and int(mtime) <= since
+
+
+def _read_range(open_file, start, end, chunk_size):
+    with open_file() as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _range_response(open_file, ranges, size, content_type, chunk_size):
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(_read_range(open_file, start, end, chunk_size), status=206,
+                                         content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        return response
+
+    boundary = secrets.token_hex(16)
+    heads = [
+        (f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+         f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode()
+        for start, end in ranges
+    ]
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    def parts():
+        for index, (head, (start, end)) in enumerate(zip(heads, ranges)):
+            yield (b'\r\n' if index else b'') + head
+            yield from _read_range(open_file, start, end, chunk_size)
+        yield tail
+
+    length = sum(len(head) for head in heads) + 2 * (len(ranges) - 1) + len(tail)
+    length += sum(end - start + 1 for start, end in ranges)
+    response = StreamingHttpResponse(parts(), status=206,
+                                     content_type=f'multipart/byteranges; boundary={boundary}')
+    response['Content-Length'] = str(length)
+    return response
+
+
+def serve_file(request, field_file, filename=None, content_type=None, as_attachment=False, max_age=0,
+               accept_ranges=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return a cacheable response for a FileField value.
+
+    Responses are marked private (they belong to the logged-in user) and must
+    be revalidated after `max_age` seconds; revalidation costs a 304. With
+    `accept_ranges`, Range requests get 206/416 responses streamed in
+    `chunk_size` pieces.
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None  # Remote storage: no local path to stat or hand off
+
+    if path:
+        stat = os.stat(path)
+        size, mtime = stat.st_size, stat.st_mtime
+        etag = file_etag(size, stat.st_mtime_ns)
+    else:
+        size = field_file.size
+        mtime = None
+        etag = '"%s"' % hashlib.md5(f'{field_file.name}:{size}'.encode()).hexdigest()
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(mtime) if mtime else None)
+    if not_modified is not None:
+        # A 304 carries the validators and caching headers the 200 would have
+        if not_modified.status_code == 304:
+            not_modified['ETag'] = etag
+        patch_cache_control(not_modified, private=True, max_age=max_age, must_revalidate=True)
+        return not_modified
+
+    def open_file():
+        return open(path, 'rb') if path else field_file.open('rb')
+
+    ranges = None
+    if accept_ranges and _if_range_matches(request, etag, mtime):
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    # The front-end server handles Range requests itself
+    response = sendfile_response(path) if path else None
+    if response is not None:
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    elif ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif ranges:
+        response = _range_response(open_file, ranges, size, content_type, chunk_size)
+        response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    else:
+        response = FileResponse(
+            open_file(),
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type=content_type,
+        )
+        response.block_size = chunk_size
+        response['Content-Length'] = str(size)
+
+    if accept_ranges:
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if mtime:
+        response['Last-Modified'] = http_date(mtime)
+    patch_cache_control(response, private=True, max_age=max_age, must_revalidate=True)
+    return response
@@ -126,6 +126,27 @@ else:
         }
     }
 
+# Cache Configuration
+# Shared cache for answer keys and other quiz data. Set CACHE_URL (e.g.
+# redis://localhost:6379/1) in production so every worker process sees the
+# same entries and invalidations; the local-memory cache is per process.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'risk-lms',
+        }
+    }
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -175,6 +196,12 @@ if IS_PRODUCTION:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Protected file downloads (certificates): None streams from Django,
+# 'xsendfile' or 'nginx' hands the transfer to the front-end server (see risk_lms/sendfile.py)
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND') or None
+SENDFILE_ROOT = MEDIA_ROOT
+SENDFILE_URL = os.environ.get('SENDFILE_URL', '/protected-media/')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -217,22 +244,80 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 2147483648
 # Celery Configuration (for video processing)
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BEAT_SCHEDULE = {
+    # Certificates for learners who met the requirements without submitting a quiz last
+    'issue-eligible-certificates': {
+        'task': 'certificates.tasks.issue_eligible_certificates_task',
+        'schedule': 60 * 60,
+    },
+    # One SMTP connection per batch of rendered certificates
+    'send-certificate-emails': {
+        'task': 'certificates.tasks.send_certificate_emails_task',
+        'schedule': 60,
+    },
+    # Buffered video progress heartbeats, written in bulk
+    'flush-video-progress': {
+        'task': 'videos.tasks.flush_video_progress_task',
+        'schedule': 10,
+    },
+    # Autosaved quiz drafts still pending in the cache (match QUIZ_DRAFT_FLUSH_INTERVAL)
+    'flush-quiz-drafts': {
+        'task': 'quizzes.tasks.flush_quiz_drafts_task',
+        'schedule': 30,
+    },
+}
 
 # Video processing settings
 VIDEO_ALLOWED_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv']
+VIDEO_STREAM_URL_MAX_AGE = 60 * 60 * 6  # Lifetime of signed video stream URLs (access is checked when signing)
+FFMPEG_BINARY = os.getenv('FFMPEG_PATH', 'ffmpeg')  # Uploads are transcoded to HLS when ffmpeg is available
+FFPROBE_BINARY = os.getenv('FFPROBE_PATH', 'ffprobe')  # Optional; MP4 and WebM headers are parsed without it
+VIDEO_HLS_LADDER = [
+    {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1000, 'audio_bitrate': 96},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2500, 'audio_bitrate': 128},
+]  # Bitrates in kbit/s
+VIDEO_HLS_SEGMENT_SECONDS = 4
+VIDEO_TRANSCODE_TIMEOUT = 60 * 60 * 2  # Per rendition; a 'processing' claim older than this (+10 min) is taken over
+# Shared heartbeat buffer (Redis). Required when DEBUG is off - the site refuses to
+# start without it; in development an empty value writes every heartbeat to the database.
+VIDEO_PROGRESS_REDIS_URL = os.environ.get('VIDEO_PROGRESS_REDIS_URL', CACHE_URL)
+VIDEO_PROGRESS_FLUSH_INTERVAL = 10  # Seconds between bulk writes of buffered progress (match the beat schedule)
+VIDEO_MAX_PLAYBACK_RATE = 2  # A heartbeat adds at most this many seconds of coverage per wall-clock second...
+VIDEO_PROGRESS_MAX_GAP = 60 * 10  # ...since the previous heartbeat, counting at most this many seconds
+VIDEO_HLS_JS_URL = os.getenv('VIDEO_HLS_JS_URL', 'vendor/hls.js/hls.js')  # Static file path (vendored copy) or a full URL
 SUBTITLE_ALLOWED_EXTENSIONS = ['vtt', 'srt']
 
+# Quiz settings
+QUIZ_QUESTION_COUNT = 20  # Questions drawn per attempt
+QUIZ_QUESTIONS_PER_TOPIC = None  # e.g. 4 to draw up to 4 questions from every topic
+QUIZ_DIFFICULTY_MIX = None  # e.g. {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
+QUIZ_RECENT_QUESTION_LIMIT = 1000  # Served question ids remembered per user and course
+QUIZ_POOL_CACHE_TIMEOUT = 60 * 60
+QUIZ_ANSWER_KEY_CACHE_TIMEOUT = 60 * 60 * 24  # Answer keys are versioned, so a long timeout is safe
+QUIZ_PAYLOAD_CACHE_TIMEOUT = 60 * 60 * 6  # Serialized questions of an attempt, keyed by answer-key versions
+QUIZ_DRAFT_FLUSH_INTERVAL = 30  # Seconds between database writes of an attempt's autosaved draft
+
 # Certificate settings
 CERTIFICATE_QR_SIZE = 200
 CERTIFICATE_BASE_URL = os.environ.get('CERTIFICATE_BASE_URL', 'http://localhost:8000')
+CERTIFICATE_RENDER_ASYNC = os.environ.get('CERTIFICATE_RENDER_ASYNC', 'True').lower() in ('true', '1', 'yes')  # Render QR/PDF in a Celery worker
+CERTIFICATE_RENDER_STALE_AFTER = 10 * 60  # Seconds before a pending certificate is rendered on download instead
+CERTIFICATE_VERIFY_CACHE_TIMEOUT = 60 * 60 * 6  # Public verification page data, dropped when a certificate changes
+CERTIFICATE_VERIFY_NEGATIVE_TIMEOUT = 60  # Unknown certificate numbers (bots probing numbers)
 
 # Email settings (for certificate delivery)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))  # filebased backend (development)
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER or 'webmaster@localhost')
+CERTIFICATE_EMAIL_BATCH_SIZE = 100  # Certificates sent per SMTP connection
+CERTIFICATE_EMAIL_MAX_ATTEMPTS = 5
+CERTIFICATE_EMAIL_RETRY_DELAY = 60  # Seconds before the first retry, doubled after each failure
 
 # Login URL
 LOGIN_URL = '/accounts/login/'
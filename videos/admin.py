@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Video, VideoSubtitle, VideoProgress
+from .models import Video, VideoSubtitle, VideoProgress, VideoRendition
 from risk_lms.admin import risk_admin_site
 
 class VideoSubtitleInline(admin.TabularInline):
@@ -7,14 +7,25 @@ class VideoSubtitleInline(admin.TabularInline):
     extra = 1
     fields = ['language_code', 'language_name', 'subtitle_file']
 
+class VideoRenditionInline(admin.TabularInline):
+    model = VideoRendition
+    extra = 0
+    can_delete = False
+    fields = ['name', 'height', 'video_bitrate', 'audio_bitrate', 'status', 'error', 'updated_at']
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ['title', 'course', 'duration_display', 'order_index', 'subtitle_count', 'created_at']
-    list_filter = ['course', 'created_at']
+    list_display = ['title', 'course', 'duration_display', 'order_index', 'subtitle_count', 'hls_status', 'created_at']
+    list_filter = ['course', 'hls_status', 'created_at']
     search_fields = ['title', 'description', 'course__title']
     list_editable = ['order_index']
-    readonly_fields = ['created_at', 'thumbnail_preview']
-    inlines = [VideoSubtitleInline]
+    readonly_fields = ['created_at', 'thumbnail_preview', 'file_size', 'video_codec', 'audio_codec', 'width',
+                       'height', 'bitrate', 'hls_status', 'hls_playlist', 'hls_error']
+    inlines = [VideoSubtitleInline, VideoRenditionInline]
     
     fieldsets = (
         ('Video Information', {
@@ -23,6 +34,14 @@ class VideoAdmin(admin.ModelAdmin):
         ('Video File', {
             'fields': ('video_file', 'thumbnail', 'thumbnail_preview', 'duration')
         }),
+        ('Media Info', {
+            'fields': ('file_size', 'video_codec', 'audio_codec', 'width', 'height', 'bitrate'),
+            'classes': ('collapse',)
+        }),
+        ('Adaptive Streaming', {
+            'fields': ('hls_status', 'hls_playlist', 'hls_error'),
+            'classes': ('collapse',)
+        }),
         ('Display Settings', {
             'fields': ('order_index',)
         }),
@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'videos'
+
+    def ready(self):
+        # Progress heartbeats are buffered in Redis (see progress_buffer.py). Without
+        # it every heartbeat is a locked read and write of its row, which is only
+        # acceptable for development, so refuse to start a production site without it.
+        if not settings.DEBUG and not getattr(settings, 'VIDEO_PROGRESS_REDIS_URL', ''):
+            raise ImproperlyConfigured(
+                'VIDEO_PROGRESS_REDIS_URL (by default CACHE_URL) must point to Redis when DEBUG is off; '
+                'it buffers video progress heartbeats.'
+            )
@@ -0,0 +1,91 @@
+"""
+Watched coverage of a video as a per-second bitmap.
+
+Bit i is set once second i of the video has been played, most significant
+bit of the first byte first (the layout of Redis SETBIT/BITOP, so buffered
+bitmaps can be merged there). The player reports the ranges it has played
+(HTMLMediaElement.played), which are OR-ed into the stored bitmap; the
+number of set bits is the time actually watched, however the viewer seeked.
+The ranges come from the client, so the seconds one heartbeat may add are
+capped (clip_new_seconds) by the wall-clock time since the previous one.
+An hour of video takes 450 bytes.
+"""
+import math
+
+SECONDS_PER_BIT = 1
+MAX_SECONDS = 12 * 60 * 60  # Bounds a bitmap at 5.4 KB
+MAX_RANGES = 100
+
+
+def parse_ranges(value):
+    """[(start, end)] seconds from 'start-end,start-end'; invalid parts are skipped"""
+    ranges = []
+    for part in (value or '').split(',')[:MAX_RANGES]:
+        try:
+            start, end = (float(number) for number in part.split('-'))
+        except ValueError:
+            continue
+        if not (math.isfinite(start) and math.isfinite(end)):
+            continue
+        start, end = max(0.0, start), min(float(MAX_SECONDS), end)
+        if end > start:
+            ranges.append((start, end))
+    return ranges
+
+
+def ranges_bitmap(ranges):
+    """Bitmap with the seconds covered by the ranges set (a second counts once it is mostly covered)"""
+    spans = [(round(start / SECONDS_PER_BIT), round(end / SECONDS_PER_BIT)) for start, end in ranges]
+    spans = [(first, last) for first, last in spans if last > first]
+    if not spans:
+        return b''
+    length = (max(last for _, last in spans) + 7) // 8
+    value = 0
+    for first, last in spans:
+        value |= ((1 << (last - first)) - 1) << (length * 8 - last)
+    return value.to_bytes(length, 'big')
+
+
+def merge_bitmaps(a, b):
+    """Bitwise OR of two bitmaps of any length"""
+    a, b = bytes(a or b''), bytes(b or b'')
+    length = max(len(a), len(b))
+    if not length:
+        return b''
+    merged = int.from_bytes(a.ljust(length, b'\0'), 'big') | int.from_bytes(b.ljust(length, b'\0'), 'big')
+    return merged.to_bytes(length, 'big')
+
+
+def clip_new_seconds(bitmap, stored, limit):
+    """
+    `bitmap` with at most `limit` seconds that are not set in `stored`; the
+    earliest new seconds are kept, later ones dropped.
+    """
+    bitmap, stored = bytes(bitmap or b''), bytes(stored or b'')
+    length = max(len(bitmap), len(stored))
+    if not length:
+        return b''
+    played = int.from_bytes(bitmap.ljust(length, b'\0'), 'big')
+    new = played & ~int.from_bytes(stored.ljust(length, b'\0'), 'big')
+    keep = max(0, int(limit // SECONDS_PER_BIT))
+    if new.bit_count() <= keep:
+        return bitmap
+    # Bit index (from the first second) of the last new second that is kept
+    bits = format(new, f'0{length * 8}b')
+    cut = -1
+    for _ in range(keep):
+        cut = bits.index('1', cut + 1)
+    played &= ~(new & ((1 << (length * 8 - cut - 1)) - 1))
+    return played.to_bytes(length, 'big')
+
+
+def covered_seconds(bitmap, duration):
+    """Seconds of the video that have been watched; bits past a known duration do not count"""
+    bitmap = bytes(bitmap or b'')
+    value = int.from_bytes(bitmap, 'big')
+    if duration > 0:
+        bits = -(-duration // SECONDS_PER_BIT)
+        if len(bitmap) * 8 > bits:
+            value >>= len(bitmap) * 8 - bits
+    seconds = value.bit_count() * SECONDS_PER_BIT
+    return min(seconds, duration) if duration > 0 else seconds
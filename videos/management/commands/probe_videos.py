@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from videos.models import Video
+from videos.probe import apply_probe, probe_video
+
+
+class Command(BaseCommand):
+    help = 'Read duration, codecs, resolution and bitrate of stored videos from their headers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int, help='Only these video IDs')
+        parser.add_argument('--missing', action='store_true', help='Only videos that have not been probed yet')
+
+    def handle(self, *args, **options):
+        videos = Video.objects.exclude(video_file='').order_by('id')
+        if options['video_ids']:
+            videos = videos.filter(id__in=options['video_ids'])
+        if options['missing']:
+            videos = videos.filter(video_codec='')
+
+        probed = failed = 0
+        for video in videos.iterator():
+            info = probe_video(video.video_file)
+            if not info:
+                failed += 1
+                self.stderr.write(f'  #{video.id} {video.video_file.name}: could not be read')
+                continue
+            old_duration = video.duration
+            video.save(update_fields=apply_probe(video, info))
+            probed += 1
+            if video.duration != old_duration:
+                self.stdout.write(f'  #{video.id} duration {old_duration}s -> {video.duration}s')
+
+        self.stdout.write(self.style.SUCCESS(f'Probed {probed} video(s), {failed} could not be read'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from videos.models import Video
+from videos.transcoding import ffmpeg_binary, stale_claims, transcode_video
+
+
+class Command(BaseCommand):
+    help = 'Transcode videos into their HLS ladder (pending ones, and ones a dead worker left processing, by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int,
+                            help='Only these video IDs (re-transcoded whatever their status, e.g. stuck processing)')
+        parser.add_argument('--failed', action='store_true', help='Also retry videos whose transcoding failed')
+        parser.add_argument('--all', action='store_true', help='Re-transcode every video (e.g. after a ladder change)')
+
+    def handle(self, *args, **options):
+        if not ffmpeg_binary():
+            raise CommandError('ffmpeg is not installed (set FFMPEG_PATH)')
+
+        videos = Video.objects.exclude(video_file='').order_by('id')
+        if options['video_ids']:
+            videos = videos.filter(id__in=options['video_ids'])
+        elif not options['all']:
+            statuses = ['pending', 'failed'] if options['failed'] else ['pending']
+            videos = videos.filter(Q(hls_status__in=statuses) | stale_claims())
+
+        video_ids = list(videos.values_list('id', flat=True))
+        if options['video_ids'] or options['all']:
+            # Queue them again; with --all, videos a worker is transcoding right now are left to it
+            requeue = Video.objects.filter(id__in=video_ids)
+            if not options['video_ids']:
+                requeue = requeue.exclude(hls_status='processing')
+            requeue.update(hls_status='pending')
+        self.stdout.write(f'Found {len(video_ids)} video(s) to transcode')
+
+        done = failed = 0
+        for video_id in video_ids:
+            result = transcode_video(video_id)
+            if result is None:
+                self.stdout.write(f'  #{video_id} skipped (being transcoded elsewhere)')
+            elif result:
+                done += 1
+                self.stdout.write(f'  #{video_id} ready')
+            else:
+                failed += 1
+                self.stderr.write(f'  #{video_id} failed: {Video.objects.get(pk=video_id).hls_error}')
+
+        self.stdout.write(self.style.SUCCESS(f'Transcoded {done} video(s), {failed} failed'))
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_interactivecourseprogress_slide_timestamps_and_skip_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='hls_playlist',
+            field=models.CharField(blank=True, help_text='Master playlist, relative to MEDIA_ROOT', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='hls_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='VideoRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('height', models.PositiveIntegerField()),
+                ('video_bitrate', models.PositiveIntegerField(help_text='kbit/s')),
+                ('audio_bitrate', models.PositiveIntegerField(help_text='kbit/s')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('playlist', models.CharField(blank=True, help_text='Media playlist, relative to MEDIA_ROOT', max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='videos.video')),
+            ],
+            options={
+                'db_table': 'video_renditions',
+                'ordering': ['height'],
+                'unique_together': {('video', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_video_media_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprogress',
+            name='watched_bitmap',
+            field=models.BinaryField(blank=True, default=b'', help_text='One bit per second played (see coverage.py)'),
+        ),
+    ]
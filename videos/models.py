@@ -176,6 +176,13 @@ class InteractiveCourseProgress(models.Model):
 
 class Video(models.Model):
     """Video model for course content"""
+    HLS_STATUSES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='videos')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -187,12 +194,54 @@ class Video(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Read from the container headers on upload (see probe.py)
+    video_codec = models.CharField(max_length=50, blank=True)
+    audio_codec = models.CharField(max_length=50, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, help_text='bit/s')
+    
+    # Adaptive-bitrate HLS ladder transcoded in the background (see transcoding.py)
+    hls_status = models.CharField(max_length=20, choices=HLS_STATUSES, default='pending')
+    hls_playlist = models.CharField(max_length=255, blank=True, help_text='Master playlist, relative to MEDIA_ROOT')
+    hls_error = models.TextField(blank=True)
+    
     class Meta:
         db_table = 'videos'
         ordering = ['order_index', 'created_at']
     
     def __str__(self):
         return f"{self.course.title} - {self.title}"
+    
+    @property
+    def hls_ready(self):
+        """True once the master playlist can be played"""
+        return self.hls_status == 'ready' and bool(self.hls_playlist)
+
+class VideoRendition(models.Model):
+    """One rung of a video's HLS ladder (e.g. 480p) and its transcoding state"""
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=20)
+    height = models.PositiveIntegerField()
+    video_bitrate = models.PositiveIntegerField(help_text='kbit/s')
+    audio_bitrate = models.PositiveIntegerField(help_text='kbit/s')
+    status = models.CharField(max_length=20, choices=Video.HLS_STATUSES, default='pending')
+    playlist = models.CharField(max_length=255, blank=True, help_text='Media playlist, relative to MEDIA_ROOT')
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'video_renditions'
+        unique_together = ['video', 'name']
+        ordering = ['height']
+    
+    def __str__(self):
+        return f"{self.video.title} - {self.name}"
+    
+    @property
+    def bandwidth(self):
+        """Peak bits per second advertised in the master playlist"""
+        return int((self.video_bitrate * 1.1 + self.audio_bitrate) * 1000)
 
 class VideoSubtitle(models.Model):
     """Subtitles/translations for videos"""
@@ -214,6 +263,7 @@ class VideoProgress(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_progress')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='progress_records')
     watched_duration = models.IntegerField(default=0, help_text='Seconds watched')
+    watched_bitmap = models.BinaryField(default=b'', blank=True, help_text='One bit per second played (see coverage.py)')
     last_position = models.IntegerField(default=0, help_text='Last position in seconds')
     is_completed = models.BooleanField(default=False)
     skip_attempts = models.IntegerField(default=0)
@@ -0,0 +1,501 @@
+"""
+Media probing of uploaded videos from their container headers.
+
+Duration, codecs, resolution and bitrate are read from the stored file
+without copying it: with ffprobe (FFPROBE_BINARY) when it is installed,
+otherwise by parsing the container directly. MP4/MOV is read box by box,
+seeking over the media data to the moov box (and, for fragmented MP4, the
+last moof box). WebM/Matroska is read from the Info and Tracks elements at
+the start; browser recordings (MediaRecorder) carry no duration there, so it
+is taken from the last cluster in the final PROBE_TAIL_SIZE bytes. At most a
+few MB are read either way.
+"""
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROBE_HEAD_SIZE = 4 * 1024 * 1024
+PROBE_TAIL_SIZE = 4 * 1024 * 1024
+MAX_MOOV_SIZE = 32 * 1024 * 1024
+FFPROBE_TIMEOUT = 60
+
+# Matroska element IDs
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+TRACK_VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+CLUSTER_TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+BLOCK_DURATION = 0x9B
+
+MKV_CODECS = {
+    'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1', 'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc',
+    'A_OPUS': 'opus', 'A_VORBIS': 'vorbis', 'A_AAC': 'aac', 'A_MPEG/L3': 'mp3',
+}
+MP4_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'vp09': 'vp9', 'av01': 'av1',
+    'mp4v': 'mpeg4', 'mp4a': 'aac', 'Opus': 'opus', '.mp3': 'mp3', 'ac-3': 'ac3', 'ec-3': 'eac3',
+}
+
+
+class ProbeError(Exception):
+    """The file could not be read as a supported container"""
+
+
+def _empty_info():
+    return {
+        'format': '', 'duration': None, 'video_codec': '', 'audio_codec': '',
+        'width': None, 'height': None, 'bitrate': None,
+    }
+
+
+def _finish(info, size):
+    if not info['bitrate'] and info['duration'] and size:
+        info['bitrate'] = int(size * 8 / info['duration'])
+    return info
+
+
+# --- ffprobe ----------------------------------------------------------------
+
+def ffprobe_binary():
+    """Path of the ffprobe executable, or None if it is not installed"""
+    return shutil.which(getattr(settings, 'FFPROBE_BINARY', 'ffprobe'))
+
+
+def probe_with_ffprobe(ffprobe, path):
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        check=True, capture_output=True, timeout=FFPROBE_TIMEOUT,
+    )
+    data = json.loads(result.stdout or b'{}')
+    fmt = data.get('format', {})
+
+    info = _empty_info()
+    info['format'] = fmt.get('format_name', '').split(',')[0]
+    if fmt.get('duration'):
+        info['duration'] = float(fmt['duration'])
+    if fmt.get('bit_rate'):
+        info['bitrate'] = int(fmt['bit_rate'])
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and not info['video_codec']:
+            info['video_codec'] = stream.get('codec_name', '')
+            info['width'] = stream.get('width')
+            info['height'] = stream.get('height')
+        elif stream.get('codec_type') == 'audio' and not info['audio_codec']:
+            info['audio_codec'] = stream.get('codec_name', '')
+    return _finish(info, int(fmt.get('size') or 0))
+
+
+# --- MP4 / MOV --------------------------------------------------------------
+
+def _mp4_boxes(data, start=0, end=None):
+    """(type, payload start, payload end) of the boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            return
+        yield box_type.decode('latin-1'), offset + header, offset + size
+        offset += size
+
+
+def _top_level_boxes(f, size):
+    """(type, offset, header size, box size) of the top-level boxes, read by seeking from header to header"""
+    offset = 0
+    while offset + 8 <= size:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < header_size:
+            return
+        yield box_type.decode('latin-1'), offset, header_size, box_size
+        offset += box_size
+
+
+def _read_box(f, offset, header_size, box_size):
+    if box_size > MAX_MOOV_SIZE:
+        raise ProbeError('Box is too large')
+    f.seek(offset + header_size)
+    return f.read(box_size - header_size)
+
+
+def _field(data, start, end, offset, length):
+    """data[start + offset:start + offset + length], which must lie inside the box payload ending at `end`"""
+    if offset < 0 or start + offset + length > end:
+        raise ProbeError('Truncated box')
+    return data[start + offset:start + offset + length]
+
+
+def _version(data, start, end):
+    """Version byte of a full box"""
+    return _field(data, start, end, 0, 1)[0]
+
+
+def _children(data, start, end):
+    return {box_type: (s, e) for box_type, s, e in _mp4_boxes(data, start, end)}
+
+
+def _mp4_track(moov, start, end):
+    """(track id, timescale, handler, codec fourcc, width, height) of a trak box"""
+    track_id, timescale, handler, fourcc, width, height = None, None, '', '', None, None
+    children = _children(moov, start, end)
+    if 'tkhd' in children:
+        s, e = children['tkhd']
+        track_id = struct.unpack('>I', _field(moov, s, e, 20 if _version(moov, s, e) == 1 else 12, 4))[0]
+        # Width and height are the last 8 bytes, 16.16 fixed point
+        width, height = (value >> 16 for value in struct.unpack('>II', _field(moov, s, e, e - s - 8, 8)))
+    mdia = _children(moov, *children['mdia']) if 'mdia' in children else {}
+    if 'mdhd' in mdia:
+        s, e = mdia['mdhd']
+        timescale = struct.unpack('>I', _field(moov, s, e, 20 if _version(moov, s, e) == 1 else 12, 4))[0]
+    if 'hdlr' in mdia:
+        s, e = mdia['hdlr']
+        handler = _field(moov, s, e, 8, 4).decode('latin-1')
+    minf = _children(moov, *mdia['minf']) if 'minf' in mdia else {}
+    stbl = _children(moov, *minf['stbl']) if 'stbl' in minf else {}
+    if 'stsd' in stbl:
+        s, e = stbl['stsd']
+        # version/flags, entry count, then the first entry's size and format
+        fourcc = _field(moov, s, e, 12, 4).decode('latin-1')
+    return track_id, timescale, handler, fourcc, width, height
+
+
+def _fragment_end(moof, timescales):
+    """End time in seconds of the samples in a moof box (fragmented MP4)"""
+    end = 0
+    for box_type, start, stop in _mp4_boxes(moof):
+        if box_type != 'traf':
+            continue
+        track_id, default_duration, base_time, total = None, 0, 0, 0
+        for child, s, e in _mp4_boxes(moof, start, stop):
+            if child not in ('tfhd', 'tfdt', 'trun'):
+                continue
+            flags = int.from_bytes(_field(moof, s, e, 1, 3), 'big')
+            if child == 'tfhd':
+                track_id = struct.unpack('>I', _field(moof, s, e, 4, 4))[0]
+                offset = 8 + (8 if flags & 0x01 else 0) + (4 if flags & 0x02 else 0)
+                if flags & 0x08:
+                    default_duration = struct.unpack('>I', _field(moof, s, e, offset, 4))[0]
+            elif child == 'tfdt':
+                base_time = int.from_bytes(_field(moof, s, e, 4, 8 if _version(moof, s, e) == 1 else 4), 'big')
+            elif child == 'trun':
+                count = struct.unpack('>I', _field(moof, s, e, 4, 4))[0]
+                if not flags & 0x100:
+                    total += count * default_duration
+                    continue
+                offset = s + 8 + (4 if flags & 0x01 else 0) + (4 if flags & 0x04 else 0)
+                sample_size = 4 * bin(flags & 0xF00).count('1')
+                for i in range(count):
+                    position = offset + i * sample_size
+                    if position + 4 > e:
+                        break
+                    total += struct.unpack('>I', moof[position:position + 4])[0]
+        if timescales.get(track_id):
+            end = max(end, (base_time + total) / timescales[track_id])
+    return end
+
+
+def probe_mp4(f, size):
+    moov = last_moof = None
+    for box_type, offset, header_size, box_size in _top_level_boxes(f, size):
+        if box_type == 'moov':
+            moov = _read_box(f, offset, header_size, box_size)
+        elif box_type == 'moof':
+            last_moof = (offset, header_size, box_size)
+    if moov is None:
+        raise ProbeError('No moov box')
+
+    info = _empty_info()
+    info['format'] = 'mp4'
+    timescales = {}
+    movie_timescale = None
+    for box_type, start, end in _mp4_boxes(moov):
+        if box_type == 'mvhd':
+            if _version(moov, start, end) == 1:
+                movie_timescale, duration = struct.unpack('>IQ', _field(moov, start, end, 20, 12))
+            else:
+                movie_timescale, duration = struct.unpack('>II', _field(moov, start, end, 12, 8))
+            if movie_timescale and duration:
+                info['duration'] = duration / movie_timescale
+        elif box_type == 'mvex' and not info['duration']:
+            mehd = _children(moov, start, end).get('mehd')
+            if mehd and movie_timescale:
+                s, e = mehd
+                fragment_duration = int.from_bytes(_field(moov, s, e, 4, 8 if _version(moov, s, e) == 1 else 4), 'big')
+                info['duration'] = fragment_duration / movie_timescale or None
+        elif box_type == 'trak':
+            track_id, timescale, handler, fourcc, width, height = _mp4_track(moov, start, end)
+            timescales[track_id] = timescale
+            if handler == 'vide' and not info['video_codec']:
+                info['video_codec'] = MP4_CODECS.get(fourcc, fourcc)
+                info['width'], info['height'] = width, height
+            elif handler == 'soun' and not info['audio_codec']:
+                info['audio_codec'] = MP4_CODECS.get(fourcc, fourcc)
+
+    if not info['duration'] and last_moof:
+        # Fragmented MP4 (e.g. Safari's MediaRecorder): the end of the last fragment
+        info['duration'] = _fragment_end(_read_box(f, *last_moof), timescales) or None
+    if not info['duration']:
+        raise ProbeError('No duration found')
+    return _finish(info, size)
+
+
+# --- WebM / Matroska --------------------------------------------------------
+
+def _read_vint(data, offset, keep_marker=False):
+    """(value, length) of an EBML variable-length integer; value None when unknown-sized"""
+    if offset >= len(data):
+        raise ProbeError('Truncated EBML data')
+    first = data[offset]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise ProbeError('Invalid EBML integer')
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, length
+
+
+def _ebml_elements(data, start, end):
+    """(id, payload start, payload end) of the elements in data[start:end]; unknown sizes run to `end`"""
+    offset = start
+    while offset < end:
+        try:
+            element_id, id_length = _read_vint(data, offset, keep_marker=True)
+            size, size_length = _read_vint(data, offset + id_length)
+        except ProbeError:
+            return
+        payload = offset + id_length + size_length
+        payload_end = end if size is None else min(payload + size, end)
+        yield element_id, payload, payload_end
+        if size is None:
+            return
+        offset = payload + size
+
+
+def _uint(data, start, end):
+    return int.from_bytes(data[start:end], 'big')
+
+
+def _float(data, start, end):
+    if end - start == 4:
+        return struct.unpack('>f', data[start:end])[0]
+    if end - start == 8:
+        return struct.unpack('>d', data[start:end])[0]
+    return None
+
+
+def _webm_tracks(data, start, end, info):
+    for element_id, s, e in _ebml_elements(data, start, end):
+        if element_id != TRACK_ENTRY:
+            continue
+        track_type, codec, width, height = None, '', None, None
+        for child_id, cs, ce in _ebml_elements(data, s, e):
+            if child_id == TRACK_TYPE:
+                track_type = _uint(data, cs, ce)
+            elif child_id == CODEC_ID:
+                codec = data[cs:ce].decode('ascii', errors='replace').rstrip('\x00')
+            elif child_id == TRACK_VIDEO:
+                for video_id, vs, ve in _ebml_elements(data, cs, ce):
+                    if video_id == PIXEL_WIDTH:
+                        width = _uint(data, vs, ve)
+                    elif video_id == PIXEL_HEIGHT:
+                        height = _uint(data, vs, ve)
+        codec = MKV_CODECS.get(codec, codec.lower())
+        if track_type == 1 and not info['video_codec']:
+            info['video_codec'], info['width'], info['height'] = codec, width, height
+        elif track_type == 2 and not info['audio_codec']:
+            info['audio_codec'] = codec
+
+
+def _last_block_time(data):
+    """Timecode (in TimecodeScale units) of the end of the last block in a buffer, or None"""
+    position = len(data)
+    marker = CLUSTER.to_bytes(4, 'big')
+    while True:
+        position = data.rfind(marker, 0, position)
+        if position < 0:
+            return None
+        # The ID can occur inside frame data; a real cluster starts with its Timecode
+        children = None
+        try:
+            size, size_length = _read_vint(data, position + 4)
+            start = position + 4 + size_length
+            end = len(data) if size is None else min(start + size, len(data))
+            children = list(_ebml_elements(data, start, end))
+        except ProbeError:
+            pass
+        if not children or children[0][0] != CLUSTER_TIMECODE:
+            continue
+
+        cluster_time = _uint(data, children[0][1], children[0][2])
+        last = cluster_time
+        for element_id, s, e in children[1:]:
+            block_duration = 0
+            if element_id == BLOCK_GROUP:
+                block = None
+                for child_id, cs, ce in _ebml_elements(data, s, e):
+                    if child_id == BLOCK:
+                        block = (cs, ce)
+                    elif child_id == BLOCK_DURATION:
+                        block_duration = _uint(data, cs, ce)
+                if not block:
+                    continue
+                s, e = block
+            elif element_id != SIMPLE_BLOCK:
+                if element_id in (CLUSTER, SEGMENT, EBML_HEADER):
+                    break  # Unknown-sized cluster ran into the next top-level element
+                continue
+            try:
+                _, track_length = _read_vint(data, s)
+            except ProbeError:
+                break
+            if s + track_length + 2 > e:
+                break
+            relative = struct.unpack('>h', data[s + track_length:s + track_length + 2])[0]
+            last = max(last, cluster_time + relative + block_duration)
+        return last
+
+
+def probe_webm(f, size):
+    f.seek(0)
+    head = f.read(PROBE_HEAD_SIZE)
+    info = _empty_info()
+    elements = list(_ebml_elements(head, 0, len(head)))
+    if not elements or elements[0][0] != EBML_HEADER:
+        raise ProbeError('Not an EBML file')
+    for element_id, s, e in _ebml_elements(head, *elements[0][1:]):
+        if element_id == EBML_DOCTYPE:
+            info['format'] = head[s:e].decode('ascii', errors='replace').rstrip('\x00')
+
+    segment = next((element for element in elements if element[0] == SEGMENT), None)
+    if not segment:
+        raise ProbeError('No Segment element')
+
+    timecode_scale = 1000000
+    duration = None
+    for element_id, s, e in _ebml_elements(head, segment[1], segment[2]):
+        if element_id == INFO:
+            for child_id, cs, ce in _ebml_elements(head, s, e):
+                if child_id == TIMECODE_SCALE:
+                    timecode_scale = _uint(head, cs, ce) or timecode_scale
+                elif child_id == DURATION:
+                    duration = _float(head, cs, ce)
+        elif element_id == TRACKS:
+            _webm_tracks(head, s, e, info)
+        elif element_id == CLUSTER:
+            break
+
+    if not duration:
+        # MediaRecorder writes no Duration: use the end of the last block
+        if size > len(head):
+            f.seek(max(0, size - PROBE_TAIL_SIZE))
+            tail = f.read(PROBE_TAIL_SIZE)
+        else:
+            tail = head
+        duration = _last_block_time(tail)
+    if not duration:
+        raise ProbeError('No duration found')
+
+    info['duration'] = duration * timecode_scale / 1e9
+    return _finish(info, size)
+
+
+# --- Entry points -----------------------------------------------------------
+
+def probe_file(f, size):
+    """Container information of an open binary file, chosen by its magic bytes"""
+    f.seek(0)
+    magic = f.read(12)
+    if magic[:4] == EBML_HEADER.to_bytes(4, 'big'):
+        return probe_webm(f, size)
+    if magic[4:8] in (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip'):
+        return probe_mp4(f, size)
+    raise ProbeError('Unsupported container')
+
+
+def probe_video(field_file):
+    """
+    Duration (seconds), codecs, resolution and bitrate (bit/s) of a stored
+    video file, as a dict, or None if it cannot be read.
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None  # Remote storage: parse through the storage's file object
+
+    ffprobe = ffprobe_binary() if path else None
+    if ffprobe:
+        try:
+            info = probe_with_ffprobe(ffprobe, path)
+            if info['duration']:
+                return info
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            logger.warning('ffprobe failed for %s: %s', field_file.name, e)
+
+    try:
+        if path:
+            with open(path, 'rb') as f:
+                return probe_file(f, os.path.getsize(path))
+        with field_file.storage.open(field_file.name, 'rb') as f:
+            return probe_file(f, field_file.size)
+    except (ProbeError, OSError, struct.error, ValueError, IndexError) as e:
+        logger.warning('Could not probe %s: %s', field_file.name, e)
+        return None
+
+
+def apply_probe(video, info):
+    """Copy probe results onto a Video (without saving); returns the updated field names"""
+    video.file_size = video.video_file.size
+    fields = ['file_size']
+    if info:
+        if info['duration']:
+            video.duration = max(1, round(info['duration']))
+            fields.append('duration')
+        video.video_codec = info['video_codec'] or ''
+        video.audio_codec = info['audio_codec'] or ''
+        video.width = info['width']
+        video.height = info['height']
+        video.bitrate = info['bitrate']
+        fields += ['video_codec', 'audio_codec', 'width', 'height', 'bitrate']
+    return fields
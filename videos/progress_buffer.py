@@ -0,0 +1,406 @@
+"""
+Buffered ingestion of video progress heartbeats.
+
+The course player posts the ranges it has played every few seconds per
+viewer. Instead of a get_or_create and a full-row save per heartbeat, the
+first heartbeat of a viewing seeds a buffer entry from the VideoProgress row
+(creating it if needed) and later heartbeats only touch the buffer: the
+watched bitmap (see coverage.py) is merged with a bitwise OR so late or
+duplicate posts never lose coverage, last_position keeps the latest value.
+The played ranges come from the client, so a heartbeat only adds as many
+new seconds as could have been played since the previous one (the
+wall-clock gap, capped at VIDEO_PROGRESS_MAX_GAP, times
+VIDEO_MAX_PLAYBACK_RATE); the rest is dropped, and the player re-sends
+it with its next heartbeat.
+watched_duration is derived from the bitmap. Dirty entries are written to
+the database with bulk_update every VIDEO_PROGRESS_FLUSH_INTERVAL seconds by
+flush_video_progress (a periodic Celery task). Crossing the completion
+threshold is still written synchronously, since certificates and quizzes
+are gated on it.
+
+The buffer lives in Redis (VIDEO_PROGRESS_REDIS_URL, by default CACHE_URL) so
+every worker process and the Celery flush share it; an in-process buffer
+would be invisible to the flush. Redis is therefore required when DEBUG is
+off (VideosConfig.ready() refuses to start without it). In development,
+without Redis, each heartbeat is written straight to its VideoProgress row
+(a row lock per heartbeat).
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .coverage import SECONDS_PER_BIT, clip_new_seconds, covered_seconds, merge_bitmaps
+from .models import Video, VideoProgress
+
+logger = logging.getLogger(__name__)
+
+ENTRY_KEY = 'videos:progress:{}:{}'
+BITMAP_KEY = 'videos:progress:{}:{}:bitmap'
+SCRATCH_KEY = 'videos:progress:scratch'
+DIRTY_KEY = 'videos:progress:dirty'
+FLUSH_LOCK_KEY = 'videos:progress:flush'
+
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_MAX_PLAYBACK_RATE = 2
+DEFAULT_MAX_GAP = 10 * 60
+ENTRY_TIMEOUT = 60 * 60 * 24
+FLUSH_BATCH_SIZE = 1000
+
+# Merge a heartbeat into a seeded entry; nil if the entry has expired or was never seeded.
+# At most min(now - t, max gap) * rate new seconds of the heartbeat's bitmap are OR-ed in,
+# earliest first (as coverage.clip_new_seconds); t is the time of the previous heartbeat.
+RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local now = tonumber(ARGV[5])
+local gap = tonumber(ARGV[7])
+local last = tonumber(redis.call('HGET', KEYS[1], 't') or (now - gap))
+local budget = math.floor(math.min(math.max(now - last, 0), gap) * tonumber(ARGV[6]))
+redis.call('HSET', KEYS[1], 'p', ARGV[1], 't', ARGV[5])
+if ARGV[4] ~= '' then
+    local stored = redis.call('GET', KEYS[3]) or ''
+    local played = ARGV[4]
+    local merged = {}
+    for i = 1, math.max(#stored, #played) do
+        local byte = string.byte(stored, i) or 0
+        local bits = string.byte(played, i) or 0
+        local mask = 128
+        while bits ~= byte and mask >= 1 and budget > 0 do
+            if math.floor(bits / mask) % 2 == 1 and math.floor(byte / mask) % 2 == 0 then
+                byte = byte + mask
+                budget = budget - 1
+            end
+            mask = mask / 2
+        end
+        merged[i] = string.char(byte)
+    end
+    redis.call('SET', KEYS[3], table.concat(merged))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[3])
+return {redis.call('HGET', KEYS[1], 'w'), ARGV[1], redis.call('HGET', KEYS[1], 'd'),
+        redis.call('HGET', KEYS[1], 'c'), redis.call('GET', KEYS[3]) or ''}
+"""
+
+# Create an entry (merging with a concurrent seed)
+SEED_SCRIPT = """
+local watched = math.max(tonumber(redis.call('HGET', KEYS[1], 'w') or '0'), tonumber(ARGV[1]))
+redis.call('HSET', KEYS[1], 'w', watched, 'd', ARGV[3])
+redis.call('HSETNX', KEYS[1], 'p', ARGV[2])
+redis.call('HSETNX', KEYS[1], 't', ARGV[7])
+if tonumber(ARGV[4]) == 1 then
+    redis.call('HSET', KEYS[1], 'c', 1)
+else
+    redis.call('HSETNX', KEYS[1], 'c', 0)
+end
+if ARGV[6] ~= '' then
+    redis.call('SET', KEYS[3], ARGV[6])
+    redis.call('BITOP', 'OR', KEYS[2], KEYS[2], KEYS[3])
+    redis.call('DEL', KEYS[3])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return watched
+"""
+
+
+def _flush_interval():
+    return getattr(settings, 'VIDEO_PROGRESS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def _max_playback_rate():
+    return getattr(settings, 'VIDEO_MAX_PLAYBACK_RATE', DEFAULT_MAX_PLAYBACK_RATE)
+
+
+def _max_gap():
+    return getattr(settings, 'VIDEO_PROGRESS_MAX_GAP', DEFAULT_MAX_GAP)
+
+
+class RedisProgressStore:
+    """Buffer shared by every process: one hash per (user, video) plus a set of dirty entries"""
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._record = self._redis.register_script(RECORD_SCRIPT)
+        self._seed = self._redis.register_script(SEED_SCRIPT)
+
+    def seed(self, user_id, video_id, watched, bitmap, position, duration, completed, previous):
+        self._seed(keys=[ENTRY_KEY.format(user_id, video_id), BITMAP_KEY.format(user_id, video_id), SCRATCH_KEY],
+                   args=[watched, position, duration, int(completed), ENTRY_TIMEOUT, bitmap, previous])
+
+    def record(self, user_id, video_id, bitmap, position):
+        result = self._record(
+            keys=[ENTRY_KEY.format(user_id, video_id), DIRTY_KEY, BITMAP_KEY.format(user_id, video_id)],
+            args=[position, ENTRY_TIMEOUT, f'{user_id}:{video_id}', bitmap,
+                  time.time(), _max_playback_rate() / SECONDS_PER_BIT, _max_gap()],
+        )
+        if result is None:
+            return None
+        watched, position, duration, completed, bitmap = result
+        return {'w': int(float(watched or 0)), 'b': bytes(bitmap), 'p': int(float(position)),
+                'd': int(float(duration or 0)), 'c': int(float(completed or 0))}
+
+    def get(self, user_id, video_id):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hgetall(ENTRY_KEY.format(user_id, video_id))
+        pipe.get(BITMAP_KEY.format(user_id, video_id))
+        entry, bitmap = pipe.execute()
+        if not entry:
+            return None
+        entry = {key.decode(): int(float(value)) for key, value in entry.items()}
+        entry['b'] = bitmap or b''
+        return entry
+
+    def mark_completed(self, user_id, video_id):
+        key = ENTRY_KEY.format(user_id, video_id)
+        if self._redis.exists(key):
+            self._redis.hset(key, 'c', 1)
+
+    def mark_dirty(self, pairs):
+        if pairs:
+            self._redis.sadd(DIRTY_KEY, *[f'{user_id}:{video_id}' for user_id, video_id in pairs])
+
+    def pop_dirty(self, limit):
+        members = self._redis.spop(DIRTY_KEY, limit) or []
+        pairs = [tuple(int(part) for part in member.decode().split(':')) for member in members]
+        if not pairs:
+            return []
+        # Heartbeats after this read mark the entry dirty again, so nothing is lost
+        pipe = self._redis.pipeline(transaction=False)
+        for user_id, video_id in pairs:
+            pipe.hget(ENTRY_KEY.format(user_id, video_id), 'p')
+            pipe.get(BITMAP_KEY.format(user_id, video_id))
+        results = pipe.execute()
+        return [
+            (user_id, video_id, bitmap or b'', int(float(position)))
+            for (user_id, video_id), position, bitmap in zip(pairs, results[::2], results[1::2])
+            if position is not None
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The shared heartbeat buffer, or None without Redis (development: heartbeats go to the database)"""
+    global _store
+    url = getattr(settings, 'VIDEO_PROGRESS_REDIS_URL', '')
+    if not url:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RedisProgressStore(url)
+    return _store
+
+
+def completion_reached(watched, duration):
+    """Auto-completion rule: 95% of a known duration, otherwise 60 seconds watched"""
+    if duration > 0:
+        return watched >= duration * 0.95
+    return watched >= 60
+
+
+def completion_percentage(watched, duration):
+    """VideoProgress.completion_percentage() for buffered values"""
+    return VideoProgress(video=Video(duration=duration), watched_duration=watched).completion_percentage()
+
+
+def _allowance(elapsed):
+    """
+    Seconds of new coverage a heartbeat may add: the wall-clock seconds since
+    the previous heartbeat (None if unknown) at the fastest playback rate.
+    """
+    gap = _max_gap()
+    elapsed = gap if elapsed is None else min(max(elapsed, 0), gap)
+    return int(elapsed * _max_playback_rate())
+
+
+def _since_previous(progress, now):
+    """Seconds since a row last recorded coverage, or None if it never has"""
+    if progress.updated_at is None or not (progress.watched_duration or progress.watched_bitmap):
+        return None
+    return (now - progress.updated_at).total_seconds()
+
+
+def _merge_into(progress, bitmap, position, now):
+    """OR a bitmap into a VideoProgress row (its video is needed for the duration); watched never goes down"""
+    progress.watched_bitmap = merge_bitmaps(progress.watched_bitmap, bitmap)
+    progress.watched_duration = max(progress.watched_duration,
+                                    covered_seconds(progress.watched_bitmap, progress.video.duration))
+    progress.last_position = position
+    progress.updated_at = now
+
+
+def _locked_progress(user, video):
+    VideoProgress.objects.get_or_create(user=user, video=video)
+    progress = VideoProgress.objects.select_for_update().get(user=user, video=video)
+    progress.video = video
+    return progress
+
+
+def _watched(entry):
+    # Rows from before the bitmap keep their recorded watched_duration
+    return max(entry['w'], covered_seconds(entry['b'], entry['d']))
+
+
+def _seed(store, user, video_id, position):
+    """Load (or create) the progress row behind a buffer entry; None if the video does not exist"""
+    video = Video.objects.filter(id=video_id).only('id', 'duration').first()
+    if video is None:
+        return None
+    progress, _ = VideoProgress.objects.get_or_create(user=user, video=video)
+    elapsed = _since_previous(progress, timezone.now())
+    store.seed(user.id, video.id, progress.watched_duration, bytes(progress.watched_bitmap),
+               progress.last_position or position, video.duration, progress.is_completed,
+               time.time() - (_max_gap() if elapsed is None else elapsed))
+    return progress
+
+
+def _record_unbuffered(user, video_id, bitmap, position):
+    """record_heartbeat() without a shared buffer: merge straight into the row"""
+    video = Video.objects.filter(id=video_id).only('id', 'duration').first()
+    if video is None:
+        return None
+    now = timezone.now()
+    with transaction.atomic():
+        progress = _locked_progress(user, video)
+        bitmap = clip_new_seconds(bitmap, progress.watched_bitmap, _allowance(_since_previous(progress, now)))
+        _merge_into(progress, bitmap, position, now)
+        fields = ['watched_duration', 'watched_bitmap', 'last_position', 'updated_at']
+        just_completed = not progress.is_completed and completion_reached(progress.watched_duration, video.duration)
+        if just_completed:
+            progress.is_completed = True
+            progress.completed_at = now
+            fields += ['is_completed', 'completed_at']
+        progress.save(update_fields=fields)
+    return {
+        'watched': progress.watched_duration, 'position': progress.last_position, 'duration': video.duration,
+        'completed': progress.is_completed, 'just_completed': just_completed,
+    }
+
+
+def record_heartbeat(user, video_id, bitmap, position):
+    """
+    Merge a progress heartbeat (bitmap of the seconds played, see
+    coverage.py) into the buffer and return the current values as a dict
+    (watched, position, duration, completed, just_completed), or None if
+    the video does not exist. Only the first heartbeat of a viewing and the
+    one that completes the video touch the database (every heartbeat does
+    in development without Redis).
+    """
+    store = get_store()
+    if store is None:
+        return _record_unbuffered(user, video_id, bitmap, position)
+
+    entry = store.record(user.id, video_id, bitmap, position)
+    if entry is None:
+        if _seed(store, user, video_id, position) is None:
+            return None
+        entry = store.record(user.id, video_id, bitmap, position)
+
+    watched = _watched(entry)
+    just_completed = not entry['c'] and completion_reached(watched, entry['d'])
+    if just_completed:
+        # Merged like a flush, so progress written by another path is never overwritten
+        now = timezone.now()
+        with transaction.atomic():
+            progress = _locked_progress(user, Video(id=video_id, duration=entry['d']))
+            _merge_into(progress, entry['b'], entry['p'], now)
+            progress.watched_duration = max(progress.watched_duration, watched)
+            progress.is_completed = True
+            progress.completed_at = now
+            progress.save(update_fields=['watched_duration', 'watched_bitmap', 'last_position',
+                                         'is_completed', 'completed_at', 'updated_at'])
+        store.mark_completed(user.id, video_id)
+
+    return {
+        'watched': watched, 'position': entry['p'], 'duration': entry['d'],
+        'completed': bool(entry['c']) or just_completed, 'just_completed': just_completed,
+    }
+
+
+def merge_buffered(progress, bitmap=b''):
+    """
+    Apply heartbeats not flushed yet, and optionally one more bitmap (capped
+    like a heartbeat), to a VideoProgress instance (its video is needed for
+    the duration).
+    """
+    store = get_store()
+    entry = store.get(progress.user_id, progress.video_id) if store else None
+    elapsed = _since_previous(progress, timezone.now())
+    if entry:
+        progress.watched_bitmap = merge_bitmaps(progress.watched_bitmap, entry['b'])
+        progress.last_position = entry.get('p', progress.last_position)
+        if 't' in entry:
+            elapsed = time.time() - entry['t']
+    if bitmap:
+        bitmap = clip_new_seconds(bitmap, progress.watched_bitmap, _allowance(elapsed))
+    progress.watched_bitmap = merge_bitmaps(progress.watched_bitmap, bitmap)
+    progress.watched_duration = max(progress.watched_duration,
+                                    covered_seconds(progress.watched_bitmap, progress.video.duration))
+    return progress
+
+
+def mark_completed(user_id, video_id):
+    """Record a completion written outside record_heartbeat (manual completion)"""
+    store = get_store()
+    if store:
+        store.mark_completed(user_id, video_id)
+
+
+def flush_video_progress(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Write dirty buffer entries to VideoProgress with bulk_update.
+
+    Returns the number of rows updated, or None when another flush holds the lock.
+    """
+    store = get_store()
+    if store is None:
+        return 0  # Heartbeats were written directly
+    if not cache.add(FLUSH_LOCK_KEY, True, 60 * 5):
+        return None
+
+    updated = 0
+    try:
+        while True:
+            entries = store.pop_dirty(batch_size)
+            if not entries:
+                return updated
+            buffered = {(user_id, video_id): (bitmap, position) for user_id, video_id, bitmap, position in entries}
+            condition = Q()
+            for user_id in {user_id for user_id, _ in buffered}:
+                condition |= Q(user_id=user_id, video_id__in=[v for u, v in buffered if u == user_id])
+
+            try:
+                now = timezone.now()
+                rows = []
+                for progress in VideoProgress.objects.filter(condition).select_related('video').only(
+                    'id', 'user_id', 'video_id', 'watched_duration', 'watched_bitmap', 'last_position',
+                    'video__duration',
+                ):
+                    bitmap, position = buffered[(progress.user_id, progress.video_id)]
+                    _merge_into(progress, bitmap, position, now)
+                    rows.append(progress)
+                VideoProgress.objects.bulk_update(
+                    rows, ['watched_duration', 'watched_bitmap', 'last_position', 'updated_at'], batch_size=500,
+                )
+            except Exception:
+                # Keep the entries for the next flush
+                store.mark_dirty(list(buffered))
+                logger.exception('Video progress flush failed')
+                raise
+            updated += len(rows)
+            if len(entries) < batch_size:
+                return updated
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
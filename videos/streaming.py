@@ -0,0 +1,68 @@
+"""
+Signed, range-capable video delivery.
+
+Video files are not served from /media/ for learners any more. Pages that
+show a player ask for a signed stream URL; access (enrollment, or content
+management rights) is checked once when the URL is signed. The URL carries a
+timestamped signature over the user and video, so the many Range requests a
+player makes while seeking are authorised from the signature alone and
+served by risk_lms.sendfile (206/multipart responses, conditional requests,
+optional X-Sendfile/X-Accel-Redirect hand-off). Transcoded HLS playlists
+and segments (see transcoding.py) are authorised by the same token; hls.js
+plays them in browsers without native HLS and is served from static files.
+"""
+from django.conf import settings
+from django.core import signing
+from django.templatetags.static import static
+from django.urls import reverse
+from courses.models import Enrollment
+
+TOKEN_SALT = 'videos.stream'
+
+DEFAULT_URL_MAX_AGE = 60 * 60 * 6
+DEFAULT_HLS_JS = 'vendor/hls.js/hls.js'
+
+
+def _max_age():
+    return getattr(settings, 'VIDEO_STREAM_URL_MAX_AGE', DEFAULT_URL_MAX_AGE)
+
+
+def hls_js_url():
+    """URL of hls.js: VIDEO_HLS_JS_URL if it is a URL, otherwise a static file path (the vendored copy)"""
+    url = getattr(settings, 'VIDEO_HLS_JS_URL', DEFAULT_HLS_JS)
+    if not url or url.startswith(('/', 'http://', 'https://')):
+        return url
+    return static(url)
+
+
+def can_stream_video(user, video):
+    """Enrolled learners and course managers may watch a course's videos"""
+    if not user.is_authenticated:
+        return False
+    if user.is_risk_admin() or video.course.created_by_id == user.id:
+        return True
+    return Enrollment.objects.filter(user=user, course_id=video.course_id).exists()
+
+
+def signed_stream_url(video, user):
+    """Stream URL for a video, valid for this user for VIDEO_STREAM_URL_MAX_AGE seconds"""
+    token = signing.TimestampSigner(salt=TOKEN_SALT).sign_object([video.id, user.id])
+    return f"{reverse('videos:stream', args=[video.id])}?token={token}"
+
+
+def signed_hls_url(video, user):
+    """Master playlist URL for a transcoded video; the token is a path segment so segment URLs inherit it"""
+    token = signing.TimestampSigner(salt=TOKEN_SALT).sign_object([video.id, user.id])
+    return reverse('videos:hls', args=[video.id, token, 'master.m3u8'])
+
+
+def read_stream_token(token, video_id):
+    """
+    Return the id of the user a stream token was signed for, or None if it is
+    invalid, expired or for another video. Needs no session or database access.
+    """
+    try:
+        signed_video_id, user_id = signing.TimestampSigner(salt=TOKEN_SALT).unsign_object(token, max_age=_max_age())
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return user_id if signed_video_id == video_id else None
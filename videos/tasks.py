@@ -0,0 +1,21 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def transcode_video_task(video_id):
+    """Transcode an uploaded video into its HLS ladder"""
+    from .models import Video
+    from .transcoding import transcode_video
+
+    try:
+        transcode_video(video_id)
+    except Video.DoesNotExist:
+        return  # Deleted before the worker picked it up
+
+
+@shared_task(ignore_result=True)
+def flush_video_progress_task():
+    """Write buffered video progress heartbeats to the database"""
+    from .progress_buffer import flush_video_progress
+
+    flush_video_progress()
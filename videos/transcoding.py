@@ -0,0 +1,218 @@
+"""
+Background HLS transcoding of uploaded videos.
+
+Raw uploads (large MP4s, browser-recorded WebM) are transcoded by a local
+ffmpeg binary into a small adaptive-bitrate ladder (VIDEO_HLS_LADDER, by
+default 240p/480p/720p H.264 + AAC) of fixed-length MPEG-TS segments with a
+media playlist per rung and one master playlist:
+
+    MEDIA_ROOT/videos/hls/<video id>/master.m3u8
+    MEDIA_ROOT/videos/hls/<video id>/480p/index.m3u8, seg_00000.ts, ...
+
+Each rung is a VideoRendition row with its own status. Once at least one
+rung is ready the video's hls_status becomes 'ready' and players switch to
+the master playlist, so branches on thin links start on the lowest rung
+instead of downloading the original file. Uploads are queued after commit;
+the transcode_videos command picks up anything left pending, and claims
+left 'processing' by a dead worker once they are stale.
+"""
+import logging
+import os
+import shutil
+import subprocess
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Video, VideoRendition
+
+logger = logging.getLogger(__name__)
+
+HLS_DIR = 'videos/hls/{}'
+MASTER_PLAYLIST = 'master.m3u8'
+
+DEFAULT_HLS_LADDER = [
+    {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1000, 'audio_bitrate': 96},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2500, 'audio_bitrate': 128},
+]
+DEFAULT_SEGMENT_SECONDS = 4
+DEFAULT_TIMEOUT = 60 * 60 * 2
+
+# Statuses transcode_video() may claim; 'ready' videos and live 'processing' claims are left alone
+CLAIMABLE_STATUSES = ['pending', 'failed']
+# A claim is refreshed before every rendition, and ffmpeg is killed after
+# VIDEO_TRANSCODE_TIMEOUT, so one older than that plus this margin belongs to a
+# worker that died mid-transcode (transcode_video_task is acks_late)
+STALE_CLAIM_MARGIN = 60 * 10
+
+
+def hls_ladder():
+    return getattr(settings, 'VIDEO_HLS_LADDER', DEFAULT_HLS_LADDER)
+
+
+def ffmpeg_binary():
+    """Path of the ffmpeg executable, or None if it is not installed"""
+    return shutil.which(getattr(settings, 'FFMPEG_BINARY', 'ffmpeg'))
+
+
+def ffmpeg_command(ffmpeg, source, output_dir, rendition):
+    """ffmpeg arguments transcoding `source` into one HLS rung in `output_dir`"""
+    segment_seconds = getattr(settings, 'VIDEO_HLS_SEGMENT_SECONDS', DEFAULT_SEGMENT_SECONDS)
+    video_bitrate = rendition.video_bitrate
+    return [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        '-i', source,
+        # Never upscale; -2 keeps the width even as H.264 requires
+        '-vf', f"scale=-2:'min({rendition.height},ih)'",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{video_bitrate}k', '-maxrate', f'{int(video_bitrate * 1.1)}k', '-bufsize', f'{video_bitrate * 2}k',
+        # Keyframes on segment boundaries so every rung can switch at any segment
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})', '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', f'{rendition.audio_bitrate}k', '-ac', '2',
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, 'seg_%05d.ts'),
+        os.path.join(output_dir, 'index.m3u8'),
+    ]
+
+
+def master_playlist(renditions):
+    """Master playlist text listing the given (ready) renditions, lowest first"""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rendition in sorted(renditions, key=lambda r: r.height):
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={rendition.bandwidth}")
+        lines.append(f'{rendition.name}/index.m3u8')
+    return '\n'.join(lines) + '\n'
+
+
+def _sync_renditions(video):
+    """Create the video's VideoRendition rows for the configured ladder, reset to pending"""
+    ladder = hls_ladder()
+    if video.height:
+        # No rungs above the source resolution (probe.py), but always the lowest one
+        ladder = [rung for rung in ladder if rung['height'] <= video.height] or [min(ladder, key=lambda r: r['height'])]
+    VideoRendition.objects.filter(video=video).exclude(name__in=[rung['name'] for rung in ladder]).delete()
+    existing = {rendition.name: rendition for rendition in VideoRendition.objects.filter(video=video)}
+
+    renditions = []
+    for rung in ladder:
+        rendition = existing.get(rung['name']) or VideoRendition(video=video, name=rung['name'])
+        rendition.height = rung['height']
+        rendition.video_bitrate = rung['video_bitrate']
+        rendition.audio_bitrate = rung['audio_bitrate']
+        rendition.status = 'pending'
+        rendition.playlist = ''
+        rendition.error = ''
+        renditions.append(rendition)
+
+    VideoRendition.objects.bulk_create([r for r in renditions if r.pk is None])
+    VideoRendition.objects.bulk_update(
+        [r for r in renditions if r.pk is not None],
+        ['height', 'video_bitrate', 'audio_bitrate', 'status', 'playlist', 'error'],
+    )
+    return list(VideoRendition.objects.filter(video=video))
+
+
+def stale_claims():
+    """Videos left 'processing' by a worker that died"""
+    timeout = getattr(settings, 'VIDEO_TRANSCODE_TIMEOUT', DEFAULT_TIMEOUT)
+    cutoff = timezone.now() - timedelta(seconds=timeout + STALE_CLAIM_MARGIN)
+    return Q(hls_status='processing', updated_at__lt=cutoff)
+
+
+def claim_video(video_id):
+    """
+    Mark a pending, failed or abandoned video as processing; False if it is
+    being transcoded right now or is ready.
+    """
+    return Video.objects.filter(Q(hls_status__in=CLAIMABLE_STATUSES) | stale_claims(), pk=video_id).update(
+        hls_status='processing', hls_error='', updated_at=timezone.now(),
+    ) > 0
+
+
+def transcode_video(video_id):
+    """
+    Transcode a video into its HLS ladder, lowest rung first.
+
+    The video is claimed with a conditional UPDATE first, so the task and the
+    transcode_videos command never work on (and delete) the same output.
+    Returns True if at least one rendition is playable, None if the video was
+    not claimable (set it back to 'pending' to transcode it again).
+    """
+    video = Video.objects.get(pk=video_id)
+    if not claim_video(video_id):
+        logger.info('Video already transcoded or in progress: video=%s', video_id)
+        return None
+    ffmpeg = ffmpeg_binary()
+    if not video.video_file or not ffmpeg:
+        error = 'No video file' if not video.video_file else 'ffmpeg is not installed (FFMPEG_PATH)'
+        Video.objects.filter(pk=video_id).update(hls_status='failed', hls_error=error)
+        return False
+
+    hls_dir = HLS_DIR.format(video_id)
+    root = default_storage.path(hls_dir)
+    shutil.rmtree(root, ignore_errors=True)
+
+    ready = []
+    timeout = getattr(settings, 'VIDEO_TRANSCODE_TIMEOUT', DEFAULT_TIMEOUT)
+    for rendition in sorted(_sync_renditions(video), key=lambda r: r.height):
+        output_dir = os.path.join(root, rendition.name)
+        os.makedirs(output_dir, exist_ok=True)
+        # Refresh the claim so it never looks abandoned while ffmpeg runs
+        Video.objects.filter(pk=video_id).update(updated_at=timezone.now())
+        VideoRendition.objects.filter(pk=rendition.pk).update(status='processing')
+        try:
+            subprocess.run(
+                ffmpeg_command(ffmpeg, video.video_file.path, output_dir, rendition),
+                check=True, capture_output=True, timeout=timeout,
+            )
+        except subprocess.CalledProcessError as e:
+            rendition.status = 'failed'
+            rendition.error = e.stderr.decode(errors='replace')[-2000:] or f'ffmpeg exited with {e.returncode}'
+        except (subprocess.TimeoutExpired, OSError) as e:
+            rendition.status = 'failed'
+            rendition.error = str(e)[:2000]
+        else:
+            rendition.status = 'ready'
+            rendition.playlist = f'{hls_dir}/{rendition.name}/index.m3u8'
+            ready.append(rendition)
+        if rendition.status == 'failed':
+            logger.warning('HLS rendition failed: video=%s rendition=%s', video_id, rendition.name)
+            shutil.rmtree(output_dir, ignore_errors=True)
+        rendition.save(update_fields=['status', 'playlist', 'error', 'updated_at'])
+
+    if not ready:
+        Video.objects.filter(pk=video_id).update(hls_status='failed', hls_playlist='',
+                                                 hls_error='No rendition could be transcoded')
+        return False
+
+    with open(os.path.join(root, MASTER_PLAYLIST), 'w') as f:
+        f.write(master_playlist(ready))
+    Video.objects.filter(pk=video_id).update(hls_status='ready', hls_playlist=f'{hls_dir}/{MASTER_PLAYLIST}',
+                                             hls_error='')
+    return True
+
+
+def delete_hls_files(video_id):
+    """Remove a video's transcoded playlists and segments"""
+    shutil.rmtree(default_storage.path(HLS_DIR.format(video_id)), ignore_errors=True)
+
+
+def _dispatch(video_id):
+    try:
+        from .tasks import transcode_video_task
+        transcode_video_task.apply_async(
+            (video_id,),
+            retry_policy={'max_retries': 2, 'interval_start': 0, 'interval_step': 0.5},
+        )
+    except Exception:
+        # Too slow to run inside a request; the transcode_videos command picks it up
+        logger.warning('Could not queue video transcoding: video=%s', video_id)
+
+
+def queue_video_transcode(video):
+    """Schedule HLS transcoding of an uploaded video once the current transaction commits"""
+    video_id = video.pk
+    transaction.on_commit(lambda: _dispatch(video_id))
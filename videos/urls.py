@@ -8,4 +8,7 @@ urlpatterns = [
     path('<int:video_id>/update-progress/', views.update_progress_view, name='update_progress'),
     path('<int:video_id>/progress/', views.get_progress_view, name='get_progress'),
     path('<int:video_id>/subtitles/', views.get_subtitles_view, name='get_subtitles'),
+    path('<int:video_id>/stream/', views.stream_video_view, name='stream'),
+    path('<int:video_id>/hls/<str:token>/<path:name>', views.hls_file_view, name='hls'),
+    path('<int:video_id>/stream-url/', views.stream_url_view, name='stream_url'),
 ]
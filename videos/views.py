@@ -1,9 +1,19 @@
+import re
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.files.storage import default_storage
+from django.db.models.fields.files import FieldFile
+from django.http import Http404, JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.utils import timezone
+from risk_lms.sendfile import serve_file
 from .models import Video, VideoProgress
+from .coverage import parse_ranges, ranges_bitmap
+from .progress_buffer import completion_percentage, mark_completed, merge_buffered, record_heartbeat
+from .streaming import can_stream_video, read_stream_token, signed_hls_url, signed_stream_url
+from .transcoding import HLS_DIR
+
+HLS_FILE_RE = re.compile(r'^(master\.m3u8|[\w-]+/(index\.m3u8|seg_\d+\.ts))$')
 
 @login_required
 def video_player_view(request, video_id):
@@ -18,6 +28,8 @@ def video_player_view(request, video_id):
         'video': video,
         'progress': progress,
         'subtitles': video.subtitles.all(),
+        'stream_url': signed_stream_url(video, request.user) if can_stream_video(request.user, video) else None,
+        'hls_url': signed_hls_url(video, request.user) if video.hls_ready and can_stream_video(request.user, video) else None,
     }
     return render(request, 'videos/player.html', context)
 
@@ -25,14 +37,15 @@ def video_player_view(request, video_id):
 @require_POST
 def update_progress_view(request, video_id):
     """AJAX endpoint to update video progress (prevent skipping)"""
-    video = get_object_or_404(Video, id=video_id)
-    progress, _ = VideoProgress.objects.get_or_create(
-        user=request.user,
-        video=video
-    )
-    
     # Handle manual completion request
     if request.POST.get('action') == 'complete':
+        video = get_object_or_404(Video, id=video_id)
+        progress, _ = VideoProgress.objects.get_or_create(
+            user=request.user,
+            video=video
+        )
+        merge_buffered(progress, ranges_bitmap(parse_ranges(request.POST.get('ranges'))))
+        
         completion_ok = False
         
         if video.duration > 0:
@@ -46,6 +59,7 @@ def update_progress_view(request, video_id):
             progress.is_completed = True
             progress.completed_at = timezone.now()
             progress.save()
+            mark_completed(request.user.id, video.id)
             
             return JsonResponse({
                 'success': True,
@@ -60,36 +74,25 @@ def update_progress_view(request, video_id):
                 'error': f'Must watch {min_requirement} to mark complete'
             })
     
-    # Regular progress update
-    watched_duration = int(request.POST.get('watched_duration', 0))
-    last_position = int(request.POST.get('last_position', 0))
-    
-    # Update progress
-    progress.watched_duration = max(progress.watched_duration, watched_duration)
-    progress.last_position = last_position
+    # Regular progress update: buffered, flushed in bulk (see progress_buffer.py)
+    try:
+        last_position = max(0, int(request.POST.get('last_position', 0)))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid progress values'}, status=400)
     
-    # Auto-complete at 95% watched OR 60+ seconds for unknown duration
-    if video.duration > 0:
-        # For videos with known duration, use 95% rule
-        if progress.watched_duration >= video.duration * 0.95:
-            progress.is_completed = True
-            if not progress.completed_at:
-                progress.completed_at = timezone.now()
-    else:
-        # For videos with unknown duration, use time-based completion (60 seconds)
-        if progress.watched_duration >= 60:
-            progress.is_completed = True
-            if not progress.completed_at:
-                progress.completed_at = timezone.now()
+    # Played ranges as 'start-end,...'; coverage is counted from these, not from a reported maximum
+    bitmap = ranges_bitmap(parse_ranges(request.POST.get('ranges')))
     
-    progress.save()
+    progress = record_heartbeat(request.user, video_id, bitmap, last_position)
+    if progress is None:
+        return JsonResponse({'success': False, 'error': 'Video not found'}, status=404)
     
     return JsonResponse({
         'success': True,
-        'is_completed': progress.is_completed,
-        'completion_percentage': progress.completion_percentage(),
-        'watched_duration': progress.watched_duration,
-        'last_position': progress.last_position
+        'is_completed': progress['completed'],
+        'completion_percentage': completion_percentage(progress['watched'], progress['duration']),
+        'watched_duration': progress['watched'],
+        'last_position': progress['position']
     })
 
 @login_required
@@ -98,6 +101,7 @@ def get_progress_view(request, video_id):
     video = get_object_or_404(Video, id=video_id)
     try:
         progress = VideoProgress.objects.get(user=request.user, video=video)
+        merge_buffered(progress)  # Heartbeats not flushed yet
         return JsonResponse({
             'success': True,
             'is_completed': progress.is_completed,
@@ -134,3 +138,42 @@ def get_subtitles_view(request, video_id):
         'success': True,
         'subtitles': subtitle_data
     })
+
+def stream_video_view(request, video_id):
+    """Byte-range video delivery for signed stream URLs (see streaming.py)"""
+    if read_stream_token(request.GET.get('token', ''), video_id) is None:
+        return HttpResponseForbidden('Invalid or expired video link')
+    
+    video = get_object_or_404(Video.objects.only('id', 'video_file'), id=video_id)
+    if not video.video_file:
+        return JsonResponse({'error': 'Video file not available'}, status=404)
+    
+    return serve_file(request, video.video_file, accept_ranges=True, max_age=60 * 60)
+
+def hls_file_view(request, video_id, token, name):
+    """HLS playlists and segments; the token sits in the path so relative playlist URLs keep it"""
+    if read_stream_token(token, video_id) is None:
+        return HttpResponseForbidden('Invalid or expired video link')
+    if not HLS_FILE_RE.match(name):
+        raise Http404
+    
+    file_name = f'{HLS_DIR.format(video_id)}/{name}'
+    if not default_storage.exists(file_name):
+        raise Http404
+    
+    field_file = FieldFile(None, Video._meta.get_field('video_file'), file_name)
+    if name.endswith('.ts'):
+        # Segments never change once written
+        return serve_file(request, field_file, content_type='video/mp2t', accept_ranges=True, max_age=60 * 60 * 24)
+    return serve_file(request, field_file, content_type='application/vnd.apple.mpegurl', max_age=60)
+
+@login_required
+def stream_url_view(request, video_id):
+    """Fresh signed stream URL for a player whose link has expired"""
+    video = get_object_or_404(Video, id=video_id)
+    if not can_stream_video(request.user, video):
+        return JsonResponse({'error': 'You are not enrolled in this course'}, status=403)
+    return JsonResponse({
+        'url': signed_stream_url(video, request.user),
+        'hls_url': signed_hls_url(video, request.user) if video.hls_ready else None,
+    })